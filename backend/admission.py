@@ -0,0 +1,117 @@
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, jsonify, request
+from flask_limiter.util import get_remote_address
+
+
+class ConcurrencyGate:
+    """At most `limit` requests inside, `queue` more waiting up to `timeout` seconds."""
+
+    def __init__(self, limit, queue, timeout):
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            if self.active < self.limit:
+                self.active += 1
+                return True
+            if self.waiting >= self.queue:
+                self.rejected += 1
+                return False
+            self.waiting += 1
+            deadline = time.monotonic() + self.timeout
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        return False
+                    self._cond.wait(remaining)
+                self.active += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+
+class Admission:
+    """Per-endpoint-group concurrency limits for expensive handlers.
+
+    Views wrapped with `gate("auth")` share AUTH_CONCURRENCY slots and an
+    AUTH_QUEUE_SIZE wait queue per worker. Requests that find the queue full
+    or wait longer than AUTH_QUEUE_TIMEOUT seconds get 503 with Retry-After,
+    so a burst of logins sheds load instead of tying up every worker thread.
+
+    A queued request still holds its request thread, so with a fixed pool of
+    REQUEST_THREADS (gunicorn gthread) the defaults are half the threads and
+    no queue; the other half stays free for everything else. Without a fixed
+    pool (gevent, the dev server) waiting costs no thread and the queue is on.
+    """
+
+    def __init__(self):
+        self._gates = {}
+
+    def init_app(self, app):
+        threads = app.config.setdefault("REQUEST_THREADS", 0)
+        if app.config.get("AUTH_CONCURRENCY") is None:
+            app.config["AUTH_CONCURRENCY"] = max(1, threads // 2) if threads else 4
+        if app.config.get("AUTH_QUEUE_SIZE") is None:
+            app.config["AUTH_QUEUE_SIZE"] = 0 if threads else 16
+        if threads and app.config["AUTH_CONCURRENCY"] + app.config["AUTH_QUEUE_SIZE"] >= threads > 1:
+            print(f"AUTH_CONCURRENCY + AUTH_QUEUE_SIZE cover all {threads} request threads; "
+                  "a login burst can starve other requests")
+        app.config.setdefault("AUTH_QUEUE_TIMEOUT", 2.0)
+        app.config.setdefault("AUTH_RETRY_AFTER", 1)
+        app.extensions["admission"] = self
+        self._gates = {}
+
+    def _gate(self, name):
+        gate = self._gates.get(name)
+        if gate is None:
+            prefix = name.upper()
+            config = current_app.config
+            gate = self._gates.setdefault(name, ConcurrencyGate(
+                config[f"{prefix}_CONCURRENCY"],
+                config[f"{prefix}_QUEUE_SIZE"],
+                config[f"{prefix}_QUEUE_TIMEOUT"],
+            ))
+        return gate
+
+    def gate(self, name):
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                gate = self._gate(name)
+                if not gate.acquire():
+                    response = jsonify({"msg": "Server busy, please retry shortly"})
+                    response.status_code = 503
+                    response.headers["Retry-After"] = str(current_app.config[f"{name.upper()}_RETRY_AFTER"])
+                    return response
+                try:
+                    return view(*args, **kwargs)
+                finally:
+                    gate.release()
+            return wrapper
+        return decorator
+
+
+def username_key():
+    """Rate-limit key for the username in the request body, falling back to the IP."""
+    data = request.get_json(silent=True) or {}
+    username = data.get("username")
+    return f"username:{username}" if isinstance(username, str) and username else get_remote_address()
+
+
+admission = Admission()
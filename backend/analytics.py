@@ -0,0 +1,288 @@
+import fcntl
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+import click
+from bson import ObjectId
+from flask.cli import with_appcontext
+
+from extensions import mongo
+
+# One append-only binary file per column, read back with np.memmap. numpy is
+# imported inside the functions that use it: it is the slowest import in the
+# app and only the exporter and the timeseries endpoint need it.
+COLUMNS = {
+    "timestamp": "int64",  # seconds since the epoch, UTC
+    "sweet": "int32",      # index into meta["sweets"]
+    "category": "int32",   # index into meta["categories"]
+    "qty": "int32",
+    "total": "float64",
+}
+
+BUCKETS = {"hour": 3600, "day": 86400, "week": 7 * 86400}
+# 1970-01-01 was a Thursday; shift so weekly buckets start on Monday
+WEEK_OFFSET = 4 * 86400
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _epoch_seconds(timestamp):
+    if timestamp.tzinfo is not None:
+        # Stored timestamps are naive UTC; `from=...+05:30` must compare with them
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return int((timestamp - EPOCH).total_seconds())
+
+
+class ColumnarSnapshot:
+    """Columnar copy of purchase_history for analytics.
+
+    `export()` appends purchases newer than the stored watermark
+    (timestamp, _id); `columns()` memory-maps the files so the timeseries
+    endpoint never touches the live collection.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.lag = timedelta(seconds=60)
+        self._cache = None  # (meta.json stat, meta, columns)
+        self._thread = None
+        self._stop = threading.Event()
+
+    def init_app(self, app):
+        app.config.setdefault("ANALYTICS_DIR", os.path.join(app.instance_path, "analytics"))
+        app.config.setdefault("ANALYTICS_EXPORT_INTERVAL", 300)
+        app.config.setdefault("ANALYTICS_EXPORT_LAG", 60)
+        app.extensions["analytics"] = self
+        self.directory = app.config["ANALYTICS_DIR"]
+        self.lag = timedelta(seconds=app.config["ANALYTICS_EXPORT_LAG"])
+        self._cache = None
+        app.cli.add_command(export_analytics_command)
+
+    def init_worker(self, app):
+        interval = app.config["ANALYTICS_EXPORT_INTERVAL"]
+        if interval > 0 and not app.testing and self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(interval,), name="analytics-export", daemon=True)
+            self._thread.start()
+
+    # -------------------------------
+    # Files
+    # -------------------------------
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _read_meta(self):
+        try:
+            with open(self._path("meta.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"rows": 0, "watermark": None, "sweets": [], "categories": []}
+
+    def _write_meta(self, meta):
+        tmp = self._path("meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._path("meta.json"))
+
+    # -------------------------------
+    # Export
+    # -------------------------------
+    def export(self, batch_size=5000):
+        """Append purchases past the watermark. Returns the number of new rows.
+
+        Rows younger than ANALYTICS_EXPORT_LAG are left for the next run so
+        purchases committed slightly out of timestamp order are not skipped.
+        """
+        import numpy as np
+
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path("export.lock"), "w") as lock:
+            # Several workers may run the exporter; only one writes at a time
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            meta = self._read_meta()
+            meta.pop("users", None)  # written by older versions, never read
+
+            # Drop bytes from an export that died before committing meta.json
+            for name, dtype in COLUMNS.items():
+                path = self._path(f"{name}.bin")
+                if os.path.exists(path):
+                    os.truncate(path, meta["rows"] * np.dtype(dtype).itemsize)
+
+            query = {"timestamp": {"$lt": datetime.utcnow() - self.lag}}
+            if meta["watermark"]:
+                t = datetime.fromisoformat(meta["watermark"]["t"])
+                last_id = ObjectId(meta["watermark"]["id"])
+                query = {"$and": [query, {"$or": [
+                    {"timestamp": {"$gt": t}},
+                    {"timestamp": t, "_id": {"$gt": last_id}},
+                ]}]}
+
+            sweet_codes = {sweet_id: i for i, (sweet_id, _) in enumerate(meta["sweets"])}
+            category_codes = {name: i for i, name in enumerate(meta["categories"])}
+            categories = {
+                str(s["_id"]): s.get("category") or "Uncategorized"
+                for s in mongo.db.sweets.find({}, {"category": 1})
+            }
+
+            def code(codes, key, table, value):
+                if key not in codes:
+                    codes[key] = len(table)
+                    table.append(value)
+                return codes[key]
+
+            cursor = (mongo.db.purchase_history.find(query)
+                      .sort([("timestamp", 1), ("_id", 1)])
+                      .batch_size(batch_size))
+            added = 0
+            rows = {name: [] for name in COLUMNS}
+            last = None
+            for p in cursor:
+                sweet_id = str(p["sweet_id"])
+                category = categories.get(sweet_id, "Uncategorized")
+                rows["timestamp"].append(_epoch_seconds(p["timestamp"]))
+                rows["sweet"].append(code(sweet_codes, sweet_id, meta["sweets"], [sweet_id, p["sweet_name"]]))
+                rows["category"].append(code(category_codes, category, meta["categories"], category))
+                rows["qty"].append(p["quantity"])
+                rows["total"].append(p["total"])
+                last = p
+                if len(rows["timestamp"]) >= batch_size:
+                    added += self._append(rows)
+                    rows = {name: [] for name in COLUMNS}
+            added += self._append(rows)
+
+            if added:
+                meta["rows"] += added
+                meta["watermark"] = {"t": last["timestamp"].isoformat(), "id": str(last["_id"])}
+                self._write_meta(meta)
+            return added
+
+    def _append(self, rows):
+        import numpy as np
+
+        for name, dtype in COLUMNS.items():
+            with open(self._path(f"{name}.bin"), "ab") as f:
+                np.asarray(rows[name], dtype=dtype).tofile(f)
+        return len(rows["timestamp"])
+
+    def _run(self, interval):
+        # Export at start too, so a fresh worker does not serve an old snapshot for a whole interval
+        while True:
+            try:
+                self.export()
+            except Exception as e:
+                print(f"Analytics export failed: {e}")
+            if self._stop.wait(interval):
+                return
+
+    # -------------------------------
+    # Read side
+    # -------------------------------
+    def columns(self):
+        """Return `(meta, {name: memmapped array})`, remapped after each export.
+
+        meta.json is only read again when an export has replaced it.
+        """
+        import numpy as np
+
+        try:
+            st = os.stat(self._path("meta.json"))
+            version = (st.st_ino, st.st_mtime_ns, st.st_size)  # os.replace gives each export a new file
+        except FileNotFoundError:
+            version = None
+        cache = self._cache
+        if cache is not None and cache[0] == version:
+            return cache[1], cache[2]
+
+        meta = self._read_meta()
+
+        columns = {}
+        for name, dtype in COLUMNS.items():
+            if meta["rows"]:
+                columns[name] = np.memmap(self._path(f"{name}.bin"), dtype=dtype, mode="r", shape=(meta["rows"],))
+            else:
+                columns[name] = np.empty(0, dtype=dtype)
+        self._cache = (version, meta, columns)
+        return meta, columns
+
+
+def _moving_average(values, window):
+    """Trailing mean over `window` buckets, shorter at the start of the series."""
+    import numpy as np
+
+    sums = np.cumsum(values)
+    shifted = np.zeros_like(sums)
+    shifted[window:] = sums[:-window]
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    return (sums - shifted) / counts
+
+
+def _top(codes, weights_sales, weights_items, labels, k):
+    import numpy as np
+
+    sales = np.bincount(codes, weights=weights_sales, minlength=len(labels))
+    items = np.bincount(codes, weights=weights_items, minlength=len(labels))
+    k = min(k, np.count_nonzero(sales))
+    if k == 0:
+        return []
+    best = np.argpartition(-sales, k - 1)[:k]
+    best = best[np.argsort(-sales[best])]
+    return [(labels[i], float(sales[i]), int(items[i])) for i in best]
+
+
+def timeseries(meta, columns, bucket="day", start=None, end=None, window=7, top=5):
+    """Bucketed sales, moving average, top sweets and category totals."""
+    import numpy as np
+
+    width = BUCKETS[bucket]
+    offset = WEEK_OFFSET if bucket == "week" else 0
+
+    ts = columns["timestamp"]
+    mask = np.ones(len(ts), dtype=bool)
+    if start is not None:
+        mask &= ts >= _epoch_seconds(start)
+    if end is not None:
+        mask &= ts < _epoch_seconds(end)
+
+    ts = ts[mask]
+    total = columns["total"][mask]
+    qty = columns["qty"][mask].astype(np.float64)
+    if len(ts) == 0:
+        return {"bucket": bucket, "series": [], "top_sweets": [], "categories": []}
+
+    index = (ts - offset) // width
+    first = int(index.min())
+    index = index - first
+    n = int(index.max()) + 1
+    sales = np.bincount(index, weights=total, minlength=n)
+    items = np.bincount(index, weights=qty, minlength=n)
+    orders = np.bincount(index, minlength=n)
+    average = _moving_average(sales, max(1, window))
+
+    series = [{
+        "start": (EPOCH + timedelta(seconds=(first + i) * width + offset)).isoformat(),
+        "sales": float(sales[i]),
+        "orders": int(orders[i]),
+        "items": int(items[i]),
+        "moving_average": round(float(average[i]), 2),
+    } for i in range(n)]
+
+    sweet_names = [name for _, name in meta["sweets"]]
+    top_sweets = _top(columns["sweet"][mask], total, qty, sweet_names, top)
+    categories = _top(columns["category"][mask], total, qty, meta["categories"], len(meta["categories"]))
+    return {
+        "bucket": bucket,
+        "series": series,
+        "top_sweets": [{"name": n, "sales": s, "items": i} for n, s, i in top_sweets],
+        "categories": [{"category": c, "sales": s, "items": i} for c, s, i in categories],
+    }
+
+
+@click.command("export-analytics")
+@with_appcontext
+def export_analytics_command():
+    """Append new purchases to the columnar analytics snapshot."""
+    click.echo(f"Exported {snapshot.export()} purchases")
+
+
+snapshot = ColumnarSnapshot()
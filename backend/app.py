@@ -1,32 +1,119 @@
-from flask import Flask
+import os
+import threading
+import time
+from flask import Flask, jsonify
 from dotenv import load_dotenv
 from config import Config
+from json_provider import OrjsonProvider
 from flask_cors import CORS
-from extensions import mongo, jwt, mail
+from extensions import mongo, jwt, mail, limiter
+from admission import admission
+from outbox import outbox
+from metrics import metrics
+from profiler import profiler
+from passwords import passwords
+from email_templates import email_templates
+from indexes import registry as index_registry
+from coherence import coherence
+from catalog_cache import catalog_cache
+from users import user_cache
+from user_agent_cache import user_agent_cache
+from search_index import search_index
+import rollups
+from rollups import rebuild_rollups_command
+from analytics import snapshot as analytics_snapshot
 from resources.auth import auth_bp
 from resources.sweets import sweets_bp
 from resources.inventory import inventory_bp
 from resources.purchases import purchases_bp
+from resources.profiles import profiles_bp
 
 
 load_dotenv()
 
-def create_app():
+
+def connect_mongo(app):
+    mongo.init_app(app, event_listeners=metrics.listeners, maxPoolSize=app.config["MONGO_MAX_POOL_SIZE"])
+    # Flask-PyMongo installs an extended-JSON provider ({"$oid": ...}); replace it
+    app.json = OrjsonProvider(app)
+    app.extensions["mongo_pid"] = os.getpid()
+
+
+def _warm_up(app):
+    index_registry.init_worker(app)
+    # Learn the current generations before building, so the first request's
+    # check does not throw the fresh search index away again
+    coherence.check(force=True)
+    search_index.init_worker(app)
+    rollups.init_worker(app)
+
+
+def init_worker(app):
+    """Per-process startup: a fresh Mongo client, background threads, warm caches.
+
+    pymongo clients and threads do not survive a fork, so with
+    `create_app(preload=True)` the gunicorn master skips this and each worker
+    runs it after forking (see gunicorn.conf.py).
+    """
+    if app.extensions.get("mongo_pid") != os.getpid():
+        connect_mongo(app)
+    if app.config["STARTUP_WARMUP_IN_BACKGROUND"] and not app.testing:
+        # The first request should not wait for index builds or the search index
+        threading.Thread(target=_warm_up, args=(app,), name="startup-warmup", daemon=True).start()
+    else:
+        _warm_up(app)
+    outbox.init_worker(app)
+    analytics_snapshot.init_worker(app)
+
+
+def create_app(testing=False, preload=False):
     app = Flask(__name__)
     app.config.from_object(Config)
+    app.config["TESTING"] = testing
 
     # Apply CORS globally
     CORS(app, resources={r"/api/*": {"origins": "https://incubyte-alpha.vercel.app"}}, supports_credentials=True)
 
-    mongo.init_app(app)
+    # Not connected until first use; init_worker() replaces it after a fork
+    connect_mongo(app)
+    metrics.init_app(app)
     jwt.init_app(app)
     mail.init_app(app)
+    limiter.init_app(app)
+    admission.init_app(app)
+    passwords.init_app(app)
+    outbox.init_app(app)
+    email_templates.init_app(app)
+    coherence.init_app(app)
+    catalog_cache.init_app(app)
+    user_cache.init_app(app)
+    user_agent_cache.init_app(app)
+    search_index.init_app(app)
+    analytics_snapshot.init_app(app)
 
     app.register_blueprint(auth_bp, url_prefix="/api/auth")
     app.register_blueprint(sweets_bp, url_prefix="/api/sweets")
     app.register_blueprint(inventory_bp, url_prefix="/api/sweets")
     app.register_blueprint(purchases_bp, url_prefix="/api/purchases")
+    app.register_blueprint(profiles_bp, url_prefix="/api/profiles")
+
+    @app.errorhandler(429)
+    def rate_limited(e):
+        response = jsonify({"msg": f"Too many requests: {e.description}"})
+        current = limiter.current_limit
+        if current is not None:
+            response.headers["Retry-After"] = str(max(1, int(current.reset_at - time.time())))
+        return response, 429
+
+    # Wraps app.wsgi_app, so it sees whole requests including streamed bodies
+    profiler.init_app(app)
+
+    # Blueprints declare their indexes at import time; init_worker() ensures them
+    index_registry.init_app(app)
+    app.cli.add_command(rebuild_rollups_command)
 
+    if not preload:
+        init_worker(app)
     return app
 
 
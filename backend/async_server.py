@@ -0,0 +1,49 @@
+"""Cooperative deployment: many concurrent requests per process under gevent.
+
+    python async_server.py [--host 0.0.0.0] [--port 5000]
+
+Every endpoint spends most of its time waiting on MongoDB. Under the sync
+workers each waiting request holds a thread or a whole process. Here gevent
+patches sockets, locks and sleeps, so a request waiting on the driver
+yields to the others. One process then serves up to ASYNC_MAX_CONNECTIONS
+requests at once, using the same handlers `create_app` registers.
+
+Blocking work stays off the event loop. bcrypt runs in native threads (see
+passwords.py). Mail goes through the outbox, whose workers become
+greenlets on a patched smtplib.
+
+Importing this module patches the process; import it before anything else.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse
+
+from gevent.pool import Pool
+from gevent.pywsgi import WSGIServer
+
+from app import create_app
+
+
+def make_server(app, host="0.0.0.0", port=5000):
+    """A gevent WSGI server that runs at most ASYNC_MAX_CONNECTIONS requests at a time."""
+    pool = Pool(app.config["ASYNC_MAX_CONNECTIONS"])
+    return WSGIServer((host, port), app, spawn=pool, log=None, error_log="default")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python async_server.py")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    server = make_server(app, args.host, args.port)
+    print(f"Serving on http://{args.host}:{args.port} "
+          f"({app.config['ASYNC_MAX_CONNECTIONS']} concurrent requests)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Benchmarks; see endpoints.py for the endpoint and load-test suite."""
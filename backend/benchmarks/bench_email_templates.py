@@ -0,0 +1,132 @@
+"""Micro-benchmark: cost of rendering one email per request.
+
+Compares the precompiled templates in `email_templates` with the inline
+f-string the login handler used to build, and with compiling the template
+source on every call (what `render_template_string` would do).
+
+    python benchmarks/bench_email_templates.py [iterations]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from jinja2 import Environment
+
+from email_templates import EmailTemplates, TEMPLATE_DIR, _InliningLoader
+
+CONTEXT = {
+    "username": "benchmark_user",
+    "latitude": 17.385,
+    "longitude": 78.4867,
+    "device": {"ip": "203.0.113.7", "browser": "Chrome", "os": "Windows", "device": "Other"},
+    "map_link": "https://www.google.com/maps?q=17.385,78.4867",
+}
+
+
+def legacy_fstring(username, latitude, longitude, device, map_link):
+    return f"""
+    <html>
+    <head>
+      <style>
+        body {{
+          font-family: Arial, sans-serif;
+          background-color: #f4f4f7;
+          color: #333;
+          padding: 20px;
+        }}
+        .container {{
+          max-width: 600px;
+          margin: auto;
+          background: #ffffff;
+          border-radius: 10px;
+          padding: 20px;
+          box-shadow: 0px 4px 10px rgba(0,0,0,0.1);
+        }}
+        .header {{
+          background: linear-gradient(135deg, #a855f7, #ec4899, #ef4444);
+          padding: 15px;
+          border-radius: 10px 10px 0 0;
+          color: #fff;
+          text-align: center;
+          font-size: 20px;
+        }}
+        .content {{
+          padding: 20px;
+          line-height: 1.6;
+        }}
+        .map-link {{
+          display: inline-block;
+          margin-top: 10px;
+          padding: 10px 15px;
+          background: #2563eb;
+          color: #fff !important;
+          text-decoration: none;
+          border-radius: 6px;
+        }}
+        .footer {{
+          margin-top: 20px;
+          font-size: 12px;
+          color: #888;
+          text-align: center;
+        }}
+      </style>
+    </head>
+    <body>
+      <div class="container">
+        <div class="header">🔔 New Login Detected</div>
+        <div class="content">
+          <p>Hello <b>{username}</b>,</p>
+          <p>A login to your account was detected with the following details:</p>
+
+          <ul>
+            <li><b>Location:</b> {latitude}, {longitude}</li>
+            <li><b>IP:</b> {device['ip']}</li>
+            <li><b>Browser:</b> {device['browser']}</li>
+            <li><b>OS:</b> {device['os']}</li>
+            <li><b>Device:</b> {device['device']}</li>
+          </ul>
+
+          <p>
+            📍 <a class="map-link" href="{map_link}" target="_blank">
+              View Location on Map
+            </a>
+          </p>
+
+          <p>If this wasn’t you, please reset your password immediately.</p>
+        </div>
+        <div class="footer">
+          © 2025 YourApp. All rights reserved.
+        </div>
+      </div>
+    </body>
+    </html>
+    """
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    templates = EmailTemplates()
+    templates.load()
+
+    loader = _InliningLoader(TEMPLATE_DIR)
+    source, _, _ = loader.get_source(Environment(), "login_alert.html")
+
+    def compile_per_call():
+        return Environment(autoescape=True).from_string(source).render(**CONTEXT)
+
+    cases = [
+        ("legacy f-string", lambda: legacy_fstring(**CONTEXT)),
+        ("precompiled template", lambda: templates.render("login_alert", **CONTEXT)),
+        ("compile per call", compile_per_call),
+    ]
+    for label, fn in cases:
+        n = iterations if label != "compile per call" else max(iterations // 20, 1)
+        seconds = min(timeit.repeat(fn, number=n, repeat=3))
+        print(f"{label:<22} {seconds / n * 1e6:10.2f} us/message")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Benchmark: encoding a 10k-row purchase history response.
+
+"before" is the old path: convert `_id`/`timestamp` with str()/isoformat()
+per row, then encode through Flask-PyMongo's extended-JSON provider (what
+`app.json` was). "after" hands the rows to OrjsonProvider as they are.
+
+    python benchmarks/bench_json.py [rows]
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bson import ObjectId
+from flask import Flask
+from flask_pymongo.helpers import BSONProvider
+
+from json_provider import OrjsonProvider
+
+
+def history(rows):
+    start = datetime(2025, 1, 1)
+    users = [ObjectId() for _ in range(50)]
+    return [{
+        "_id": ObjectId(),
+        "user_id": users[i % len(users)],
+        "sweet_id": ObjectId(),
+        "sweet_name": f"Sweet {i % 200}",
+        "quantity": 1 + i % 5,
+        "price": 12.5,
+        "total": 12.5 * (1 + i % 5),
+        "timestamp": start + timedelta(minutes=i),
+    } for i in range(rows)]
+
+
+def converted(purchases):
+    return [{
+        "_id": str(p["_id"]), "sweet_id": str(p["sweet_id"]), "sweet_name": p["sweet_name"],
+        "quantity": p["quantity"], "price": float(p["price"]), "total": float(p["total"]),
+        "timestamp": p["timestamp"].isoformat(), "user_id": str(p["user_id"]),
+    } for p in purchases]
+
+
+def native(purchases):
+    return [{
+        "_id": p["_id"], "sweet_id": p["sweet_id"], "sweet_name": p["sweet_name"],
+        "quantity": p["quantity"], "price": float(p["price"]), "total": float(p["total"]),
+        "timestamp": p["timestamp"], "user_id": p["user_id"],
+    } for p in purchases]
+
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    purchases = history(rows)
+    app = Flask(__name__)
+    before_provider, after_provider = BSONProvider(app), OrjsonProvider(app)
+
+    before = timed(lambda: before_provider.dumps({"items": converted(purchases)}))
+    after = timed(lambda: after_provider.dumpb({"items": native(purchases)}))
+    print(f"{rows} rows")
+    print(f"before  {before * 1000:8.2f} ms")
+    print(f"after   {after * 1000:8.2f} ms  ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
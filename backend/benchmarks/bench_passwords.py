@@ -0,0 +1,47 @@
+"""Benchmark: bcrypt logins per second per core at several work factors.
+
+Runs `check_password` inline (what the login handler used to do) and
+through `PasswordHasher` with one worker process per core, driven by as
+many request threads as there are workers.
+
+    python benchmarks/bench_passwords.py [logins] [rounds ...]
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from passwords import PasswordHasher
+from utils import check_password, hash_password
+
+
+def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    costs = [int(r) for r in sys.argv[2:]] or [10, 11, 12, 13]
+    cores = os.cpu_count() or 1
+    print(f"{logins} logins per run, {cores} cores")
+
+    for rounds in costs:
+        hashed = hash_password("correct horse", rounds)
+
+        start = time.perf_counter()
+        for _ in range(logins):
+            check_password("correct horse", hashed)
+        inline = logins / (time.perf_counter() - start)
+
+        hasher = PasswordHasher(rounds=rounds, workers=cores)
+        hasher.verify("correct horse", hashed)  # start the pool outside the timing
+        with ThreadPoolExecutor(cores) as requests:
+            start = time.perf_counter()
+            list(requests.map(lambda _: hasher.verify("correct horse", hashed), range(logins)))
+            pooled = logins / (time.perf_counter() - start)
+        hasher.shutdown()
+
+        print(f"rounds={rounds:2d}  inline {inline:7.1f}/s ({1000 / inline:6.1f} ms each)  "
+              f"pool {pooled:7.1f}/s  per core {pooled / cores:7.1f}/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Benchmark: sweet name search at 100k sweets.
+
+Compares the in-memory trigram index with the unanchored, case-insensitive
+`$regex` query `search_sweets` used to send. By default the regex path runs
+against mongomock; pass a MongoDB URI to measure a real server scan.
+
+    python benchmarks/bench_search.py [count] [mongodb://localhost:27017/bench]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import mongomock
+import pymongo
+
+from extensions import mongo
+from search_index import SweetSearchIndex
+
+WORDS = ["ladoo", "barfi", "jalebi", "peda", "halwa", "kaju", "kesar", "besan", "motichoor",
+         "rasgulla", "sandesh", "gulab", "jamun", "chocolate", "fudge", "toffee", "almond", "pista"]
+CATEGORIES = ["Indian", "Bengali", "Western", "Fusion", "Sugar Free"]
+QUERIES = ["ladoo", "kaju barfi", "jam", "rasgula", "choco", "pista halwa", "xyz"]
+
+
+def seed(db, count):
+    rng = random.Random(42)
+    db.sweets.drop()
+    db.sweets.insert_many([{
+        "name": f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {i}",
+        "category": rng.choice(CATEGORIES),
+        "price": round(rng.uniform(5, 500), 2),
+        "quantity": rng.randint(0, 100),
+    } for i in range(count)])
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    if len(sys.argv) > 2:
+        db = pymongo.MongoClient(sys.argv[2]).get_default_database()
+        label = "mongod $regex"
+    else:
+        db = mongomock.MongoClient()["bench"]
+        label = "mongomock $regex"
+    mongo.db = db
+    seed(db, count)
+
+    docs = list(db.sweets.find())
+    index = SweetSearchIndex()
+    print(f"build index: {timed(lambda: index.build(docs), repeat=1) * 1000:.0f} ms for {count} sweets")
+
+    for query in QUERIES:
+        regex = timed(lambda: list(db.sweets.find({"name": {"$regex": query, "$options": "i"}})), repeat=1)
+        indexed = timed(lambda: index.search(name=query))
+        hits = len(index.search(name=query))
+        print(f"{query!r:<14} {label}: {regex * 1000:8.1f} ms   index: {indexed * 1000:8.1f} ms   ({hits} hits)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Startup benchmark: how long a fresh process takes to import the app.
+
+Runs `python -X importtime -c "import app"` in new interpreters and reports
+the median total, the slowest imports directly under `app`, and any of
+LAZY_MODULES that got loaded at startup anyway. It also times
+`create_app()` in a fresh process. tests/test_startup.py enforces
+IMPORT_BUDGET_MS and LAZY_MODULES.
+
+    python benchmarks/bench_startup.py [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Median `import app` time a change must stay under; raise it deliberately,
+# never to make a slow import pass. STARTUP_IMPORT_BUDGET_MS overrides it
+# on slow CI machines.
+IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", 1000))
+
+# Only needed by rarely used paths, so importing `app` must not load them
+LAZY_MODULES = (
+    "numpy",                       # analytics exporter and /timeseries
+    "flask_mail",                  # outbox workers
+    "smtplib",                     # outbox workers
+    "user_agents",                 # login device info
+    "multiprocessing",             # bcrypt process pool
+    "concurrent.futures.process",  # bcrypt process pool
+    "gevent",                      # async_server.py only
+)
+
+# create_app() must not reach a real cluster from .env while being timed
+_ENV = {**os.environ, "MONGO_URI": "mongodb://127.0.0.1:27017/sweetshop"}
+
+
+def import_profile():
+    """Run one `-X importtime` import of app; returns `{module: (self_us, cumulative_us, depth)}`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=BACKEND, capture_output=True, text=True, env=_ENV, check=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue  # the header line
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return modules
+
+
+def import_time_ms(profile):
+    return profile["app"][1] / 1000.0
+
+
+def eager_lazy_modules(profile):
+    return [name for name in LAZY_MODULES if name in profile]
+
+
+def create_app_ms():
+    code = ("import time; import app; t = time.perf_counter(); app.create_app(); "
+            "print('\\n' + str((time.perf_counter() - t) * 1000))")
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND, capture_output=True, text=True,
+                            env=_ENV, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main(runs=5):
+    profiles = [import_profile() for _ in range(runs)]
+    totals = [import_time_ms(p) for p in profiles]
+    median = statistics.median(totals)
+    print(f"import app: median {median:.1f} ms over {runs} runs "
+          f"(min {min(totals):.1f}, max {max(totals):.1f}); budget {IMPORT_BUDGET_MS:.0f} ms")
+
+    last = profiles[-1]
+    direct = sorted(((cum, name) for name, (_, cum, depth) in last.items() if depth == 1), reverse=True)
+    print("slowest imports under app:")
+    for cumulative, name in direct[:12]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    eager = eager_lazy_modules(last)
+    print("lazy modules loaded at startup:", ", ".join(eager) if eager else "none")
+
+    timings = [create_app_ms() for _ in range(runs)]
+    print(f"create_app(): median {statistics.median(timings):.1f} ms")
+    print(json.dumps({"import_ms": median, "create_app_ms": statistics.median(timings), "eager": eager}))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,70 @@
+"""Benchmark: login device info over a realistic User-Agent mix.
+
+Replays a Zipf-distributed corpus of common browser User-Agents through
+`get_device_info`, once with the LRU in front of ua-parser and once with
+every call going straight to `user_agents.parse`.
+
+    python benchmarks/bench_user_agents.py [requests]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from flask import Flask
+
+import resources.auth as auth
+from user_agent_cache import UserAgentCache, _parse_families
+
+BROWSERS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Linux; Android 13; SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_{v2} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.{v2} Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:{v}.0) Gecko/20100101 Firefox/{v}.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36 Edg/{v}.0.0.0",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (iPad; CPU OS 16_{v2} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.{v2} Mobile/15E148 Safari/604.1",
+]
+
+
+def corpus(count):
+    rng = random.Random(7)
+    agents = [template.format(v=v, v2=v % 7) for template in BROWSERS for v in range(100, 125)]
+    rng.shuffle(agents)
+    weights = [1 / (rank + 1) for rank in range(len(agents))]
+    return agents, rng.choices(agents, weights, k=count)
+
+
+def replay(app, requests):
+    start = time.perf_counter()
+    for ua in requests:
+        with app.test_request_context("/api/auth/login", headers={"User-Agent": ua}):
+            auth.get_device_info()
+    return time.perf_counter() - start
+
+
+class Uncached:
+    def parse(self, ua_string):
+        return _parse_families(ua_string or "")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    agents, requests = corpus(count)
+    app = Flask(__name__)
+    print(f"{count} logins over {len(agents)} distinct User-Agents")
+
+    auth.user_agent_cache = Uncached()
+    uncached = replay(app, requests)
+    auth.user_agent_cache = cached = UserAgentCache()
+    hot = replay(app, requests)
+
+    print(f"uncached  {uncached * 1e6 / count:8.1f} us/login")
+    print(f"lru       {hot * 1e6 / count:8.1f} us/login  ({uncached / hot:.1f}x)  {cached.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Counting wrapper around `mongo.db`, shared by the benchmarks and tests."""
+import threading
+import time
+
+
+class CountingCollection:
+    def __init__(self, collection, counter):
+        self._collection = collection
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+        counter = self._counter
+        collection = self._collection.name
+
+        def call(*args, **kwargs):
+            with counter.lock:
+                counter.calls += 1
+                if counter.record:
+                    counter.commands.append((collection, name))
+                    counter.details.append(_describe(collection, name, args, kwargs))
+            if counter.latency:
+                time.sleep(counter.latency)
+            if counter.serialize:
+                with counter.command_lock:
+                    return attr(*args, **kwargs)
+            return attr(*args, **kwargs)
+
+        return call
+
+
+def _describe(collection, method, args, kwargs):
+    params = [repr(a) for a in args] + [f"{k}={v!r}" for k, v in kwargs.items()]
+    text = f"{collection}.{method}({', '.join(params)})"
+    return text if len(text) <= 160 else text[:157] + "..."
+
+
+class CountingDatabase:
+    """Counts driver calls (find, insert_one, ...) made through `mongo.db`.
+
+    Cursor getMores are not counted; the number tracks round trips the
+    handlers ask for, which is what a code change moves. With `serialize`
+    each call holds a lock, since mongomock commands are not atomic across
+    threads the way a server's are. `latency` seconds are slept before each
+    call to stand in for the network round trip to a real server. With
+    `record` every call is also logged in `commands` as `(collection,
+    method)` and in readable form in `details`, for budget failure messages.
+    """
+
+    def __init__(self, db, serialize=False, latency=0.0, record=False):
+        self._db = db
+        self.serialize = serialize
+        self.latency = latency
+        self.record = record
+        self.lock = threading.Lock()
+        self.command_lock = threading.Lock()
+        self.calls = 0
+        self.commands = []
+        self.details = []
+
+    def __getattr__(self, name):
+        return CountingCollection(self._db[name], self)
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+    def reset(self):
+        with self.lock:
+            self.calls = 0
+            del self.commands[:]
+            del self.details[:]
@@ -0,0 +1,402 @@
+"""Endpoint benchmarks and load tests with JSON baselines.
+
+Seeds sweets, users and purchases into mongomock (default) or a local
+mongod, then drives each scenario through the WSGI test client and
+through a threaded HTTP load generator against a local server. Reports
+throughput, p50/p95/p99 latency and Mongo driver calls per request.
+
+    python -m benchmarks.endpoints run [--purchases 100000] [--sweets 10000]
+        [--mongo-uri mongodb://localhost:27017/bench] [--requests 500]
+        [--concurrency 8] [--out benchmarks/results/current.json]
+    python -m benchmarks.endpoints concurrency [--connections 200] [--workers 4]
+        [--latency-ms 5] [--modes sync,gevent] [--out ...]
+    python -m benchmarks.endpoints compare baseline.json current.json [--threshold 0.1]
+
+`concurrency` starts benchmarks/server.py once per deployment mode (gunicorn
+sync workers, then the gevent server) and holds --connections concurrent
+connections against each; Mongo calls are not counted there.
+
+Run from the backend directory. `compare` exits with status 1 when any
+scenario got slower or issues more Mongo calls than the baseline allows.
+Baselines live in benchmarks/baselines/; their "meta" block records the
+data volumes and settings to rerun with.
+"""
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import mongomock
+import pymongo
+from bson import ObjectId
+from flask_jwt_extended import create_access_token
+from werkzeug.serving import make_server
+
+import rollups
+from app import create_app
+from benchmarks.counting import CountingDatabase
+from extensions import mongo
+from users import user_claims
+
+CHUNK = 10_000
+
+
+# -------------------------------
+# Data
+# -------------------------------
+def seed(db, sweets, purchases, users, rng):
+    for name in ("sweets", "users", "purchase_history", "sales_rollups"):
+        db[name].drop()
+
+    sweet_docs = [{
+        "_id": ObjectId(),
+        "name": f"Sweet {i}",
+        "category": rng.choice(["Indian", "Bengali", "Western", "Fusion", "Sugar Free"]),
+        "price": round(rng.uniform(5, 500), 2),
+        "quantity": 10 ** 9,
+    } for i in range(sweets)]
+    db.sweets.insert_many(sweet_docs)
+
+    # user0 is the admin; the other users are customers
+    user_docs = [{"_id": ObjectId(), "username": f"user{i}", "email": f"user{i}@bench.test", "password": "x",
+                  "is_admin": i == 0, "role": "admin" if i == 0 else "user"} for i in range(users)]
+    db.users.insert_many(user_docs)
+
+    start = datetime.utcnow() - timedelta(days=365)
+    for offset in range(0, purchases, CHUNK):
+        batch = []
+        for _ in range(min(CHUNK, purchases - offset)):
+            sweet = rng.choice(sweet_docs)
+            qty = rng.randint(1, 5)
+            batch.append({
+                "user_id": rng.choice(user_docs)["_id"],
+                "sweet_id": sweet["_id"],
+                "sweet_name": sweet["name"],
+                "quantity": qty,
+                "price": sweet["price"],
+                "total": sweet["price"] * qty,
+                "timestamp": start + timedelta(seconds=rng.randint(0, 365 * 86400)),
+            })
+        db.purchase_history.insert_many(batch)
+        rollups.record(batch)
+    return sweet_docs, user_docs
+
+
+def scenarios(app, sweet_docs, user_docs, rng):
+    """`name -> callable returning (method, path, json body, headers)`."""
+    with app.app_context():
+        tokens = [create_access_token(identity=str(u["_id"]), additional_claims=user_claims(u))
+                  for u in user_docs[:50]]
+    admin = {"Authorization": f"Bearer {tokens[0]}"}
+
+    def customer():
+        return {"Authorization": f"Bearer {rng.choice(tokens[1:] or tokens)}"}
+
+    return {
+        "sweets": lambda: ("GET", "/api/sweets/", None, {}),
+        "buy": lambda: ("POST", "/api/purchases/buy",
+                        {"sweet_id": str(rng.choice(sweet_docs)["_id"]), "quantity": 1}, customer()),
+        "history": lambda: ("GET", "/api/purchases/history?limit=50", None, customer()),
+        "history_admin": lambda: ("GET", "/api/purchases/history?limit=50", None, admin),
+        "stats": lambda: ("GET", "/api/purchases/stats", None, admin),
+    }
+
+
+# -------------------------------
+# Drivers
+# -------------------------------
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed, calls, errors):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        "requests": count,
+        "errors": errors,
+        "throughput_rps": round(count / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "mongo_calls_per_request": round(calls / count, 2) if count else 0.0,
+    }
+
+
+def run_wsgi(app, make_request, requests, counter):
+    client = app.test_client()
+    latencies, errors = [], 0
+    counter.reset()
+    started = time.perf_counter()
+    for _ in range(requests):
+        method, path, body, headers = make_request()
+        t = time.perf_counter()
+        response = client.open(path, method=method, json=body, headers=headers)
+        response.get_data()
+        latencies.append(time.perf_counter() - t)
+        errors += response.status_code >= 400
+    return summarize(latencies, time.perf_counter() - started, counter.calls, errors)
+
+
+def run_http(port, make_request, requests, concurrency, counter):
+    local = threading.local()
+    lock = threading.Lock()
+    latencies, errors = [], [0]
+
+    def one(_):
+        connection = getattr(local, "connection", None)
+        if connection is None:
+            connection = local.connection = http.client.HTTPConnection("127.0.0.1", port)
+        method, path, body, headers = make_request()
+        payload = json.dumps(body) if body is not None else None
+        if payload is not None:
+            headers = {**headers, "Content-Type": "application/json"}
+        t = time.perf_counter()
+        connection.request(method, path, body=payload, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        elapsed = time.perf_counter() - t
+        with lock:
+            latencies.append(elapsed)
+            errors[0] += response.status >= 400
+
+    if counter is not None:
+        counter.reset()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    calls = counter.calls if counter is not None else 0
+    return summarize(latencies, time.perf_counter() - started, calls, errors[0])
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    app = create_app(testing=True)
+    if args.mongo_uri:
+        client = pymongo.MongoClient(args.mongo_uri)
+        db = client.get_default_database()
+    else:
+        client = mongomock.MongoClient()
+        db = client["bench"]
+    mongo.cx, mongo.db = client, db
+
+    print(f"seeding {args.sweets} sweets, {args.users} users, {args.purchases} purchases ...", file=sys.stderr)
+    sweet_docs, user_docs = seed(db, args.sweets, args.purchases, args.users, rng)
+    counter = CountingDatabase(db, serialize=not args.mongo_uri)
+    mongo.db = counter
+    make = scenarios(app, sweet_docs, user_docs, rng)
+    selected = args.scenarios.split(",") if args.scenarios else list(make)
+
+    results = {}
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        # Handlers print debug lines; keep them out of the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            for name in selected:
+                results[f"wsgi:{name}"] = run_wsgi(app, make[name], args.requests, counter)
+                results[f"http:{name}"] = run_http(server.port, make[name], args.requests, args.concurrency, counter)
+    finally:
+        server.shutdown()
+
+    report = {
+        "meta": {
+            "created": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "backend": "mongod" if args.mongo_uri else "mongomock",
+            "sweets": args.sweets,
+            "users": args.users,
+            "purchases": args.purchases,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "results": results,
+    }
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    print_report(report)
+    return report
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port, process, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"benchmark server exited with status {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"benchmark server did not listen on port {port}")
+
+
+def run_concurrency(args):
+    """Hold many connections against each deployment mode and compare."""
+    rng = random.Random(args.seed)
+    token_app = create_app(testing=True)
+    selected = args.scenarios.split(",")
+    backend = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+    results = {}
+    for mode in args.modes.split(","):
+        port = _free_port()
+        print(f"starting {mode} server ...", file=sys.stderr)
+        process = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.server", mode, "--port", str(port),
+             "--workers", str(args.workers), "--latency-ms", str(args.latency_ms),
+             "--sweets", str(args.sweets), "--users", str(args.users),
+             "--purchases", str(args.purchases), "--seed", str(args.seed)],
+            cwd=backend, stdout=subprocess.PIPE, text=True,
+            # The data lives in mongomock; keep the client from resolving .env's cluster
+            env={**os.environ, "MONGO_URI": "mongodb://127.0.0.1:27017/bench"},
+        )
+        try:
+            seeded = json.loads(process.stdout.readline() or "null")
+            if seeded is None:
+                raise RuntimeError(f"{mode} server exited before seeding")
+            _wait_for_port(port, process)
+            make = scenarios(token_app, seeded["sweets"], seeded["users"], rng)
+            for name in selected:
+                results[f"{mode}:{name}"] = run_http(port, make[name], args.requests, args.connections, None)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    report = {
+        "meta": {
+            "created": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "backend": "mongomock",
+            "sweets": args.sweets,
+            "users": args.users,
+            "purchases": args.purchases,
+            "requests": args.requests,
+            "connections": args.connections,
+            "sync_workers": args.workers,
+            "latency_ms": args.latency_ms,
+        },
+        "results": results,
+    }
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    print_report(report)
+    return report
+
+
+def print_report(report):
+    print(f"{'scenario':<20} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'mongo/req':>10} {'errors':>7}")
+    for name, r in report["results"].items():
+        print(f"{name:<20} {r['throughput_rps']:>9.1f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+              f"{r['p99_ms']:>9.2f} {r['mongo_calls_per_request']:>10.2f} {r['errors']:>7}")
+
+
+# -------------------------------
+# Regression check
+# -------------------------------
+def compare(baseline, current, threshold=0.10):
+    """Return a list of human-readable regressions of `current` against `baseline`."""
+    regressions = []
+    for name, base in baseline["results"].items():
+        now = current["results"].get(name)
+        if now is None:
+            continue
+        if now["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{name}: throughput {base['throughput_rps']} -> {now['throughput_rps']} rps")
+        for key in ("p95_ms", "p99_ms"):
+            if now[key] > base[key] * (1 + threshold):
+                regressions.append(f"{name}: {key} {base[key]} -> {now[key]}")
+        # Round trips are deterministic, so any increase counts
+        if now["mongo_calls_per_request"] > base["mongo_calls_per_request"]:
+            regressions.append(f"{name}: mongo calls/request {base['mongo_calls_per_request']} "
+                               f"-> {now['mongo_calls_per_request']}")
+        if now["errors"] > base["errors"]:
+            regressions.append(f"{name}: errors {base['errors']} -> {now['errors']}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.endpoints")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="seed data and benchmark the endpoints")
+    run_parser.add_argument("--sweets", type=int, default=10_000)
+    run_parser.add_argument("--users", type=int, default=1_000)
+    run_parser.add_argument("--purchases", type=int, default=10_000, help="1k to 1M")
+    run_parser.add_argument("--requests", type=int, default=300, help="per scenario and driver")
+    run_parser.add_argument("--concurrency", type=int, default=8)
+    run_parser.add_argument("--scenarios", help="comma-separated subset, e.g. sweets,buy")
+    run_parser.add_argument("--mongo-uri", help="benchmark against this mongod instead of mongomock")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--out", help="write the JSON report here")
+
+    concurrency_parser = commands.add_parser(
+        "concurrency", help="compare gunicorn sync workers with the gevent server under many connections")
+    concurrency_parser.add_argument("--modes", default="sync,gevent")
+    concurrency_parser.add_argument("--connections", type=int, default=200)
+    concurrency_parser.add_argument("--workers", type=int, default=4, help="gunicorn sync workers")
+    concurrency_parser.add_argument("--latency-ms", type=float, default=5.0,
+                                    help="simulated round trip per Mongo call")
+    concurrency_parser.add_argument("--sweets", type=int, default=1_000)
+    concurrency_parser.add_argument("--users", type=int, default=100)
+    concurrency_parser.add_argument("--purchases", type=int, default=10_000)
+    concurrency_parser.add_argument("--requests", type=int, default=2_000, help="per scenario and mode")
+    concurrency_parser.add_argument("--scenarios", default="history,buy")
+    concurrency_parser.add_argument("--seed", type=int, default=42)
+    concurrency_parser.add_argument("--out", help="write the JSON report here")
+
+    compare_parser = commands.add_parser("compare", help="flag regressions against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10)
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        run(args)
+        return 0
+    if args.command == "concurrency":
+        run_concurrency(args)
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = compare(baseline, current, args.threshold)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print("No regressions")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Seeded benchmark app behind a real server, for `endpoints.py concurrency`.
+
+    python -m benchmarks.server {sync,gevent} --port 8001 [--workers 4]
+        [--latency-ms 5] [--sweets 1000] [--users 100] [--purchases 10000]
+
+"sync" is gunicorn with sync workers: one request per process at a time.
+"gevent" is async_server.py: one cooperative process. Both serve the
+mongomock data `endpoints.seed` writes. Every driver call first sleeps
+--latency-ms to stand in for the network round trip to a real mongod,
+which is what the sync workers block on. The seeded user and sweet ids go
+to stdout as one JSON line so the caller can mint tokens.
+"""
+import sys
+
+if __name__ == "__main__" and sys.argv[1:2] == ["gevent"]:
+    from gevent import monkey
+
+    monkey.patch_all()
+
+import argparse
+import json
+import os
+import random
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import mongomock
+
+from benchmarks.counting import CountingDatabase
+from benchmarks.endpoints import seed
+from app import create_app
+from extensions import mongo
+
+
+def build_app(args):
+    app = create_app(testing=True)
+    app.config["ASYNC_MAX_CONNECTIONS"] = args.connections
+    client = mongomock.MongoClient()
+    db = client["bench"]
+    mongo.cx, mongo.db = client, db
+    sweet_docs, user_docs = seed(db, args.sweets, args.purchases, args.users, random.Random(args.seed))
+    mongo.db = CountingDatabase(db, latency=args.latency_ms / 1000.0)
+    print(json.dumps({
+        "sweets": [{"_id": str(s["_id"])} for s in sweet_docs],
+        "users": [{"_id": str(u["_id"]), "username": u["username"], "role": u["role"], "is_admin": u["is_admin"]}
+                  for u in user_docs],
+    }), flush=True)
+    # Handlers print debug lines; nobody reads the pipe after the ids
+    sys.stdout = open(os.devnull, "w")
+    return app
+
+
+def serve_sync(app, port, workers):
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            # Seeded before the fork, so every worker starts from the same data
+            self.cfg.set("bind", f"127.0.0.1:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("worker_class", "sync")
+            self.cfg.set("loglevel", "warning")
+
+        def load(self):
+            return app
+
+    Server().run()
+
+
+def serve_gevent(app, port):
+    import async_server
+
+    async_server.make_server(app, "127.0.0.1", port).serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.server")
+    parser.add_argument("mode", choices=["sync", "gevent"])
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--workers", type=int, default=4, help="sync workers")
+    parser.add_argument("--connections", type=int, default=1000, help="gevent concurrency cap")
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--sweets", type=int, default=1_000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--purchases", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    app = build_app(args)
+    if args.mode == "sync":
+        serve_sync(app, args.port, args.workers)
+    else:
+        serve_gevent(app, args.port)
+
+
+if __name__ == "__main__":
+    main()
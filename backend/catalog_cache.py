@@ -0,0 +1,71 @@
+import hashlib
+import threading
+
+from extensions import mongo
+from coherence import coherence
+
+
+class CatalogCache:
+    """Serialized catalog bytes for `GET /api/sweets`, rebuilt only after a write.
+
+    Every code path that changes a sweet (add, update, delete, restock,
+    purchase) calls `bump()`. Reads between bumps are served from memory
+    without touching Mongo or the JSON encoder. Bumps are published through
+    coherence so other workers expire their copy too: `bump()` on "sweets"
+    for edits, `bump_stock()` on "stock" for quantity changes, which also
+    tells the search index which sweets to re-read.
+    """
+
+    def __init__(self):
+        self._version_lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._version = 0
+        self._entries = {}  # projection key -> (version, body, etag)
+
+    def init_app(self, app):
+        app.extensions["catalog_cache"] = self
+        self.expire()
+
+    @property
+    def version(self):
+        return self._version
+
+    def expire(self):
+        """Drop the local copy only."""
+        with self._version_lock:
+            self._version += 1
+
+    def bump(self):
+        """Expire the catalog in this and every other worker."""
+        coherence.invalidate("sweets")
+
+    def bump_stock(self, sweet_ids):
+        """Like `bump()`, for a change to the quantities of `sweet_ids` only."""
+        coherence.invalidate("stock", keys={str(i) for i in sweet_ids})
+
+    def get(self, dumps, projection=None):
+        """Return `(body, etag)` for the current catalog version.
+
+        Each projection (see `projection.FieldSet`) is cached separately.
+        """
+        key = tuple(sorted(projection.items())) if projection else None
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == self._version:
+            return entry[1], entry[2]
+
+        with self._build_lock:
+            version = self._version
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                return entry[1], entry[2]
+
+            body = dumps(list(mongo.db.sweets.find({}, projection))).encode("utf-8")
+            etag = hashlib.sha1(body).hexdigest()
+            # Writers bump after committing, so a write that lands during the
+            # load leaves this entry stale and the next read rebuilds it
+            self._entries[key] = (version, body, etag)
+            return body, etag
+
+catalog_cache = CatalogCache()
+coherence.register("sweets", catalog_cache.expire)
+coherence.register("stock", catalog_cache.expire)
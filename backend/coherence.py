@@ -0,0 +1,196 @@
+import threading
+import time
+
+from pymongo import ReturnDocument
+
+from extensions import mongo
+
+# Generations kept in each namespace's change log; a worker further behind
+# than this gets `None` from `changes()` and rebuilds instead
+CHANGE_LOG_SIZE = 256
+
+
+def _changes_since(generation, log, since):
+    """Union of the keys logged after `since`, or None if the log does not reach back."""
+    behind = generation - since if since is not None else None
+    if behind is None or behind > len(log):
+        return None
+    entries = log[len(log) - behind:]
+    if any(keys is None for keys in entries):
+        return None
+    return set().union(*entries)
+
+
+class MongoGenerationStore:
+    """Per-namespace generation counters in the `cache_generations` collection.
+
+    Each increment also appends its keys (or None) to a capped `changes`
+    array in the same document, so the entry for generation g is always at
+    `len(changes) - (generation - g) - 1`.
+    """
+
+    def incr(self, namespace, keys=None):
+        doc = mongo.db.cache_generations.find_one_and_update(
+            {"_id": namespace},
+            {
+                "$inc": {"generation": 1},
+                "$push": {"changes": {"$each": [sorted(keys) if keys is not None else None],
+                                      "$slice": -CHANGE_LOG_SIZE}},
+            },
+            projection={"changes": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return doc["generation"]
+
+    def read(self, namespaces):
+        docs = mongo.db.cache_generations.find({"_id": {"$in": list(namespaces)}}, {"changes": 0})
+        return {doc["_id"]: doc["generation"] for doc in docs}
+
+    def changes(self, namespace, since):
+        doc = mongo.db.cache_generations.find_one({"_id": namespace})
+        if doc is None:
+            return None
+        return _changes_since(doc["generation"], doc.get("changes", []), since)
+
+
+class MemoryGenerationStore:
+    """In-process counters; share one instance to simulate several workers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generations = {}
+        self._logs = {}
+
+    def incr(self, namespace, keys=None):
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            log = self._logs.setdefault(namespace, [])
+            log.append(set(keys) if keys is not None else None)
+            del log[:-CHANGE_LOG_SIZE]
+            return self._generations[namespace]
+
+    def read(self, namespaces):
+        with self._lock:
+            return {ns: self._generations[ns] for ns in namespaces if ns in self._generations}
+
+    def changes(self, namespace, since):
+        with self._lock:
+            if namespace not in self._generations:
+                return None
+            return _changes_since(self._generations[namespace], self._logs[namespace], since)
+
+
+class Coherence:
+    """Keeps in-process caches coherent across gunicorn workers.
+
+    A cache registers a callback for its namespace ("sweets", "users",
+    "stats", ...). Writers call `invalidate(namespace)`, which bumps the
+    shared generation counter and drops the local entries at once. Every
+    other worker notices the new generation the next time it calls
+    `check()`, at most once every COHERENCE_CHECK_INTERVAL_MS.
+
+    Writers may pass the keys they changed; caches registered with
+    `register_changes()` then get those keys and can update in place
+    instead of starting over.
+    """
+
+    def __init__(self, store=None):
+        self.store = store
+        self.interval = 0.5
+        self._callbacks = {}
+        self._keyed = {}
+        self._known = {}
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault("COHERENCE_BACKEND", "memory" if app.testing else "mongo")
+        app.config.setdefault("COHERENCE_CHECK_INTERVAL_MS", 500)
+        app.extensions["coherence"] = self
+
+        backend = app.config["COHERENCE_BACKEND"]
+        if backend == "mongo":
+            self.store = MongoGenerationStore()
+        elif backend == "memory":
+            self.store = MemoryGenerationStore()
+        else:
+            raise ValueError(f"Unknown COHERENCE_BACKEND: {backend}")
+        self.interval = app.config["COHERENCE_CHECK_INTERVAL_MS"] / 1000.0
+        self._known = {}
+        self._last_check = 0.0
+
+        app.before_request(self.check)
+
+    def register(self, namespace, on_stale, remote_only=False):
+        """Call `on_stale` when `namespace` changes.
+
+        Caches that apply their own writes incrementally pass `remote_only`
+        so they are only dropped for writes made by other workers.
+        """
+        self._callbacks.setdefault(namespace, []).append((on_stale, remote_only))
+
+    def register_changes(self, namespace, on_change):
+        """Call `on_change(keys)` with the keys other workers changed in `namespace`.
+
+        `keys` is None when they are not known (the change log no longer
+        reaches back far enough, or a writer passed no keys).
+        """
+        self._keyed.setdefault(namespace, []).append(on_change)
+        self._callbacks.setdefault(namespace, [])
+
+    def _drop(self, namespace, remote):
+        for callback, remote_only in self._callbacks.get(namespace, []):
+            if remote or not remote_only:
+                callback()
+
+    def _changes(self, namespace, since):
+        try:
+            return self.store.changes(namespace, since)
+        except Exception as e:
+            print(f"Cache change log read failed: {e}")
+            return None
+
+    def invalidate(self, namespace, keys=None):
+        if self.store is not None:
+            generation = self.store.incr(namespace, keys)
+            with self._lock:
+                # Only our own bump may be marked as seen. A larger jump means
+                # another worker wrote in between; leave it for check() so
+                # remote_only caches are dropped too.
+                if self._known.get(namespace) == generation - 1:
+                    self._known[namespace] = generation
+        self._drop(namespace, remote=False)
+
+    def check(self, force=False):
+        """Drop local entries for namespaces another worker has written to."""
+        if self.store is None or not self._callbacks:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_check < self.interval:
+            return
+        with self._lock:
+            if not force and now - self._last_check < self.interval:
+                return
+            self._last_check = now
+            try:
+                generations = self.store.read(self._callbacks)
+            except Exception as e:
+                print(f"Cache coherence check failed: {e}")
+                return
+            for namespace in self._callbacks:
+                # Never written yet: the first write's keys are then known
+                if namespace not in generations:
+                    self._known.setdefault(namespace, 0)
+            stale = {ns: self._known.get(ns) for ns, gen in generations.items() if self._known.get(ns) != gen}
+            for namespace in stale:
+                self._known[namespace] = generations[namespace]
+        for namespace, since in stale.items():
+            self._drop(namespace, remote=True)
+            if self._keyed.get(namespace):
+                keys = self._changes(namespace, since)
+                for on_change in self._keyed[namespace]:
+                    on_change(keys)
+
+
+coherence = Coherence()
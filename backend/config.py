@@ -12,3 +12,59 @@ class Config:
     MAIL_USERNAME = os.getenv("MAIL_USERNAME")  # your email
     MAIL_PASSWORD = os.getenv("MAIL_PASSWORD")  # your email app password
     MAIL_DEFAULT_SENDER = os.getenv("MAIL_DEFAULT_SENDER", MAIL_USERNAME)
+
+    # Email outbox: background workers that deliver queued mail
+    OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", 2))
+    OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 20))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 5))
+    OUTBOX_CLAIM_TIMEOUT = float(os.getenv("OUTBOX_CLAIM_TIMEOUT", 300))
+
+    # Purchase history paging and streaming
+    HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", 50))
+    HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", 500))
+    HISTORY_STREAM_BATCH_SIZE = int(os.getenv("HISTORY_STREAM_BATCH_SIZE", 500))
+
+    # GET /api/sweets: browsers may show a stale catalog briefly while revalidating
+    CATALOG_CACHE_CONTROL = os.getenv("CATALOG_CACHE_CONTROL", "public, max-age=0, stale-while-revalidate=10")
+
+    # Cross-worker cache coherence; COHERENCE_BACKEND defaults to "mongo" ("memory" under tests)
+    COHERENCE_CHECK_INTERVAL_MS = int(os.getenv("COHERENCE_CHECK_INTERVAL_MS", 500))
+
+    # bcrypt work factor; stored hashes with a different cost are upgraded on login
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+
+    # Processes per worker that run bcrypt (see passwords.py); unset, one per
+    # worker, or inline (0) under tests
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS")) if os.getenv("PASSWORD_HASH_WORKERS") else None
+
+    # Request threads per worker (gunicorn.conf.py sets it; 0 = not a fixed pool)
+    REQUEST_THREADS = int(os.getenv("REQUEST_THREADS", 0))
+
+    # Auth admission control: concurrent bcrypt-heavy requests per worker, then
+    # a bounded wait queue; overflow gets 503 with Retry-After. Unset, both
+    # follow REQUEST_THREADS so auth can never hold every request thread
+    AUTH_CONCURRENCY = int(os.getenv("AUTH_CONCURRENCY")) if os.getenv("AUTH_CONCURRENCY") else None
+    AUTH_QUEUE_SIZE = int(os.getenv("AUTH_QUEUE_SIZE")) if os.getenv("AUTH_QUEUE_SIZE") else None
+    AUTH_QUEUE_TIMEOUT = float(os.getenv("AUTH_QUEUE_TIMEOUT", 2.0))
+
+    # Rate limits on auth (Flask-Limiter); point RATELIMIT_STORAGE_URI at
+    # MONGO_URI to share counters between workers
+    RATELIMIT_STORAGE_URI = os.getenv("RATELIMIT_STORAGE_URI", "memory://")
+    RATELIMIT_STRATEGY = os.getenv("RATELIMIT_STRATEGY", "sliding-window-counter")
+    LOGIN_RATE_LIMIT_PER_IP = os.getenv("LOGIN_RATE_LIMIT_PER_IP", "30/minute")
+    LOGIN_RATE_LIMIT_PER_USERNAME = os.getenv("LOGIN_RATE_LIMIT_PER_USERNAME", "5/minute")
+    REGISTER_RATE_LIMIT_PER_IP = os.getenv("REGISTER_RATE_LIMIT_PER_IP", "10/hour")
+
+    # Users loaded by handlers that need more than the JWT claims
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 1024))
+    USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 60))
+
+    # Driver connection pool per process; raise it along with ASYNC_MAX_CONNECTIONS
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+
+    # Cooperative (gevent) deployment, see async_server.py: requests in flight per process
+    ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", 1000))
+
+    # Ensure indexes and build the search index off the startup path, so a
+    # cold start can answer its first request sooner
+    STARTUP_WARMUP_IN_BACKGROUND = os.getenv("STARTUP_WARMUP_IN_BACKGROUND", "1") == "1"
@@ -0,0 +1,75 @@
+import os
+import re
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "emails")
+
+# Each email is authored as `<name>.html` with a stylesheet link to `<name>.css`
+_STYLESHEET_LINK = re.compile(r'<link rel="stylesheet" href="([\w.-]+\.css)">')
+
+
+class _InliningLoader(FileSystemLoader):
+    """Replaces stylesheet links with the stylesheet contents before compiling,
+    so the CSS becomes a constant chunk of the compiled template."""
+
+    def get_source(self, environment, template):
+        source, filename, uptodate = super().get_source(environment, template)
+
+        def inline(match):
+            css, _, _ = super(_InliningLoader, self).get_source(environment, match.group(1))
+            return "<style>{% raw %}\n" + css + "{% endraw %}</style>"
+
+        return _STYLESHEET_LINK.sub(inline, source), filename, uptodate
+
+
+def _bytecode_cache(cache_dir):
+    """Jinja's own per-user cache directory unless one is configured.
+
+    Jinja creates that directory with mode 0700 and refuses to use it when
+    another user owns it, so nobody else can plant bytecode for us to load.
+    """
+    if cache_dir is None:
+        return FileSystemBytecodeCache()
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    return FileSystemBytecodeCache(cache_dir)
+
+
+class EmailTemplates:
+    """Loads and compiles the email templates once per process, on first render.
+
+    Templates are autoescaped, so user supplied values such as usernames and
+    sweet names are always HTML-escaped when rendered.
+    """
+
+    TEMPLATES = ("welcome", "login_alert", "purchase_confirmation", "order_confirmation")
+
+    def __init__(self, app=None):
+        self._templates = {}
+        self._cache_dir = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        cache_dir = app.config.setdefault("EMAIL_TEMPLATE_CACHE_DIR", None)
+        app.extensions["email_templates"] = self
+        # Compiling is left to the first email so it stays off cold starts
+        self._cache_dir = cache_dir
+        self._templates = {}
+
+    def load(self, bytecode_cache=None):
+        env = Environment(
+            loader=_InliningLoader(TEMPLATE_DIR),
+            autoescape=True,
+            auto_reload=False,
+            bytecode_cache=bytecode_cache,
+        )
+        self._templates = {name: env.get_template(f"{name}.html") for name in self.TEMPLATES}
+
+    def render(self, name, **context):
+        if not self._templates:
+            self.load(_bytecode_cache(self._cache_dir))
+        return self._templates[name].render(**context)
+
+
+email_templates = EmailTemplates()
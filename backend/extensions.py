@@ -1,7 +1,31 @@
+from flask import current_app
 from flask_pymongo import PyMongo
 from flask_jwt_extended import JWTManager
-from flask_mail import Mail
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+
+
+class LazyMail:
+    """Flask-Mail, set up the first time a connection is opened.
+
+    Only the outbox workers send mail, so web requests and cold starts never
+    import flask_mail (and with it smtplib and most of the email package).
+    """
+
+    def init_app(self, app):
+        # Settings are read on first connect; drop any state from an earlier init
+        app.extensions.pop("mail", None)
+
+    def connect(self):
+        from flask_mail import Mail
+
+        app = current_app._get_current_object()
+        if "mail" not in app.extensions:
+            Mail().init_app(app)
+        return app.extensions["mail"].connect()
+
 
 mongo = PyMongo()
 jwt = JWTManager()
-mail = Mail()
+mail = LazyMail()
+limiter = Limiter(key_func=get_remote_address)
@@ -0,0 +1,96 @@
+"""Production gunicorn settings; run from the backend directory:
+
+    gunicorn -c gunicorn.conf.py
+
+The master imports the app once (preload_app) and the workers share that
+code copy-on-write. Nothing in the master touches Mongo or starts threads:
+`create_app(preload=True)` skips that work and `post_worker_init` runs it in
+each worker, after the fork. Tune with environment variables:
+
+    GUNICORN_WORKER_CLASS  gthread (default), gevent or sync
+    WEB_CONCURRENCY        worker processes (default 2 * CPUs + 1; CPUs for gevent)
+    GUNICORN_THREADS       threads per gthread worker (default 4)
+    ASYNC_MAX_CONNECTIONS  concurrent requests per gevent worker (default 1000)
+    GUNICORN_MAX_REQUESTS  recycle a worker after this many requests (default 2000, 0 = never)
+    GUNICORN_PRELOAD       0 to import the app in each worker instead
+
+The Mongo pool per worker follows the worker's concurrency unless
+MONGO_MAX_POOL_SIZE is set. Each worker gets PASSWORD_HASH_WORKERS bcrypt
+processes (default 1), so hashing never runs on more cores than there are
+workers.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+
+if worker_class == "gevent":
+    # Patch before the preloaded app imports socket, threading and pymongo
+    from gevent import monkey
+
+    monkey.patch_all()
+
+cpus = multiprocessing.cpu_count()
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '5000')}")
+wsgi_app = "app:create_app(preload=True)"
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") != "0"
+
+if worker_class == "gevent":
+    # One cooperative worker per core already keeps every core busy
+    workers = int(os.getenv("WEB_CONCURRENCY", cpus))
+    worker_connections = int(os.getenv("ASYNC_MAX_CONNECTIONS", 1000))
+    os.environ.setdefault("MONGO_MAX_POOL_SIZE", str(min(worker_connections, 100)))
+elif worker_class == "gthread":
+    workers = int(os.getenv("WEB_CONCURRENCY", cpus * 2 + 1))
+    threads = int(os.getenv("GUNICORN_THREADS", 4))
+    # Room for the outbox and analytics threads next to the request threads
+    os.environ.setdefault("MONGO_MAX_POOL_SIZE", str(threads + 4))
+    # Sizes the auth admission gate below the thread count (see admission.py)
+    os.environ.setdefault("REQUEST_THREADS", str(threads))
+else:
+    workers = int(os.getenv("WEB_CONCURRENCY", cpus * 2 + 1))
+    os.environ.setdefault("MONGO_MAX_POOL_SIZE", "5")
+    os.environ.setdefault("REQUEST_THREADS", "1")
+
+# bcrypt pool per worker; the workers already cover every core
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "1")
+
+# Recycle workers so slow leaks and fragmentation stay bounded; the jitter
+# keeps them from all restarting at once
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = max_requests // 10
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+
+# Worker heartbeats go to tmpfs rather than a possibly slow disk
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+
+# Every worker writes its metrics here and /metrics adds them up (see metrics.py)
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "sweetshop-prometheus"))
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    # Samples from a previous run would be added to this one
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def post_worker_init(worker):
+    from app import init_worker
+
+    init_worker(worker.wsgi)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
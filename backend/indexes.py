@@ -0,0 +1,96 @@
+import click
+from flask.cli import with_appcontext
+from pymongo.errors import OperationFailure
+
+from extensions import mongo
+
+
+class IndexRegistry:
+    """Indexes and hot queries declared by the modules that rely on them.
+
+    Blueprints call `index()` at import time for every index their queries
+    need and `hot_query()` for the queries that must never scan a whole
+    collection. `ensure()` creates the indexes idempotently at startup and
+    `flask check-indexes` runs `explain()` on every hot query.
+    """
+
+    def __init__(self):
+        self.indexes = []
+        self.queries = []
+
+    def index(self, collection, keys, **options):
+        self.indexes.append((collection, keys, options))
+
+    def hot_query(self, name, collection, filter, sort=None):
+        self.queries.append((name, collection, filter, sort))
+
+    def init_app(self, app):
+        app.config.setdefault("MONGO_ENSURE_INDEXES", True)
+        app.extensions["index_registry"] = self
+        app.cli.add_command(check_indexes_command)
+
+    def init_worker(self, app):
+        if app.config["MONGO_ENSURE_INDEXES"] and not app.testing:
+            try:
+                self.ensure()
+            except Exception as e:
+                print(f"Index bootstrap failed: {e}")
+
+    def ensure(self, db=None):
+        """Create every declared index. Returns the names that exist afterwards."""
+        db = mongo.db if db is None else db
+        names = []
+        for collection, keys, options in self.indexes:
+            try:
+                names.append(db[collection].create_index(keys, **options))
+            except OperationFailure as e:
+                # e.g. a unique index over existing duplicates; keep starting up
+                print(f"Could not create index {keys} on {collection}: {e}")
+        return names
+
+    def explain(self, db=None):
+        """Explain every hot query. Returns `(name, uses_index, stages)` tuples."""
+        db = mongo.db if db is None else db
+        report = []
+        for name, collection, filter, sort in self.queries:
+            cursor = db[collection].find(filter)
+            if sort:
+                cursor = cursor.sort(sort)
+            stages = plan_stages(cursor.explain())
+            report.append((name, "COLLSCAN" not in stages, stages))
+        return report
+
+
+def plan_stages(explain_output):
+    """Flatten the stage names of an explain() winning plan, outermost first."""
+    planner = explain_output.get("queryPlanner", explain_output)
+    plan = planner.get("winningPlan", {})
+    # Slot-based engine plans nest the classic tree under "queryPlan"
+    plan = plan.get("queryPlan", plan)
+
+    stages = []
+    pending = [plan]
+    while pending:
+        node = pending.pop(0)
+        if "stage" in node:
+            stages.append(node["stage"])
+        if "inputStage" in node:
+            pending.append(node["inputStage"])
+        pending.extend(node.get("inputStages", []))
+    return stages
+
+
+@click.command("check-indexes")
+@with_appcontext
+def check_indexes_command():
+    """Explain every hot query and report the ones that scan a collection."""
+    failures = 0
+    for name, uses_index, stages in registry.explain():
+        status = "ok  " if uses_index else "SCAN"
+        click.echo(f"[{status}] {name}: {' <- '.join(stages)}")
+        failures += not uses_index
+    if failures:
+        raise SystemExit(f"{failures} hot query(ies) are not using an index")
+
+
+registry = IndexRegistry()
@@ -0,0 +1,48 @@
+import dataclasses
+import decimal
+import uuid
+
+import orjson
+from bson import Decimal128, ObjectId
+from flask.json.provider import JSONProvider
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATACLASS
+
+
+def _default(o):
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, Decimal128):
+        return str(o.to_decimal())
+    # Same encodings as Flask's default provider
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if dataclasses.is_dataclass(o):
+        return dataclasses.asdict(o)
+    if hasattr(o, "__html__"):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider on orjson.
+
+    Encodes ObjectId, datetime and Decimal directly, so handlers can return
+    Mongo documents without converting every field first. datetimes come out
+    in ISO 8601 like `datetime.isoformat()`.
+    """
+
+    mimetype = "application/json"
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_default, option=_OPTIONS).decode("utf-8")
+
+    def dumpb(self, obj):
+        return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumpb(obj), mimetype=self.mimetype)
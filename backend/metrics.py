@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+                               Histogram, generate_latest, multiprocess)
+from pymongo import monitoring
+
+# Under gunicorn, set PROMETHEUS_MULTIPROC_DIR before the workers start: each
+# worker writes its samples there and /metrics aggregates them, whichever
+# worker answers
+
+MONGO_COMMAND_SECONDS = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency",
+    ["command", "collection", "endpoint"],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5),
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "mongo_command_failures_total", "MongoDB commands that returned an error",
+    ["command", "collection", "endpoint"],
+)
+MONGO_POOL_CHECKED_OUT = Gauge(
+    "mongo_pool_checked_out_connections", "Connections currently checked out of the pool",
+    ["address"], multiprocess_mode="livesum",
+)
+MONGO_POOL_WAIT_SECONDS = Histogram(
+    "mongo_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection",
+    ["address"], buckets=(.0001, .0005, .001, .005, .01, .05, .1, .5, 1, 5),
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency by route",
+    ["blueprint", "endpoint", "method", "status"],
+)
+SMTP_SECONDS = Histogram(
+    "smtp_duration_seconds", "Outbound SMTP connect and send latency",
+    ["operation", "outcome"], buckets=(.01, .05, .1, .25, .5, 1, 2.5, 5, 10, 30),
+)
+
+
+def current_endpoint():
+    if has_request_context():
+        return request.endpoint or "unmatched"
+    # Background threads are tagged by name without the worker number
+    return threading.current_thread().name.rstrip("0123456789-") or "background"
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Times every MongoDB command, tagged with the Flask endpoint that sent it.
+
+    `started` runs on the thread issuing the command, so the request context
+    is still available there; the tags are kept until the reply arrives.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = ""
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (collection, current_endpoint())
+
+    def _finish(self, event):
+        with self._lock:
+            return self._pending.pop((event.connection_id, event.request_id), ("", "unknown"))
+
+    def succeeded(self, event):
+        collection, endpoint = self._finish(event)
+        MONGO_COMMAND_SECONDS.labels(event.command_name, collection, endpoint).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection, endpoint = self._finish(event)
+        MONGO_COMMAND_SECONDS.labels(event.command_name, collection, endpoint).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_FAILURES.labels(event.command_name, collection, endpoint).inc()
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Checked-out connection gauge and checkout wait histogram per server."""
+
+    def connection_checked_out(self, event):
+        address = "%s:%s" % event.address
+        MONGO_POOL_CHECKED_OUT.labels(address).inc()
+        MONGO_POOL_WAIT_SECONDS.labels(address).observe(event.duration)
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CHECKED_OUT.labels("%s:%s" % event.address).dec()
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL_WAIT_SECONDS.labels("%s:%s" % event.address).observe(event.duration)
+
+    # Nothing to record for the remaining pool events
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_created(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_closed(self, event): pass
+    def connection_check_out_started(self, event): pass
+
+
+@contextmanager
+def time_smtp(operation):
+    """Record how long an SMTP connect or send takes and whether it failed."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        SMTP_SECONDS.labels(operation, outcome).observe(time.perf_counter() - start)
+
+
+class Metrics:
+    """Request timing and the Prometheus `/metrics` endpoint.
+
+    Pass `metrics.listeners` to the Mongo client so command and pool events
+    are recorded too.
+    """
+
+    def __init__(self):
+        self.listeners = [CommandMetrics(), PoolMetrics()]
+
+    def init_app(self, app):
+        app.config.setdefault("METRICS_ENABLED", True)
+        app.extensions["metrics"] = self
+        if not app.config["METRICS_ENABLED"]:
+            return
+        app.before_request(self._start_timer)
+        app.after_request(self._observe)
+        app.add_url_rule("/metrics", "metrics", self.export)
+
+    def _start_timer(self):
+        g.request_started = time.perf_counter()
+
+    def _observe(self, response):
+        started = g.pop("request_started", None)
+        if started is not None and request.endpoint != "metrics":
+            HTTP_REQUEST_SECONDS.labels(
+                request.blueprint or "", request.endpoint or "unmatched", request.method, response.status_code
+            ).observe(time.perf_counter() - started)
+        return response
+
+    def export(self):
+        if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+metrics = Metrics()
@@ -0,0 +1,234 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+
+from extensions import mongo, mail
+from indexes import registry as index_registry
+from metrics import time_smtp
+
+index_registry.index("email_outbox", [("status", 1), ("next_attempt_at", 1)])
+index_registry.index("email_outbox", [("status", 1), ("claimed_at", 1)])
+index_registry.hot_query("outbox claim", "email_outbox", {"status": "pending", "next_attempt_at": {"$lte": 0}}, [("next_attempt_at", 1)])
+index_registry.hot_query("outbox reclaim", "email_outbox", {"status": "sending", "claimed_at": {"$lt": 0}})
+
+
+class EmailOutbox:
+    """Durable email queue backed by the `email_outbox` collection.
+
+    Request handlers only call `enqueue()`; a small pool of worker threads
+    claims pending jobs in batches and delivers them over a persistent SMTP
+    connection, retrying failed sends with exponential backoff. A job left
+    in `sending` longer than OUTBOX_CLAIM_TIMEOUT (its worker died mid-batch)
+    is claimed again, so delivery is at least once.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._threads = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._local = threading.local()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("OUTBOX_WORKERS", 2)
+        app.config.setdefault("OUTBOX_BATCH_SIZE", 20)
+        app.config.setdefault("OUTBOX_MAX_ATTEMPTS", 5)
+        app.config.setdefault("OUTBOX_BACKOFF_BASE", 2.0)
+        app.config.setdefault("OUTBOX_POLL_INTERVAL", 1.0)
+        app.config.setdefault("OUTBOX_IDLE_TIMEOUT", 30.0)
+        app.config.setdefault("OUTBOX_CLAIM_TIMEOUT", 300.0)
+        app.extensions["outbox"] = self
+        self.app = app
+
+    def init_worker(self, app):
+        if app.config["OUTBOX_WORKERS"] > 0 and not app.testing:
+            self.start()
+
+    @property
+    def collection(self):
+        return mongo.db.email_outbox
+
+    # -------------------------------
+    # Producer side
+    # -------------------------------
+    def enqueue(self, subject, recipients, html, sender=None):
+        now = datetime.utcnow()
+        job = {
+            "subject": subject,
+            "recipients": list(recipients),
+            "html": html,
+            "sender": sender,
+            "status": "pending",
+            "attempts": 0,
+            "last_error": None,
+            "created_at": now,
+            "next_attempt_at": now,
+        }
+        inserted = self.collection.insert_one(job)
+        self._wake.set()
+        return inserted.inserted_id
+
+    def queue_depth(self):
+        """Number of jobs that have not been delivered or given up on yet."""
+        return self.collection.count_documents({"status": {"$in": ["pending", "sending"]}})
+
+    # -------------------------------
+    # Consumer side
+    # -------------------------------
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        for i in range(self.app.config["OUTBOX_WORKERS"]):
+            thread = threading.Thread(target=self._run, name=f"email-outbox-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _claim_batch(self):
+        batch = []
+        now = datetime.utcnow()
+        expired = now - timedelta(seconds=self.app.config["OUTBOX_CLAIM_TIMEOUT"])
+        for _ in range(self.app.config["OUTBOX_BATCH_SIZE"]):
+            job = self.collection.find_one_and_update(
+                {"$or": [
+                    {"status": "pending", "next_attempt_at": {"$lte": now}},
+                    {"status": "sending", "claimed_at": {"$lt": expired}},
+                ]},
+                {"$set": {"status": "sending", "claimed_at": now}, "$inc": {"attempts": 1}},
+                sort=[("next_attempt_at", 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if not job:
+                break
+            batch.append(job)
+        return batch
+
+    def _mark_sent(self, job):
+        self.collection.update_one(
+            {"_id": job["_id"]},
+            {"$set": {"status": "sent", "sent_at": datetime.utcnow(), "last_error": None}},
+        )
+
+    def _mark_failed(self, job, error):
+        if job["attempts"] >= self.app.config["OUTBOX_MAX_ATTEMPTS"]:
+            update = {"status": "failed", "last_error": str(error)}
+        else:
+            delay = self.app.config["OUTBOX_BACKOFF_BASE"] ** job["attempts"]
+            update = {
+                "status": "pending",
+                "last_error": str(error),
+                "next_attempt_at": datetime.utcnow() + timedelta(seconds=delay),
+            }
+        self.collection.update_one({"_id": job["_id"]}, {"$set": update})
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            with time_smtp("connect"):
+                connection = mail.connect().__enter__()
+            self._local.connection = connection
+        return connection
+
+    def _close_connection(self):
+        connection = getattr(self._local, "connection", None)
+        self._local.connection = None
+        if connection is not None and connection.host is not None:
+            try:
+                connection.host.quit()
+            except Exception:
+                pass
+
+    def process_batch(self, keep_alive=False):
+        """Deliver one batch of due jobs. Returns the number of jobs claimed.
+
+        With `keep_alive` the SMTP connection is kept open on the calling
+        thread so the next batch skips the handshake.
+        """
+        batch = self._claim_batch()
+        if not batch:
+            return 0
+
+        # Deferred so that only processes which actually send mail load it
+        import smtplib
+        from flask_mail import Message
+
+        connection_errors = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+        with self.app.app_context():
+            try:
+                connection = self._connection()
+            except Exception as e:
+                for job in batch:
+                    self._mark_failed(job, e)
+                return len(batch)
+
+            try:
+                for i, job in enumerate(batch):
+                    msg = Message(
+                        subject=job["subject"],
+                        recipients=job["recipients"],
+                        html=job["html"],
+                        sender=job.get("sender"),
+                    )
+                    try:
+                        with time_smtp("send"):
+                            connection.send(msg)
+                    except connection_errors as e:
+                        # The connection is gone: reschedule the rest of the
+                        # batch and reconnect on the next one.
+                        for pending in batch[i:]:
+                            self._mark_failed(pending, e)
+                        self._close_connection()
+                        break
+                    except Exception as e:
+                        self._mark_failed(job, e)
+                    else:
+                        self._mark_sent(job)
+            finally:
+                if not keep_alive:
+                    self._close_connection()
+        return len(batch)
+
+    def drain(self):
+        """Synchronously deliver everything that is currently due."""
+        total = 0
+        while True:
+            claimed = self.process_batch()
+            if not claimed:
+                return total
+            total += claimed
+
+    def _run(self):
+        last_used = time.monotonic()
+        idle_timeout = self.app.config["OUTBOX_IDLE_TIMEOUT"]
+
+        while not self._stop.is_set():
+            try:
+                if self.process_batch(keep_alive=True):
+                    last_used = time.monotonic()
+                    continue
+            except Exception as e:
+                print(f"Email outbox worker error: {e}")
+                self._close_connection()
+
+            if time.monotonic() - last_used > idle_timeout:
+                self._close_connection()
+
+            self._wake.wait(self.app.config["OUTBOX_POLL_INTERVAL"])
+            self._wake.clear()
+
+        self._close_connection()
+
+
+outbox = EmailOutbox()
@@ -0,0 +1,86 @@
+import os
+import threading
+
+from utils import DEFAULT_ROUNDS, check_password, cooperative, hash_password, hash_rounds
+
+
+class PasswordHasher:
+    """Runs bcrypt in a bounded process pool.
+
+    bcrypt holds the calling worker for the whole hash, so with threaded
+    workers a few logins stall every other request. Hashes are sent to
+    PASSWORD_HASH_WORKERS processes instead; with 0 workers they run inline.
+    The pool is started on first use and restarted after a fork, so it is
+    never shared between gunicorn workers. Under gevent (async_server.py)
+    the hashes run in native threads instead, since bcrypt releases the GIL
+    and a blocking `result()` would stall every greenlet in the process.
+    """
+
+    def __init__(self, rounds=DEFAULT_ROUNDS, workers=0, timeout=10.0):
+        self.rounds = rounds
+        self.workers = workers
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pool = None
+        self._threads = None
+        self._pid = None
+
+    def init_app(self, app):
+        app.config.setdefault("BCRYPT_ROUNDS", DEFAULT_ROUNDS)
+        # One per app: gunicorn already runs a worker per core or more, and
+        # a pool per worker sized to the CPUs would oversubscribe them
+        if app.config.get("PASSWORD_HASH_WORKERS") is None:
+            app.config["PASSWORD_HASH_WORKERS"] = 0 if app.testing else 1
+        app.config.setdefault("PASSWORD_HASH_TIMEOUT", 10.0)
+        app.extensions["passwords"] = self
+        self.shutdown()
+        self.rounds = app.config["BCRYPT_ROUNDS"]
+        self.workers = app.config["PASSWORD_HASH_WORKERS"]
+        self.timeout = app.config["PASSWORD_HASH_TIMEOUT"]
+
+    def _executor(self):
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    # Imported here so startup does not load multiprocessing
+                    import multiprocessing
+                    from concurrent.futures import ProcessPoolExecutor
+
+                    # spawn, not fork: the parent is threaded and may hold locks
+                    self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+                    self._pid = os.getpid()
+        return self._pool
+
+    def _threadpool(self):
+        if self._threads is None:
+            from gevent.threadpool import ThreadPool
+            self._threads = ThreadPool(self.workers)
+        return self._threads
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        if cooperative():
+            return self._threadpool().spawn(fn, *args).get(timeout=self.timeout)
+        return self._executor().submit(fn, *args).result(timeout=self.timeout)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            if self._threads is not None:
+                self._threads.kill()
+            self._threads = None
+
+    def hash(self, password):
+        return self._run(hash_password, password, self.rounds)
+
+    def verify(self, password, hashed):
+        return self._run(check_password, password, hashed)
+
+    def needs_rehash(self, hashed):
+        return hash_rounds(hashed) != self.rounds
+
+
+passwords = PasswordHasher()
@@ -0,0 +1,176 @@
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from werkzeug.wsgi import ClosingIterator
+
+from utils import cooperative
+
+# Profiles are written in the "collapsed stack" format (one `a;b;c count`
+# line per distinct stack), which speedscope and flamegraph.pl both open
+SUFFIX = ".collapsed"
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _current_frame():
+    """Return a callable giving the calling request's innermost frame later on.
+
+    Under gevent `threading.get_ident()` is a greenlet id, which
+    `sys._current_frames()` (keyed by native thread) never contains, so the
+    request greenlet's own frame is read instead. The sampler is then a
+    greenlet too and only runs while the request is switched out, so gevent
+    profiles show where requests wait (Mongo, SMTP, bcrypt), not CPU time.
+    """
+    if cooperative():
+        import greenlet
+
+        current = greenlet.getcurrent()
+        return lambda: current.gr_frame
+    thread_id = threading.get_ident()
+    return lambda: sys._current_frames().get(thread_id)
+
+
+class _Sampler(threading.Thread):
+    """Samples one request's Python stack every `interval` seconds."""
+
+    def __init__(self, current_frame, interval):
+        super().__init__(name="profiler-sampler", daemon=True)
+        self.current_frame = current_frame
+        self.interval = interval
+        self.stacks = Counter()
+        self.started_at = time.perf_counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = self.current_frame()
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        return time.perf_counter() - self.started_at
+
+
+class RequestProfiler:
+    """WSGI middleware that samples the stacks of selected requests.
+
+    A request is profiled when a PROFILE_SAMPLE_RATE coin flip says so, or
+    when it carries the PROFILE_HEADER header together with an admin access
+    token. Everything else costs one random() call and a dict lookup.
+    Profiles go to PROFILE_DIR, which keeps the newest PROFILE_KEEP files.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.wsgi_app = None
+
+    def init_app(self, app):
+        app.config.setdefault("PROFILE_SAMPLE_RATE", 0.0)
+        app.config.setdefault("PROFILE_HEADER", "X-Profile")
+        app.config.setdefault("PROFILE_INTERVAL_MS", 5)
+        app.config.setdefault("PROFILE_DIR", os.path.join(app.instance_path, "profiles"))
+        app.config.setdefault("PROFILE_KEEP", 50)
+        app.extensions["profiler"] = self
+        self.app = app
+        self.wsgi_app = app.wsgi_app
+        app.wsgi_app = self
+
+    @property
+    def directory(self):
+        return self.app.config["PROFILE_DIR"]
+
+    def _requested_by_admin(self, environ):
+        header = "HTTP_" + self.app.config["PROFILE_HEADER"].upper().replace("-", "_")
+        if header not in environ:
+            return False
+        auth = environ.get("HTTP_AUTHORIZATION", "")
+        if not auth.startswith("Bearer "):
+            return False
+        from flask_jwt_extended import decode_token
+
+        try:
+            with self.app.app_context():
+                claims = decode_token(auth[len("Bearer "):])
+        except Exception:
+            return False
+        return claims.get("role") == "admin" or claims.get("is_admin") is True
+
+    def __call__(self, environ, start_response):
+        rate = self.app.config["PROFILE_SAMPLE_RATE"]
+        if not (rate and random.random() < rate) and not self._requested_by_admin(environ):
+            return self.wsgi_app(environ, start_response)
+
+        sampler = _Sampler(_current_frame(), self.app.config["PROFILE_INTERVAL_MS"] / 1000.0)
+        sampler.start()
+
+        finished = threading.Event()
+
+        def finish():
+            if finished.is_set():
+                return
+            finished.set()
+            elapsed = sampler.stop()
+            try:
+                self._save(environ, sampler.stacks, elapsed)
+            except OSError as e:
+                print(f"Could not save request profile: {e}")
+
+        try:
+            app_iter = self.wsgi_app(environ, start_response)
+        except BaseException:
+            finish()
+            raise
+
+        # Streamed bodies (the history endpoint) are profiled until fully
+        # sent, or until the server closes the response early
+        def body():
+            try:
+                yield from app_iter
+            finally:
+                finish()
+
+        return ClosingIterator(body(), [getattr(app_iter, "close", lambda: None), finish])
+
+    def _save(self, environ, stacks, elapsed):
+        os.makedirs(self.directory, exist_ok=True)
+        path = re.sub(r"[^A-Za-z0-9]+", "_", environ.get("PATH_INFO", "")).strip("_") or "root"
+        stamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        name = f"{stamp}-{environ['REQUEST_METHOD']}-{path}-{int(elapsed * 1000)}ms{SUFFIX}"
+        with open(os.path.join(self.directory, name), "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        self._rotate()
+
+    def _rotate(self):
+        for stale in self.list_profiles()[self.app.config["PROFILE_KEEP"]:]:
+            try:
+                os.remove(os.path.join(self.directory, stale["name"]))
+            except FileNotFoundError:
+                pass
+
+    def list_profiles(self):
+        """Profiles on disk, newest first."""
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith(SUFFIX)]
+        except FileNotFoundError:
+            return []
+        profiles = [{"name": e.name, "size": e.stat().st_size, "created": e.stat().st_mtime} for e in entries]
+        return sorted(profiles, key=lambda p: (p["created"], p["name"]), reverse=True)
+
+
+profiler = RequestProfiler()
@@ -0,0 +1,49 @@
+class UnknownFields(ValueError):
+    pass
+
+
+class FieldSet:
+    """The fields a client may select from a resource with `fields=` or `view=`.
+
+    `select()` turns the query string into an ordered tuple of field names
+    (None means everything), `projection()` into the Mongo projection that
+    fetches only what those fields need. `requires` lists stored fields a
+    field depends on, and `always` fields the handler itself needs, such as
+    the keyset pagination columns.
+    """
+
+    def __init__(self, fields, views=None, requires=None, always=("_id",)):
+        self.fields = tuple(fields)
+        self.views = {name: tuple(f for f in self.fields if f in view) for name, view in (views or {}).items()}
+        self.requires = requires or {}
+        self.always = tuple(always)
+
+    def select(self, args):
+        if fields := args.get("fields"):
+            wanted = {f.strip() for f in fields.split(",") if f.strip()}
+            unknown = wanted - set(self.fields)
+            if unknown:
+                raise UnknownFields(f"Unknown field(s): {', '.join(sorted(unknown))}")
+            return tuple(f for f in self.fields if f in wanted)
+        if view := args.get("view"):
+            if view not in self.views:
+                raise UnknownFields(f"Unknown view: {view}")
+            return self.views[view]
+        return None
+
+    def projection(self, fields):
+        if fields is None:
+            return None
+        stored = set(self.always)
+        for field in fields:
+            stored.update(self.requires.get(field, (field,)))
+        projection = {field: 1 for field in stored}
+        if "_id" not in stored:
+            projection["_id"] = 0
+        return projection
+
+    @staticmethod
+    def apply(doc, fields):
+        if fields is None:
+            return doc
+        return {f: doc[f] for f in fields if f in doc}
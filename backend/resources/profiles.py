@@ -0,0 +1,32 @@
+from flask import Blueprint, jsonify, send_from_directory
+from flask_jwt_extended import jwt_required
+from profiler import profiler, SUFFIX
+from users import current_user
+
+profiles_bp = Blueprint("profiles", __name__)
+
+
+def _is_admin():
+    user = current_user()
+    return bool(user) and (user.get("role") == "admin" or user.get("is_admin", False) is True)
+
+
+@profiles_bp.route("/", methods=["GET"])
+@jwt_required()
+def list_profiles():
+    """Recent request profiles, newest first"""
+    if not _is_admin():
+        return jsonify({"msg": "Admin access required"}), 403
+    return jsonify(profiler.list_profiles()), 200
+
+
+@profiles_bp.route("/<name>", methods=["GET"])
+@jwt_required()
+def download_profile(name):
+    """One profile in collapsed-stack format (opens in speedscope)"""
+    if not _is_admin():
+        return jsonify({"msg": "Admin access required"}), 403
+    if not name.endswith(SUFFIX):
+        return jsonify({"msg": "Profile not found"}), 404
+    # send_from_directory refuses names that escape the directory
+    return send_from_directory(profiler.directory, name, mimetype="text/plain", as_attachment=True)
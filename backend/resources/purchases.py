@@ -1,80 +1,218 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from extensions import mongo
+from outbox import outbox
+from email_templates import email_templates
 from datetime import datetime
 from bson import ObjectId
+from bson.errors import InvalidId
+import base64
+import json
+import stock
+import rollups
+import analytics
+from indexes import registry as index_registry
+from users import current_user, user_cache
+from projection import FieldSet, UnknownFields
 
 purchases_bp = Blueprint("purchases", __name__, url_prefix="/api/purchases")
 
+index_registry.index("purchase_history", [("timestamp", -1), ("_id", -1)])
+index_registry.index("purchase_history", [("user_id", 1), ("timestamp", -1), ("_id", -1)])
+index_registry.index("purchase_history", [("sweet_id", 1), ("timestamp", -1)])
+index_registry.hot_query("admin history page", "purchase_history", {}, [("timestamp", -1), ("_id", -1)])
+index_registry.hot_query("user history page", "purchase_history", {"user_id": ""}, [("timestamp", -1), ("_id", -1)])
+index_registry.hot_query("history by sweet", "purchase_history", {"sweet_id": ""}, [("timestamp", -1)])
+
+# ?fields=... or ?view=summary on /history; user_name and user_email are
+# resolved from users (admins only), the rest map onto the projection
+HISTORY_FIELDS = FieldSet(
+    ["_id", "sweet_id", "sweet_name", "quantity", "price", "total", "timestamp", "user_id", "user_name", "user_email"],
+    views={"summary": ["_id", "sweet_name", "quantity", "total", "timestamp", "user_name", "user_email"]},
+    requires={"user_name": ("user_id",), "user_email": ("user_id",)},
+    # Keyset pagination reads both from every row
+    always=("_id", "timestamp"),
+)
+_STORED_HISTORY_FIELDS = [f for f in HISTORY_FIELDS.fields if f not in ("user_name", "user_email")]
+
+
+def _encode_cursor(purchase):
+    raw = json.dumps({"t": purchase["timestamp"].isoformat(), "id": str(purchase["_id"])})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(token):
+    """Inverse of `_encode_cursor`; any token it did not produce raises ValueError."""
+    raw = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    if not isinstance(raw, dict) or not isinstance(raw.get("t"), str) or not isinstance(raw.get("id"), str):
+        raise ValueError("malformed cursor")
+    return datetime.fromisoformat(raw["t"]), ObjectId(raw["id"])
+
+
+def _history_query(user, current_user_id, args):
+    """Build the purchase_history filter for this caller and the query string."""
+    clauses = []
+
+    if user.get("is_admin", False) is True:
+        if filter_user := args.get("user_id"):
+            clauses.append({"user_id": stock.as_user_id(filter_user)})
+    else:
+        try:
+            user_object_id = ObjectId(current_user_id)
+            clauses.append({"$or": [{"user_id": user_object_id}, {"user_id": current_user_id}]})
+        except:
+            clauses.append({"user_id": current_user_id})
+
+    if sweet_id := args.get("sweet_id"):
+        clauses.append({"sweet_id": ObjectId(sweet_id)})
+
+    date_range = {}
+    if date_from := args.get("from"):
+        date_range["$gte"] = datetime.fromisoformat(date_from)
+    if date_to := args.get("to"):
+        date_range["$lt"] = datetime.fromisoformat(date_to)
+    if date_range:
+        clauses.append({"timestamp": date_range})
+
+    # Keyset pagination on (timestamp, _id), newest first
+    if token := args.get("cursor"):
+        timestamp, last_id = _decode_cursor(token)
+        clauses.append({"$or": [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": last_id}},
+        ]})
+
+    if not clauses:
+        return {}
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _resolve_purchase_users(purchases):
+    """Resolve every buyer in `purchases` with a single $in query.
+
+    Returns a dict of user documents by id, or None if the lookup failed.
+    """
+    try:
+        user_ids = list({p["user_id"] for p in purchases})
+        return {
+            u["_id"]: u for u in mongo.db.users.find(
+                {"_id": {"$in": user_ids}}, {"username": 1, "name": 1, "email": 1}
+            )
+        }
+    except Exception as e:
+        print(f"Error fetching user info for purchase history: {e}")
+        return None
+
+
+def _serialize_purchases(purchases, is_admin, fields=None):
+    fields = fields or HISTORY_FIELDS.fields
+    resolve_users = is_admin and ("user_name" in fields or "user_email" in fields)
+    purchase_users = _resolve_purchase_users(purchases) if resolve_users else {}
+    stored = [f for f in fields if f in _STORED_HISTORY_FIELDS]
+
+    result = []
+    for p in purchases:
+        # ObjectIds and datetimes are encoded by the app's JSON provider
+        purchase_data = {f: p.get(f) for f in stored}
+        for f in ("price", "total"):
+            if purchase_data.get(f) is not None:
+                purchase_data[f] = float(purchase_data[f])
+
+        if resolve_users:
+            purchase_user = purchase_users.get(p["user_id"]) if purchase_users is not None else None
+            if purchase_users is None:
+                user_name, user_email = "Unknown User", str(p["user_id"])
+            elif purchase_user:
+                user_name = purchase_user.get("username") or purchase_user.get("name") or "Unknown User"
+                user_email = purchase_user.get("email", "")
+            else:
+                user_name = "Deleted User"
+                user_email = f"User ID: {str(p['user_id'])}"
+            if "user_name" in fields:
+                purchase_data["user_name"] = user_name
+            if "user_email" in fields:
+                purchase_data["user_email"] = user_email
+
+        result.append(purchase_data)
+    return result
+
+
+def _dump_batch(batch, is_admin, dumps, fields):
+    return ",".join(dumps(row) for row in _serialize_purchases(batch, is_admin, fields))
+
+
+def _stream_history(cursor, is_admin, batch_size, dumps, fields=None):
+    """Yield the history as one JSON array, a server-side batch at a time.
+
+    Each batch goes out as a single chunk. Runs after the view has returned,
+    so it must not touch the request.
+    """
+    yield "["
+    first = True
+    batch = []
+    for p in cursor:
+        batch.append(p)
+        if len(batch) < batch_size:
+            continue
+        yield ("" if first else ",") + _dump_batch(batch, is_admin, dumps, fields)
+        first = False
+        batch = []
+    if batch:
+        yield ("" if first else ",") + _dump_batch(batch, is_admin, dumps, fields)
+    yield "]"
+
+
 @purchases_bp.route("/history", methods=["GET"])
 @jwt_required()
 def get_history():
+    """Purchase history, newest first.
+
+    With `limit` (or `cursor`) returns one page as `{"items", "next"}`, where
+    `next` is an opaque cursor for the following page. Without them the full
+    history is streamed as a JSON array from a server-side cursor. Filters:
+    `sweet_id`, `from`, `to` (ISO dates) and, for admins, `user_id`. Rows can
+    be narrowed with `fields=` or `view=summary` (see HISTORY_FIELDS).
+    """
     try:
         current_user_id = get_jwt_identity()
-
-        try:
-            user_object_id = ObjectId(current_user_id)
-            user = mongo.db.users.find_one({"_id": user_object_id})
-        except:
-            user = mongo.db.users.find_one({"_id": current_user_id})
+        user = current_user()
 
         if not user:
             return jsonify({"msg": "User not found"}), 404
 
         # ✅ Fix: check is_admin instead of role
-        if user.get("is_admin", False) is True:
-            purchases = list(mongo.db.purchase_history.find().sort("timestamp", -1))
-        else:
-            try:
-                user_object_id = ObjectId(current_user_id)
-                purchases = list(mongo.db.purchase_history.find({
-                    "$or": [
-                        {"user_id": user_object_id},
-                        {"user_id": current_user_id}
-                    ]
-                }).sort("timestamp", -1))
-            except:
-                purchases = list(mongo.db.purchase_history.find({
-                    "user_id": current_user_id
-                }).sort("timestamp", -1))
-
-
-        result = []
-        for p in purchases:
-            user_name = "Unknown User"
-            user_email = ""
-
-            if user.get("is_admin", False) is True:
-                try:
-                    purchase_user = mongo.db.users.find_one({"_id": p["user_id"]})
-                    if purchase_user:
-                        user_name = purchase_user.get("username") or purchase_user.get("name") or "Unknown User"
-                        user_email = purchase_user.get("email", "")
-                    else:
-                        user_name = "Deleted User"
-                        user_email = f"User ID: {str(p['user_id'])}"
-                except Exception as e:
-                    print(f"Error fetching user info for purchase {p['_id']}: {e}")
-                    user_name, user_email = "Unknown User", str(p["user_id"])
-
-            purchase_data = {
-                "_id": str(p["_id"]),
-                "sweet_id": str(p["sweet_id"]),
-                "sweet_name": p["sweet_name"],
-                "quantity": p["quantity"],
-                "price": float(p["price"]),
-                "total": float(p["total"]),
-                "timestamp": p["timestamp"].isoformat() if p.get("timestamp") else None,
-                "user_id": str(p["user_id"])
-            }
+        is_admin = user.get("is_admin", False) is True
+        try:
+            fields = HISTORY_FIELDS.select(request.args)
+        except UnknownFields as e:
+            return jsonify({"msg": str(e)}), 400
+        projection = HISTORY_FIELDS.projection(fields)
 
-            if user.get("is_admin", False) is True:
-                purchase_data["user_name"] = user_name
-                purchase_data["user_email"] = user_email
+        try:
+            query = _history_query(user, current_user_id, request.args)
+        except (ValueError, KeyError, InvalidId):
+            return jsonify({"msg": "Invalid history filter or cursor"}), 400
 
-            result.append(purchase_data)
+        sort = [("timestamp", -1), ("_id", -1)]
 
-        return jsonify(result), 200
+        if request.args.get("limit") or request.args.get("cursor"):
+            limit = request.args.get("limit", current_app.config["HISTORY_PAGE_SIZE"], type=int)
+            limit = max(1, min(limit, current_app.config["HISTORY_MAX_PAGE_SIZE"]))
+            # Fetch one extra row to know whether there is a next page
+            purchases = list(mongo.db.purchase_history.find(query, projection).sort(sort).limit(limit + 1))
+            has_more = len(purchases) > limit
+            purchases = purchases[:limit]
+            return jsonify({
+                "items": _serialize_purchases(purchases, is_admin, fields),
+                "next": _encode_cursor(purchases[-1]) if has_more else None
+            }), 200
+
+        batch_size = current_app.config["HISTORY_STREAM_BATCH_SIZE"]
+        cursor = mongo.db.purchase_history.find(query, projection).sort(sort).batch_size(batch_size)
+        return Response(
+            _stream_history(cursor, is_admin, batch_size, current_app.json.dumps, fields),
+            mimetype="application/json"
+        ), 200
 
     except Exception as e:
         print(f"Error in get_history: {str(e)}")
@@ -82,57 +220,57 @@ def get_history():
 
 
 
+def parse_purchase_item(data):
+    """Validate one `{sweet_id, quantity}` entry.
+
+    Returns `(sweet_id, quantity, None)` or `(None, None, error_response)`.
+    """
+    if not isinstance(data, dict):
+        return None, None, (jsonify({"msg": "Each item must be an object"}), 400)
+
+    sweet_id = data.get("sweet_id")
+    if not sweet_id:
+        return None, None, (jsonify({"msg": "Sweet ID is required"}), 400)
+    if not ObjectId.is_valid(sweet_id):
+        return None, None, (jsonify({"msg": "Invalid sweet ID"}), 400)
+
+    quantity = data.get("quantity", 1)
+    # bool is an int subclass and floats would be truncated; "2" is fine
+    if isinstance(quantity, bool) or not isinstance(quantity, (int, str)):
+        return None, None, (jsonify({"msg": "Quantity must be a whole number"}), 400)
+    try:
+        quantity = int(quantity)
+    except ValueError:
+        return None, None, (jsonify({"msg": "Quantity must be a whole number"}), 400)
+
+    if quantity <= 0:
+        return None, None, (jsonify({"msg": "Quantity must be greater than 0"}), 400)
+
+    return sweet_id, quantity, None
+
+
 @purchases_bp.route("/buy", methods=["POST"])
 @jwt_required()
 def buy_sweet():
     try:
         current_user_id = get_jwt_identity()
-        data = request.json
-        sweet_id = data.get("sweet_id")
-        quantity = int(data.get("quantity", 1))
-
-        if not sweet_id:
-            return jsonify({"msg": "Sweet ID is required"}), 400
-
-        if quantity <= 0:
-            return jsonify({"msg": "Quantity must be greater than 0"}), 400
+        sweet_id, quantity, error = parse_purchase_item(request.json)
+        if error:
+            return error
 
-        # Find the sweet
-        sweet = mongo.db.sweets.find_one({"_id": ObjectId(sweet_id)})
-        if not sweet:
+        # Decrease stock and create purchase record in one operation path
+        try:
+            sweet, purchase = stock.purchase(current_user_id, sweet_id, quantity)
+        except stock.SweetNotFound:
             return jsonify({"msg": "Sweet not found"}), 404
-
-        if sweet.get("quantity", 0) < quantity:
+        except stock.InsufficientStock:
             return jsonify({"msg": "Not enough stock available"}), 400
 
-        # Decrease stock
-        mongo.db.sweets.update_one(
-            {"_id": ObjectId(sweet_id)},
-            {"$inc": {"quantity": -quantity}}
-        )
-
-        # Create purchase record - store user_id in consistent format
-        try:
-            user_object_id = ObjectId(current_user_id)
-        except:
-            user_object_id = current_user_id
-
-        purchase = {
-            "user_id": user_object_id,
-            "sweet_id": ObjectId(sweet_id),
-            "sweet_name": sweet["name"],
-            "quantity": quantity,
-            "price": float(sweet["price"]),
-            "total": float(sweet["price"]) * quantity,
-            "timestamp": datetime.utcnow(),
-        }
-        
-        result = mongo.db.purchase_history.insert_one(purchase)
-        print(f"Purchase recorded: {result.inserted_id}")  # Debug log
+        print(f"Purchase recorded: {purchase['_id']}")  # Debug log
 
         return jsonify({
             "msg": "Purchase successful",
-            "purchase_id": str(result.inserted_id),
+            "purchase_id": str(purchase["_id"]),
             "total": purchase["total"]
         }), 201
 
@@ -141,20 +279,70 @@ def buy_sweet():
         return jsonify({"msg": f"Purchase failed: {str(e)}"}), 500
 
 
+@purchases_bp.route("/checkout", methods=["POST"])
+@jwt_required()
+def checkout():
+    """Buy a basket of sweets in one request, all or nothing"""
+    try:
+        current_user_id = get_jwt_identity()
+        items = (request.json or {}).get("items")
+        if not items or not isinstance(items, list):
+            return jsonify({"msg": "Items are required"}), 400
+
+        # Merge repeated sweets so each one is decremented once
+        quantities = {}
+        for item in items:
+            sweet_id, quantity, error = parse_purchase_item(item)
+            if error:
+                return error
+            sweet_object_id = ObjectId(sweet_id)
+            quantities[sweet_object_id] = quantities.get(sweet_object_id, 0) + quantity
+
+        try:
+            sweets, purchases = stock.checkout(current_user_id, quantities)
+        except stock.SweetNotFound as e:
+            return jsonify({"msg": "Sweet not found", "sweet_id": str(e)}), 404
+        except stock.InsufficientStock as e:
+            return jsonify({"msg": "Not enough stock available", "sweet_id": str(e)}), 400
+
+        total = sum(p["total"] for p in purchases)
+
+        # One consolidated confirmation for the whole basket
+        user = user_cache.get(current_user_id)
+        if user and "email" in user:
+            try:
+                outbox.enqueue(
+                    subject="🍬 Sweet Shop Order Confirmation",
+                    recipients=[user["email"]],
+                    html=email_templates.render(
+                        "order_confirmation",
+                        username=user.get("username"),
+                        purchases=purchases,
+                        total=total,
+                        order_date=datetime.now(),
+                    ),
+                )
+            except Exception as e:
+                print(f"Error queueing checkout email: {str(e)}")
+
+        return jsonify({
+            "msg": "Checkout successful",
+            "purchase_ids": [str(p["_id"]) for p in purchases],
+            "total": total
+        }), 201
+
+    except Exception as e:
+        print(f"Error in checkout: {str(e)}")
+        return jsonify({"msg": f"Checkout failed: {str(e)}"}), 500
+
+
 @purchases_bp.route("/stats", methods=["GET"])
 @jwt_required()
 def get_purchase_stats():
     """Get purchase statistics for admin dashboard"""
     try:
-        current_user_id = get_jwt_identity()
-        
-        # Get user info
-        try:
-            user_object_id = ObjectId(current_user_id)
-            user = mongo.db.users.find_one({"_id": user_object_id})
-        except:
-            user = mongo.db.users.find_one({"_id": current_user_id})
-        
+        user = current_user()
+
         if not user:
             return jsonify({"msg": "User not found"}), 404
             
@@ -165,7 +353,7 @@ def get_purchase_stats():
         now = datetime.utcnow()
         current_month = now.month
         current_year = now.year
-        
+
         # Calculate previous month/year
         if current_month == 1:
             previous_month = 12
@@ -173,104 +361,79 @@ def get_purchase_stats():
         else:
             previous_month = current_month - 1
             previous_year = current_year
-        
-        # Get all user IDs (no exclusion for admin view)
-        # Admin should see ALL purchase statistics including their own
-        
-        # Aggregate pipeline for current month sales (ALL purchases)
-        current_month_pipeline = [
-            {
-                "$match": {
-                    "timestamp": {
-                        "$gte": datetime(current_year, current_month, 1),
-                        "$lt": datetime(current_year, current_month + 1, 1) if current_month < 12 else datetime(current_year + 1, 1, 1)
-                    }
-                }
-            },
-            {
-                "$group": {
-                    "_id": None,
-                    "total_sales": {"$sum": "$total"},
-                    "total_orders": {"$sum": 1},
-                    "total_items": {"$sum": "$quantity"}
-                }
-            }
-        ]
-        
-        # Aggregate pipeline for previous month sales (ALL purchases)
-        previous_month_pipeline = [
-            {
-                "$match": {
-                    "timestamp": {
-                        "$gte": datetime(previous_year, previous_month, 1),
-                        "$lt": datetime(previous_year, previous_month + 1, 1) if previous_month < 12 else datetime(previous_year + 1, 1, 1)
-                    }
-                }
-            },
-            {
-                "$group": {
-                    "_id": None,
-                    "total_sales": {"$sum": "$total"},
-                    "total_orders": {"$sum": 1},
-                    "total_items": {"$sum": "$quantity"}
-                }
-            }
-        ]
-        
-        # Execute aggregation queries
-        current_month_stats = list(mongo.db.purchase_history.aggregate(current_month_pipeline))
-        previous_month_stats = list(mongo.db.purchase_history.aggregate(previous_month_pipeline))
-        
-        # Get total unique customers (ALL users who made purchases)
-        total_customers = mongo.db.purchase_history.distinct("user_id")
-        
-        # Get all-time stats (ALL purchases)
-        all_time_stats = list(mongo.db.purchase_history.aggregate([
-            {
-                "$group": {
-                    "_id": None,
-                    "total_sales": {"$sum": "$total"},
-                    "total_orders": {"$sum": 1},
-                    "total_items": {"$sum": "$quantity"}
-                }
-            }
-        ]))
-        
-        # Format results
-        current_month_data = current_month_stats[0] if current_month_stats else {"total_sales": 0, "total_orders": 0, "total_items": 0}
-        previous_month_data = previous_month_stats[0] if previous_month_stats else {"total_sales": 0, "total_orders": 0, "total_items": 0}
-        all_time_data = all_time_stats[0] if all_time_stats else {"total_sales": 0, "total_orders": 0, "total_items": 0}
-        
+
+        # Read the pre-aggregated rollups (ALL purchases) instead of scanning history
+        current_key = rollups.month_key(current_year, current_month)
+        previous_key = rollups.month_key(previous_year, previous_month)
+        docs = {
+            doc["_id"]: doc for doc in mongo.db.sales_rollups.find(
+                {"_id": {"$in": [current_key, previous_key, "all"]}}, {"sweets": 0}
+            )
+        }
+
+        current_month_data = rollups.summary(docs.get(current_key))
+        previous_month_data = rollups.summary(docs.get(previous_key))
+        all_time_data = rollups.summary(docs.get("all"))
+
         # Calculate growth rate
         growth_rate = 0
-        if previous_month_data["total_sales"] > 0:
-            growth_rate = ((current_month_data["total_sales"] - previous_month_data["total_sales"]) / previous_month_data["total_sales"]) * 100
-        
+        if previous_month_data["sales"] > 0:
+            growth_rate = ((current_month_data["sales"] - previous_month_data["sales"]) / previous_month_data["sales"]) * 100
+
         return jsonify({
-            "current_month": {
-                "sales": float(current_month_data["total_sales"]),
-                "orders": current_month_data["total_orders"],
-                "items": current_month_data["total_items"]
-            },
-            "previous_month": {
-                "sales": float(previous_month_data["total_sales"]),
-                "orders": previous_month_data["total_orders"],
-                "items": previous_month_data["total_items"]
-            },
-            "all_time": {
-                "sales": float(all_time_data["total_sales"]),
-                "orders": all_time_data["total_orders"],
-                "items": all_time_data["total_items"]
-            },
+            "current_month": current_month_data,
+            "previous_month": previous_month_data,
+            "all_time": all_time_data,
             "growth_rate": round(growth_rate, 2),
-            "total_customers": len(total_customers)
+            # Approximate: HyperLogLog sketch over every buyer
+            "total_customers": rollups.hll_estimate(docs.get("all", {}).get("customers", {}))
         }), 200
-        
+
     except Exception as e:
         print(f"Error in get_purchase_stats: {str(e)}")
         return jsonify({"msg": f"Error fetching stats: {str(e)}"}), 500
 
 
+@purchases_bp.route("/timeseries", methods=["GET"])
+@jwt_required()
+def get_timeseries():
+    """Bucketed sales curves from the columnar analytics snapshot"""
+    try:
+        user = current_user()
+
+        if not user:
+            return jsonify({"msg": "User not found"}), 404
+
+        if user.get("role") != "admin" and user.get("is_admin", False) is not True:
+            return jsonify({"msg": "Admin access required"}), 403
+
+        bucket = request.args.get("bucket", "day")
+        if bucket not in analytics.BUCKETS:
+            return jsonify({"msg": f"bucket must be one of {', '.join(analytics.BUCKETS)}"}), 400
+        try:
+            start = datetime.fromisoformat(request.args["from"]) if request.args.get("from") else None
+            end = datetime.fromisoformat(request.args["to"]) if request.args.get("to") else None
+        except ValueError:
+            return jsonify({"msg": "from and to must be ISO dates"}), 400
+        try:
+            window = int(request.args.get("window", 7))
+            top = int(request.args.get("top", 5))
+        except ValueError:
+            return jsonify({"msg": "window and top must be whole numbers"}), 400
+        if window < 0 or top < 0:
+            return jsonify({"msg": "window and top must not be negative"}), 400
+
+        meta, columns = analytics.snapshot.columns()
+        result = analytics.timeseries(meta, columns, bucket, start, end, window, top)
+        # Purchases newer than the watermark are not in the snapshot yet
+        result["as_of"] = meta["watermark"]["t"] if meta["watermark"] else None
+        return jsonify(result), 200
+
+    except Exception as e:
+        print(f"Error in get_timeseries: {str(e)}")
+        return jsonify({"msg": f"Error fetching timeseries: {str(e)}"}), 500
+
+
 # Additional endpoint to get user info for debugging
 @purchases_bp.route("/debug/user", methods=["GET"])
 @jwt_required()
@@ -307,15 +470,8 @@ def debug_user():
 def debug_purchases():
     """Debug endpoint to check purchase data structure"""
     try:
-        current_user_id = get_jwt_identity()
-        
-        # Get user info
-        try:
-            user_object_id = ObjectId(current_user_id)
-            user = mongo.db.users.find_one({"_id": user_object_id})
-        except:
-            user = mongo.db.users.find_one({"_id": current_user_id})
-        
+        user = current_user()
+
         if not user or user.get("role") != "admin":
             return jsonify({"msg": "Admin access required"}), 403
         
@@ -1,10 +1,24 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 from flask_jwt_extended import jwt_required
 from extensions import mongo
+from catalog_cache import catalog_cache
+from search_index import search_index
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from indexes import registry as index_registry
+from projection import FieldSet, UnknownFields
 
 sweets_bp = Blueprint("sweets", __name__)
 
+index_registry.index("sweets", [("name", 1)], unique=True)
+
+# ?fields=name,price or ?view=summary on the list and search endpoints
+SWEET_FIELDS = FieldSet(
+    ["_id", "name", "category", "price", "quantity", "image_url"],
+    views={"summary": ["_id", "name", "category", "price", "quantity"]},
+    always=(),
+)
+
 @sweets_bp.route("/", methods=["POST"])
 @jwt_required()
 def add_sweet():
@@ -21,16 +35,27 @@ def add_sweet():
         "image_url": data.get("image_url")  # optional
     }
 
-    result = mongo.db.sweets.insert_one(sweet)
+    try:
+        result = mongo.db.sweets.insert_one(sweet)
+    except DuplicateKeyError:
+        return jsonify({"msg": "Sweet with this name already exists"}), 400
+    search_index.upsert(sweet)
+    catalog_cache.bump()
     return jsonify({"id": str(result.inserted_id)}), 201
 
 
 @sweets_bp.route("/", methods=["GET"])
 def list_sweets():
-    sweets = list(mongo.db.sweets.find())
-    for s in sweets:
-        s["_id"] = str(s["_id"])
-    return jsonify(sweets)
+    try:
+        fields = SWEET_FIELDS.select(request.args)
+    except UnknownFields as e:
+        return jsonify({"msg": str(e)}), 400
+    body, etag = catalog_cache.get(current_app.json.dumps, SWEET_FIELDS.projection(fields))
+    response = current_app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = current_app.config["CATALOG_CACHE_CONTROL"]
+    # Answers If-None-Match with a bodyless 304
+    return response.make_conditional(request)
 
 
 @sweets_bp.route("/<id>", methods=["PUT"])
@@ -50,7 +75,12 @@ def update_sweet(id):
     if "image_url" in data:
         update_fields["image_url"] = data["image_url"]
 
-    mongo.db.sweets.update_one({"_id": ObjectId(id)}, {"$set": update_fields})
+    try:
+        mongo.db.sweets.update_one({"_id": ObjectId(id)}, {"$set": update_fields})
+    except DuplicateKeyError:
+        return jsonify({"msg": "Sweet with this name already exists"}), 400
+    search_index.patch(id, update_fields)
+    catalog_cache.bump()
     return jsonify({"msg": "Sweet updated"}), 200
 
 
@@ -58,26 +88,24 @@ def update_sweet(id):
 @jwt_required()
 def delete_sweet(id):
     mongo.db.sweets.delete_one({"_id": ObjectId(id)})
+    search_index.remove(id)
+    catalog_cache.bump()
     return jsonify({"msg": "Sweet deleted"}), 200
 
 
 @sweets_bp.route("/search", methods=["GET"])
 @jwt_required()
 def search_sweets():
-    query = {}
-    if name := request.args.get("name"):
-        query["name"] = {"$regex": name, "$options": "i"}
-    if category := request.args.get("category"):
-        query["category"] = category
-    if request.args.get("min_price") or request.args.get("max_price"):
-        price_query = {}
-        if min_price := request.args.get("min_price"):
-            price_query["$gte"] = float(min_price)
-        if max_price := request.args.get("max_price"):
-            price_query["$lte"] = float(max_price)
-        query["price"] = price_query
-
-    sweets = list(mongo.db.sweets.find(query))
-    for s in sweets:
-        s["_id"] = str(s["_id"])
-    return jsonify(sweets)
\ No newline at end of file
+    try:
+        fields = SWEET_FIELDS.select(request.args)
+    except UnknownFields as e:
+        return jsonify({"msg": str(e)}), 400
+
+    # Ranked matching against the in-memory index; no user input reaches a regex
+    sweets = search_index.search(
+        name=request.args.get("name"),
+        category=request.args.get("category"),
+        min_price=request.args.get("min_price", type=float),
+        max_price=request.args.get("max_price", type=float),
+    )
+    return jsonify([SWEET_FIELDS.apply(s, fields) for s in sweets])
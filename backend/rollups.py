@@ -0,0 +1,192 @@
+import hashlib
+import math
+import time
+from datetime import datetime, timedelta
+
+import click
+from bson import ObjectId
+from flask.cli import with_appcontext
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from extensions import mongo
+
+# HyperLogLog precision: 2**11 registers, about 2.3% standard error
+HLL_PRECISION = 11
+HLL_REGISTERS = 1 << HLL_PRECISION
+
+# A seeding worker that died keeps the others from retrying for this long
+SEED_LOCK_SECONDS = 3600
+
+
+def period_keys(timestamp):
+    return [f"day:{timestamp:%Y-%m-%d}", f"month:{timestamp:%Y-%m}", "all"]
+
+
+def month_key(year, month):
+    return f"month:{year:04d}-{month:02d}"
+
+
+def hll_register(value):
+    """Map a customer id to `(register index, rank)` for the sketch."""
+    digest = int.from_bytes(hashlib.sha1(str(value).encode("utf-8")).digest()[:8], "big")
+    index = digest >> (64 - HLL_PRECISION)
+    rest = digest & ((1 << (64 - HLL_PRECISION)) - 1)
+    rank = (64 - HLL_PRECISION) - rest.bit_length() + 1
+    return index, rank
+
+
+def hll_estimate(registers):
+    """Estimate distinct customers from a `{index: rank}` register dict."""
+    m = HLL_REGISTERS
+    alpha = 0.7213 / (1 + 1.079 / m)
+    total = sum(2.0 ** -registers.get(str(i), 0) for i in range(m))
+    estimate = alpha * m * m / total
+    zeros = m - len(registers)
+    if estimate <= 2.5 * m and zeros:
+        # Small-range correction: linear counting
+        estimate = m * math.log(m / zeros)
+    return int(round(estimate))
+
+
+def record(purchases, collection=None):
+    """Fold purchases into the day, month and all-time rollups.
+
+    Every rollup is updated with `$inc` upserts and the customer sketch with
+    per-register `$max`, so concurrent writers merge safely. All periods go
+    out in one unordered `bulk_write` to `collection` (`sales_rollups`).
+    """
+    updates = {}
+    for p in purchases:
+        index, rank = hll_register(p["user_id"])
+        sweet_id = str(p["sweet_id"])
+        for key in period_keys(p["timestamp"]):
+            inc, maxes, names = updates.setdefault(key, ({}, {}, {}))
+            for field, value in (
+                ("sales", p["total"]),
+                ("orders", 1),
+                ("items", p["quantity"]),
+                (f"sweets.{sweet_id}.sales", p["total"]),
+                (f"sweets.{sweet_id}.items", p["quantity"]),
+            ):
+                inc[field] = inc.get(field, 0) + value
+            register = f"customers.{index}"
+            maxes[register] = max(maxes.get(register, 0), rank)
+            names[f"sweets.{sweet_id}.name"] = p["sweet_name"]
+
+    if not updates:
+        return
+    collection = mongo.db.sales_rollups if collection is None else collection
+    collection.bulk_write([
+        UpdateOne({"_id": key}, {"$inc": inc, "$max": maxes, "$set": names}, upsert=True)
+        for key, (inc, maxes, names) in updates.items()
+    ], ordered=False)
+
+
+def summary(doc):
+    doc = doc or {}
+    return {
+        "sales": float(doc.get("sales", 0)),
+        "orders": doc.get("orders", 0),
+        "items": doc.get("items", 0),
+    }
+
+
+def _fold(query, collection, batch_size):
+    batch = []
+    count = 0
+    for p in mongo.db.purchase_history.find(query).batch_size(batch_size):
+        batch.append(p)
+        if len(batch) >= batch_size:
+            record(batch, collection)
+            count += len(batch)
+            batch = []
+    record(batch, collection)
+    return count + len(batch)
+
+
+def rebuild(batch_size=1000):
+    """Recompute every rollup from the raw purchase history.
+
+    The rollups are built in a scratch collection and renamed over
+    `sales_rollups`, so /stats keeps serving the old numbers meanwhile.
+    Purchases made during the build were recorded into the old collection;
+    they are replayed into the new one right after the swap. Purchase ids
+    carry one-second timestamps, so the swap waits for a whole second and
+    ids then split cleanly into before and after it; only a purchase in
+    flight at that instant can be off. Returns the number of purchases
+    folded in.
+    """
+    started = ObjectId.from_datetime(datetime.utcnow())
+    scratch_name = f"sales_rollups_rebuild_{ObjectId()}"
+    mongo.db.create_collection(scratch_name)
+    scratch = mongo.db[scratch_name]
+    try:
+        count = _fold({"timestamp": {"$ne": None}, "_id": {"$lt": started}}, scratch, batch_size)
+        swap_at = datetime.utcnow().replace(microsecond=0) + timedelta(seconds=1)
+        time.sleep(max(0.0, (swap_at - datetime.utcnow()).total_seconds()))
+        scratch.rename("sales_rollups", dropTarget=True)
+    except Exception:
+        scratch.drop()
+        raise
+    swapped = ObjectId.from_datetime(swap_at)
+    return count + _fold({"timestamp": {"$ne": None}, "_id": {"$gte": started, "$lt": swapped}},
+                         mongo.db.sales_rollups, batch_size)
+
+
+def _missing():
+    if mongo.db.sales_rollups.find_one({"_id": "all"}, {"_id": 1}) is not None:
+        return False
+    return mongo.db.purchase_history.find_one({}, {"_id": 1}) is not None
+
+
+def _take_seed_lock():
+    """Claim the seeding job in `rollup_locks`; False while another process holds it."""
+    now = datetime.utcnow()
+    try:
+        mongo.db.rollup_locks.find_one_and_update(
+            {"_id": "seed", "taken_at": {"$lt": now - timedelta(seconds=SEED_LOCK_SECONDS)}},
+            {"$set": {"taken_at": now}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+def seed_if_missing():
+    """Build the rollups on first deploy: purchases exist but rollups do not.
+
+    Every worker calls this on startup, but only the one holding the seed
+    lock rebuilds; parallel rebuilds would each replay the purchases made
+    meanwhile and count them twice.
+    """
+    if not _missing() or not _take_seed_lock():
+        return None
+    try:
+        # Another worker may have finished seeding just before we took the lock
+        return rebuild() if _missing() else None
+    finally:
+        mongo.db.rollup_locks.delete_one({"_id": "seed"})
+
+
+def init_worker(app):
+    if not app.testing:
+        try:
+            seeded = seed_if_missing()
+            if seeded is not None:
+                print(f"Seeded sales rollups from {seeded} purchases")
+        except Exception as e:
+            print(f"Sales rollup seeding failed, run `flask rebuild-rollups`: {e}")
+
+
+@click.command("rebuild-rollups")
+@with_appcontext
+def rebuild_rollups_command():
+    """Recompute sales rollups from purchase_history.
+
+    Safe while the shop is open: the new rollups replace the old ones in
+    one rename. Workers also seed the rollups on startup when they are
+    missing, so this is only needed after a bug or a manual data fix.
+    """
+    click.echo(f"Rebuilt sales rollups from {rebuild()} purchases")
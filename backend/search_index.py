@@ -0,0 +1,273 @@
+import math
+import threading
+import unicodedata
+from collections import Counter
+
+from bson import ObjectId
+
+from extensions import mongo
+from coherence import coherence
+
+# Queries shorter than GRAM characters are matched by scanning every sweet;
+# longer ones are narrowed down through the trigram postings first
+GRAM = 3
+MIN_SIMILARITY = 0.3
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse whitespace."""
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.lower().split())
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + GRAM] for i in range(len(padded) - GRAM + 1)}
+
+
+def _within_one_edit(a, b):
+    """True when `a` and `b` differ by at most one insert, delete or substitution."""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = j = edits = 0
+    while i < len(a) and j < len(b):
+        if a[i] != b[j]:
+            edits += 1
+            if edits > 1:
+                return False
+            if len(a) == len(b):
+                i += 1
+        else:
+            i += 1
+        j += 1
+    return edits + (len(b) - j) + (len(a) - i) <= 1
+
+
+class SweetSearchIndex:
+    """In-memory trigram index over sweet names and categories.
+
+    Built from Mongo on first use and kept current by the write paths
+    (`upsert`, `patch`, `adjust_quantity`, `remove`). Stock changes made by
+    other workers arrive with their sweet ids on the "stock" coherence
+    namespace and are re-read before the next search. Structural changes
+    (add, edit, delete) arrive on "sweets" and trigger a rebuild, which
+    scans Mongo without holding the lock, keeps serving the old index to
+    other searches and swaps the new one in at the end.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._docs = {}
+        self._keys = {}
+        self._grams = {}
+        self._postings = {}
+        self._stale = True
+        self._built = False
+        self._changed = set()
+        self._pending = None  # ids written while a rebuild is scanning
+
+    def init_app(self, app):
+        app.extensions["search_index"] = self
+        self.expire()
+
+    def init_worker(self, app):
+        if not app.testing:
+            try:
+                self.rebuild()
+            except Exception as e:
+                print(f"Search index build failed, will retry on first search: {e}")
+
+    def expire(self):
+        self._stale = True
+
+    def stock_changed(self, sweet_ids):
+        """Re-read `sweet_ids` before the next search; None rebuilds the index.
+
+        The "stock" coherence callback, also used by local batch purchases.
+        """
+        if sweet_ids is None:
+            self.expire()
+            return
+        with self._lock:
+            self._changed.update(sweet_ids)
+
+    # -------------------------------
+    # Maintenance
+    # -------------------------------
+    def rebuild(self):
+        self.build(mongo.db.sweets.find())
+
+    def build(self, sweets):
+        with self._lock:
+            # An expire() from here on asks for another build
+            self._stale = False
+            self._pending = set()
+        try:
+            staged = SweetSearchIndex()
+            for sweet in sweets:
+                staged._add(sweet)
+        except Exception:
+            with self._lock:
+                self._pending = None
+                self._stale = True
+            raise
+        with self._lock:
+            self._docs, self._keys, self._grams, self._postings = (
+                staged._docs, staged._keys, staged._grams, staged._postings)
+            # The scan may predate writes made meanwhile; re-read those sweets
+            self._changed |= self._pending
+            self._pending = None
+            self._built = True
+
+    def refresh(self, sweet_ids):
+        """Re-read `sweet_ids` from Mongo; ids that no longer exist are removed."""
+        object_ids = [ObjectId(i) for i in sweet_ids]
+        sweets = {str(s["_id"]): s for s in mongo.db.sweets.find({"_id": {"$in": object_ids}})}
+        with self._lock:
+            for sweet_id in map(str, sweet_ids):
+                if sweet_id in sweets:
+                    self.upsert(sweets[sweet_id])
+                else:
+                    self.remove(sweet_id)
+
+    def _ensure_built(self):
+        if self._stale:
+            if self._built:
+                # Someone else is rebuilding: answer from the current index
+                if self._build_lock.acquire(blocking=False):
+                    try:
+                        if self._stale:
+                            self.rebuild()
+                    finally:
+                        self._build_lock.release()
+            else:
+                with self._build_lock:
+                    if self._stale:
+                        self.rebuild()
+        if self._changed:
+            with self._lock:
+                changed, self._changed = self._changed, set()
+            self.refresh(changed)
+
+    def _touched(self, sweet_id):
+        if self._pending is not None:
+            self._pending.add(str(sweet_id))
+
+    def _add(self, sweet):
+        sweet = dict(sweet)
+        sweet_id = str(sweet["_id"])
+        name, category = normalize(sweet.get("name")), normalize(sweet.get("category"))
+        grams = trigrams(name)
+        self._docs[sweet_id] = sweet
+        self._keys[sweet_id] = (name, category, name.split())
+        self._grams[sweet_id] = grams
+        for gram in grams | trigrams(category):
+            self._postings.setdefault(gram, set()).add(sweet_id)
+
+    def _discard(self, sweet_id):
+        if sweet_id not in self._docs:
+            return
+        name, category, _ = self._keys.pop(sweet_id)
+        for gram in self._grams.pop(sweet_id) | trigrams(category):
+            ids = self._postings.get(gram)
+            if ids is not None:
+                ids.discard(sweet_id)
+                if not ids:
+                    del self._postings[gram]
+        del self._docs[sweet_id]
+
+    def upsert(self, sweet):
+        with self._lock:
+            self._touched(sweet["_id"])
+            self._discard(str(sweet["_id"]))
+            self._add(sweet)
+
+    def patch(self, sweet_id, fields):
+        with self._lock:
+            self._touched(sweet_id)
+            current = self._docs.get(str(sweet_id))
+            if current is not None:
+                self.upsert(dict(current, **fields))
+
+    def adjust_quantity(self, sweet_id, delta):
+        with self._lock:
+            self._touched(sweet_id)
+            current = self._docs.get(str(sweet_id))
+            if current is not None:
+                current["quantity"] = current.get("quantity", 0) + delta
+
+    def remove(self, sweet_id):
+        with self._lock:
+            self._touched(sweet_id)
+            self._discard(str(sweet_id))
+
+    # -------------------------------
+    # Queries
+    # -------------------------------
+    def _score(self, query, query_words, query_grams, sweet_id, shared):
+        name, category, words = self._keys[sweet_id]
+        if name == query:
+            return 100.0
+        if name.startswith(query):
+            return 80.0
+        if any(w.startswith(query) for w in words):
+            return 70.0
+        if query in name:
+            return 50.0
+        if category.startswith(query) or query in category:
+            return 30.0
+
+        # Typo tolerance: every longer query word is one edit away from a
+        # word of the name, or failing that the names share enough trigrams
+        long_words = [q for q in query_words if len(q) >= 4]
+        if long_words and all(any(_within_one_edit(q, w) for w in words) for q in long_words):
+            return 45.0
+        if shared:
+            similarity = shared / (len(query_grams) + len(self._grams[sweet_id]) - shared)
+            if similarity >= MIN_SIMILARITY:
+                return 40.0 * similarity
+        return 0.0
+
+    def search(self, name=None, category=None, min_price=None, max_price=None):
+        """Ranked sweets matching `name`, filtered by category and price."""
+        self._ensure_built()
+        with self._lock:
+            query = normalize(name)
+            query_grams = trigrams(query)
+            query_words = query.split()
+            if len(query) < GRAM:
+                candidates = {sweet_id: 0 for sweet_id in self._docs}
+            else:
+                counts = Counter()
+                for gram in query_grams:
+                    counts.update(self._postings.get(gram, ()))
+                # A substring match shares every inner gram of the query and a
+                # similar name shares MIN_SIMILARITY of them; skip the rest
+                needed = min(len(query) - GRAM + 1, math.ceil(MIN_SIMILARITY * len(query_grams)))
+                candidates = {sweet_id: n for sweet_id, n in counts.items() if n >= needed}
+
+            results = []
+            for sweet_id, shared in candidates.items():
+                sweet = self._docs[sweet_id]
+                if category and sweet.get("category") != category:
+                    continue
+                price = sweet.get("price", 0)
+                if min_price is not None and price < min_price:
+                    continue
+                if max_price is not None and price > max_price:
+                    continue
+                score = self._score(query, query_words, query_grams, sweet_id, shared) if query else 1.0
+                if score > 0:
+                    results.append((score, self._keys[sweet_id][0], sweet))
+
+        results.sort(key=lambda r: (-r[0], r[1]))
+        return [dict(sweet) for _, _, sweet in results]
+
+
+search_index = SweetSearchIndex()
+coherence.register("sweets", search_index.expire, remote_only=True)
+coherence.register_changes("stock", search_index.stock_changed)
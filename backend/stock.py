@@ -0,0 +1,204 @@
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from extensions import mongo
+from catalog_cache import catalog_cache
+from search_index import search_index
+import rollups
+
+# Hold tokens kept per sweet; a rollback finds its own among them
+STOCK_HOLDS = 16
+
+
+class SweetNotFound(Exception):
+    pass
+
+
+class InsufficientStock(Exception):
+    pass
+
+
+class InvalidQuantity(ValueError):
+    pass
+
+
+def check_quantity(qty):
+    """Stock moves in whole, positive units; anything else would run the update backwards."""
+    if isinstance(qty, bool) or not isinstance(qty, int) or qty <= 0:
+        raise InvalidQuantity(repr(qty))
+
+
+def as_user_id(user_id):
+    """Purchases store the user id as an ObjectId when it parses as one."""
+    try:
+        return ObjectId(user_id)
+    except Exception:
+        return user_id
+
+
+def refresh_catalog(sweet_ids, update_index=None):
+    """Update the search index and expire the catalog after a committed stock change.
+
+    The write itself has already succeeded, so a failure here (the catalog
+    bump is a Mongo write too) is logged instead of failing the request;
+    the caches catch up on the next bump.
+    """
+    try:
+        if update_index is not None:
+            update_index()
+        catalog_cache.bump_stock(sweet_ids)
+    except Exception as e:
+        print(f"Catalog refresh failed: {e}")
+
+
+def record_rollups(purchases):
+    """Fold committed purchases into the sales rollups.
+
+    Rollups are derived data (`flask rebuild-rollups` recomputes them), so a
+    failure is logged rather than turning a committed purchase into a 500
+    that the client would retry.
+    """
+    try:
+        rollups.record(purchases)
+    except Exception as e:
+        print(f"Sales rollup update failed: {e}")
+
+
+def decrement_stock(sweet_id, qty):
+    """Atomically take `qty` units of a sweet and return the updated document.
+
+    The stock check and the decrement happen in one conditional
+    `find_one_and_update`, so concurrent buyers can never oversell. Callers
+    refresh the catalog once the purchase is recorded.
+    """
+    check_quantity(qty)
+    sweet_id = ObjectId(sweet_id)
+    sweet = mongo.db.sweets.find_one_and_update(
+        {"_id": sweet_id, "quantity": {"$gte": qty}},
+        {"$inc": {"quantity": -qty}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if sweet is None:
+        # Only the failure path pays for a second round trip
+        if mongo.db.sweets.count_documents({"_id": sweet_id}, limit=1) == 0:
+            raise SweetNotFound(str(sweet_id))
+        raise InsufficientStock(str(sweet_id))
+    return sweet
+
+
+def _purchase_document(user_id, sweet, qty, timestamp):
+    price = float(sweet["price"])
+    return {
+        "user_id": as_user_id(user_id),
+        "sweet_id": sweet["_id"],
+        "sweet_name": sweet["name"],
+        "quantity": qty,
+        "price": price,
+        "total": price * qty,
+        "timestamp": timestamp,
+    }
+
+
+def record_purchase(user_id, sweet, qty):
+    purchase = _purchase_document(user_id, sweet, qty, datetime.utcnow())
+    result = mongo.db.purchase_history.insert_one(purchase)
+    purchase["_id"] = result.inserted_id
+    record_rollups([purchase])
+    return purchase
+
+
+def purchase(user_id, sweet_id, qty):
+    """Decrement stock, write the purchase history row and update the rollups.
+
+    Returns `(sweet, purchase)` where `sweet` is the post-purchase document.
+    Raises `SweetNotFound` or `InsufficientStock`.
+    """
+    sweet = decrement_stock(sweet_id, qty)
+    # History first: once stock is taken the purchase must be on record
+    purchase = record_purchase(user_id, sweet, qty)
+    refresh_catalog([sweet["_id"]], lambda: search_index.upsert(sweet))
+    return sweet, purchase
+
+
+def decrement_stock_many(quantities):
+    """Take stock for several sweets in one `bulk_write`, all or nothing.
+
+    `quantities` maps sweet ObjectIds to the number of units to take. Each
+    update is conditional on `quantity >= qty` and tags the sweet with a
+    hold token for this call (the last `STOCK_HOLDS` are kept). When fewer
+    updates match than were sent, one read of the tokens shows exactly which
+    applied; those are compensated, and the first sweet that is missing
+    (404) or short (400) is reported. Nothing is upserted, so a sweet
+    deleted meanwhile is never recreated.
+
+    On success the caller refreshes the caches once the purchase is
+    recorded. A rollback expires the catalog itself: other workers may have
+    cached the stock between the bulk write and its undo.
+    """
+    items = list(quantities.items())
+    for _, qty in items:
+        check_quantity(qty)
+    hold = ObjectId()
+    ops = [
+        UpdateOne(
+            {"_id": sweet_id, "quantity": {"$gte": qty}},
+            {"$inc": {"quantity": -qty}, "$push": {"stock_holds": {"$each": [hold], "$slice": -STOCK_HOLDS}}},
+        )
+        for sweet_id, qty in items
+    ]
+    error = None
+    try:
+        if mongo.db.sweets.bulk_write(ops, ordered=False).matched_count == len(ops):
+            return
+    except BulkWriteError as e:
+        error = e
+
+    ids = [sweet_id for sweet_id, _ in items]
+    found = {s["_id"]: s for s in mongo.db.sweets.find({"_id": {"$in": ids}}, {"stock_holds": 1})}
+    applied = [(sweet_id, qty) for sweet_id, qty in items if hold in found.get(sweet_id, {}).get("stock_holds", [])]
+    if applied:
+        mongo.db.sweets.bulk_write([
+            UpdateOne({"_id": sweet_id, "stock_holds": hold}, {"$inc": {"quantity": qty}, "$pull": {"stock_holds": hold}})
+            for sweet_id, qty in applied
+        ], ordered=False)
+        refresh_catalog([sweet_id for sweet_id, _ in applied])
+
+    if error is not None:
+        raise error
+    missing = [sweet_id for sweet_id in ids if sweet_id not in found]
+    if missing:
+        raise SweetNotFound(str(missing[0]))
+    taken = {sweet_id for sweet_id, _ in applied}
+    raise InsufficientStock(str(next(sweet_id for sweet_id in ids if sweet_id not in taken)))
+
+
+def checkout(user_id, quantities):
+    """Buy several sweets at once.
+
+    One `$in` read validates the basket, one `bulk_write` takes the stock,
+    one `insert_many` records the history and one more `bulk_write` updates
+    the sales rollups. Returns `(sweets, purchases)` where
+    `sweets` maps ids to the documents read before the purchase.
+    """
+    sweets = {s["_id"]: s for s in mongo.db.sweets.find({"_id": {"$in": list(quantities)}})}
+    for sweet_id, qty in quantities.items():
+        if sweet_id not in sweets:
+            raise SweetNotFound(str(sweet_id))
+        if sweets[sweet_id].get("quantity", 0) < qty:
+            raise InsufficientStock(str(sweet_id))
+
+    decrement_stock_many(quantities)
+
+    now = datetime.utcnow()
+    purchases = [_purchase_document(user_id, sweets[sweet_id], qty, now) for sweet_id, qty in quantities.items()]
+    result = mongo.db.purchase_history.insert_many(purchases)
+    for doc, inserted_id in zip(purchases, result.inserted_ids):
+        doc["_id"] = inserted_id
+    record_rollups(purchases)
+    # The next search re-reads these sweets; adjusting the quantities here
+    # could count the purchase twice if a rebuild already saw it
+    refresh_catalog(list(quantities), lambda: search_index.stock_changed(list(quantities)))
+    return sweets, purchases
@@ -2,12 +2,14 @@ import pytest
 import mongomock
 import sys
 import os
+import contextlib
 
 # Add backend root to sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from extensions import mongo
 from app import create_app
+from benchmarks.counting import CountingDatabase
 
 
 @pytest.fixture
@@ -21,3 +23,86 @@ def client():
 
     with app.test_client() as client:
         yield client
+
+
+
+@pytest.fixture
+def counting_db(client):
+    real_db = mongo.db
+    # Serialized: mongomock does not make single commands atomic across
+    # threads, so concurrency tests would otherwise measure mongomock
+    mongo.db = CountingDatabase(real_db, serialize=True, record=True)
+    yield mongo.db
+    mongo.db = real_db
+
+
+@pytest.fixture
+def admin_headers(client):
+    """Auth headers for a freshly registered admin."""
+    client.post("/api/auth/register", json={"username": "admin", "email": "admin@test.com", "password": "pass123"})
+    mongo.db.users.update_one({"username": "admin"}, {"$set": {"role": "admin", "is_admin": True}})
+    # Role claims are fixed at issue time, so log in again after the promotion
+    token = client.post("/api/auth/login", json={"username": "admin", "password": "pass123"}).get_json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+# -------------------------------
+# Mongo round-trip budgets
+# -------------------------------
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "mongo_budget(limit, path=None): fail when one request to `path` (a prefix; "
+        "default every request) issues more than `limit` Mongo commands",
+    )
+
+
+def _budget_failure(limit, label, details):
+    lines = [f"Mongo budget exceeded for {label}: {len(details)} commands, budget {limit}"]
+    lines += [f"  {i}. {d}" for i, d in enumerate(details, 1)]
+    return "\n".join(lines)
+
+
+@pytest.fixture
+def mongo_budget(counting_db):
+    """`with mongo_budget(3, "history"):` fails if the block issues more than 3 commands."""
+
+    @contextlib.contextmanager
+    def budget(limit, label="block"):
+        start = len(counting_db.details)
+        yield
+        issued = counting_db.details[start:]
+        if len(issued) > limit:
+            pytest.fail(_budget_failure(limit, label, issued), pytrace=False)
+
+    return budget
+
+
+@pytest.fixture(autouse=True)
+def _mongo_budget_marker(request):
+    """Applies `@pytest.mark.mongo_budget` to each request the test client sends."""
+    marker = request.node.get_closest_marker("mongo_budget")
+    if marker is None:
+        yield
+        return
+
+    limit = marker.args[0] if marker.args else marker.kwargs["limit"]
+    prefix = marker.args[1] if len(marker.args) > 1 else marker.kwargs.get("path")
+    client = request.getfixturevalue("client")
+    db = request.getfixturevalue("counting_db")
+    original_open = client.open
+
+    def open_with_budget(*args, **kwargs):
+        path = args[0] if args and isinstance(args[0], str) else kwargs.get("path", "/")
+        start = len(db.details)
+        response = original_open(*args, **kwargs)
+        response.get_data()  # streamed bodies query while they are sent
+        issued = db.details[start:]
+        if (prefix is None or path.startswith(prefix)) and len(issued) > limit:
+            method = kwargs.get("method", "GET")
+            pytest.fail(_budget_failure(limit, f"{method} {path}", issued), pytrace=False)
+        return response
+
+    client.open = open_with_budget
+    yield
+    client.open = original_open
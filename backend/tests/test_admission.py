@@ -0,0 +1,89 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from admission import ConcurrencyGate, admission
+from passwords import passwords
+
+
+def test_gate_queues_then_sheds():
+    gate = ConcurrencyGate(limit=1, queue=1, timeout=0.05)
+    assert gate.acquire()
+    # One waiter times out, and while it waits the queue is full
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(gate.acquire()))
+    waiter.start()
+    while gate.waiting == 0:
+        pass
+    assert not gate.acquire()
+    waiter.join()
+    assert results == [False]
+    assert gate.rejected == 2
+
+    gate.release()
+    assert gate.acquire()
+
+
+def test_full_auth_gate_returns_503(client):
+    client.application.config.update(AUTH_CONCURRENCY=0, AUTH_QUEUE_SIZE=0)
+    response = client.post("/api/auth/login", json={"username": "a", "password": "b"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_username_bucket_limits_login_but_not_catalog(client):
+    client.application.config["LOGIN_RATE_LIMIT_PER_USERNAME"] = "3/minute"
+    for _ in range(3):
+        assert client.post("/api/auth/login", json={"username": "victim", "password": "x"}).status_code == 401
+
+    response = client.post("/api/auth/login", json={"username": "victim", "password": "x"})
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+    # Other usernames and the catalog are unaffected
+    assert client.post("/api/auth/login", json={"username": "other", "password": "x"}).status_code == 401
+    assert client.get("/api/sweets/").status_code == 200
+
+
+def test_defaults_follow_request_threads(client):
+    app = client.application
+    app.config.update(REQUEST_THREADS=4, AUTH_CONCURRENCY=None, AUTH_QUEUE_SIZE=None)
+    admission.init_app(app)
+    assert (app.config["AUTH_CONCURRENCY"], app.config["AUTH_QUEUE_SIZE"]) == (2, 0)
+
+    app.config.update(REQUEST_THREADS=0, AUTH_CONCURRENCY=None, AUTH_QUEUE_SIZE=None)
+    admission.init_app(app)
+    assert (app.config["AUTH_CONCURRENCY"], app.config["AUTH_QUEUE_SIZE"]) == (4, 16)
+
+
+def test_catalog_is_served_while_logins_saturate_the_gate(client, counting_db, monkeypatch):
+    app = client.application
+    client.post("/api/auth/register", json={"username": "burst", "email": "burst@test.com", "password": "pass123"})
+    # Two request threads, as in a gthread worker with GUNICORN_THREADS=2
+    app.config.update(REQUEST_THREADS=2, AUTH_CONCURRENCY=None, AUTH_QUEUE_SIZE=None)
+    admission.init_app(app)
+
+    hashing = threading.Event()
+    release = threading.Event()
+    verify = passwords.verify
+
+    def slow_verify(password, hashed):
+        hashing.set()
+        release.wait(10)
+        return verify(password, hashed)
+
+    monkeypatch.setattr(passwords, "verify", slow_verify)
+
+    def login():
+        return app.test_client().post("/api/auth/login", json={"username": "burst", "password": "pass123"}).status_code
+
+    with ThreadPoolExecutor(2) as threads:
+        try:
+            first = threads.submit(login)
+            assert hashing.wait(5)
+            rejected = [threads.submit(login) for _ in range(3)]
+            catalog = threads.submit(lambda: app.test_client().get("/api/sweets/").status_code)
+            # Extra logins are shed at once instead of waiting on the second thread
+            assert [f.result(timeout=1) for f in rejected] == [503, 503, 503]
+            assert catalog.result(timeout=1) == 200
+        finally:
+            release.set()
+        assert first.result(timeout=5) == 200
@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+import analytics
+from extensions import mongo
+
+
+def _purchase(user, sweet, name, qty, price, timestamp):
+    return {"user_id": user, "sweet_id": sweet, "sweet_name": name, "quantity": qty,
+            "price": price, "total": price * qty, "timestamp": timestamp}
+
+
+def _snapshot(tmp_path):
+    analytics.snapshot.directory = str(tmp_path)
+    analytics.snapshot.lag = timedelta(0)
+    analytics.snapshot._cache = None
+    return analytics.snapshot
+
+
+def test_export_appends_from_watermark(client, tmp_path):
+    snapshot = _snapshot(tmp_path)
+    ladoo = mongo.db.sweets.insert_one({"name": "Ladoo", "category": "Indian"}).inserted_id
+    mongo.db.purchase_history.insert_many([
+        _purchase("u1", ladoo, "Ladoo", 2, 10.0, datetime(2025, 3, 1, 9)),
+        _purchase("u2", ladoo, "Ladoo", 1, 10.0, datetime(2025, 3, 2, 9)),
+    ])
+    assert snapshot.export() == 2
+    assert snapshot.export() == 0
+
+    mongo.db.purchase_history.insert_one(_purchase("u1", ladoo, "Ladoo", 4, 10.0, datetime(2025, 3, 3, 9)))
+    assert snapshot.export() == 1
+
+    meta, columns = snapshot.columns()
+    assert meta["rows"] == 3
+    assert list(columns["qty"]) == [2, 1, 4]
+    assert "user" not in columns and "users" not in meta
+    assert meta["categories"] == ["Indian"]
+
+
+def test_timeseries_buckets_and_moving_average(client, tmp_path):
+    snapshot = _snapshot(tmp_path)
+    ladoo, barfi = ObjectId(), ObjectId()
+    mongo.db.sweets.insert_many([
+        {"_id": ladoo, "name": "Ladoo", "category": "Indian"},
+        {"_id": barfi, "name": "Barfi", "category": "Milk"},
+    ])
+    mongo.db.purchase_history.insert_many([
+        _purchase("u1", ladoo, "Ladoo", 1, 10.0, datetime(2025, 3, 3, 9)),   # Monday
+        _purchase("u1", barfi, "Barfi", 3, 10.0, datetime(2025, 3, 3, 18)),
+        _purchase("u2", ladoo, "Ladoo", 2, 10.0, datetime(2025, 3, 5, 9)),
+        _purchase("u2", ladoo, "Ladoo", 2, 10.0, datetime(2025, 3, 10, 9)),  # next week
+    ])
+    snapshot.export()
+    meta, columns = snapshot.columns()
+
+    daily = analytics.timeseries(meta, columns, "day", window=2)
+    assert [b["sales"] for b in daily["series"]] == [40.0, 0.0, 20.0, 0.0, 0.0, 0.0, 0.0, 20.0]
+    assert [b["moving_average"] for b in daily["series"][:3]] == [40.0, 20.0, 10.0]
+    assert daily["series"][0]["orders"] == 2
+
+    weekly = analytics.timeseries(meta, columns, "week")
+    assert [(b["start"], b["sales"]) for b in weekly["series"]] == [
+        ("2025-03-03T00:00:00", 60.0), ("2025-03-10T00:00:00", 20.0)]
+    assert weekly["top_sweets"][0] == {"name": "Ladoo", "sales": 50.0, "items": 5}
+    assert {c["category"] for c in weekly["categories"]} == {"Indian", "Milk"}
+
+    ranged = analytics.timeseries(meta, columns, "day", start=datetime(2025, 3, 5), top=1)
+    assert sum(b["sales"] for b in ranged["series"]) == 40.0
+    assert len(ranged["top_sweets"]) == 1
+
+
+def test_timeseries_endpoint_requires_admin(client, admin_headers, tmp_path):
+    snapshot = _snapshot(tmp_path)
+    token = client.post("/api/auth/register", json={
+        "username": "boss", "email": "boss@test.com", "password": "pass123"
+    }).get_json()["access_token"]
+    assert client.get("/api/purchases/timeseries", headers={"Authorization": f"Bearer {token}"}).status_code == 403
+
+    mongo.db.purchase_history.insert_one(
+        _purchase("u1", ObjectId(), "Ladoo", 2, 10.0, datetime.utcnow() - timedelta(hours=1)))
+    snapshot.export()
+
+    response = client.get("/api/purchases/timeseries?bucket=hour", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.get_json()["series"][0]["sales"] == 20.0
+    assert client.get("/api/purchases/timeseries?bucket=year", headers=admin_headers).status_code == 400
+    for query in ("top=-1", "window=-3", "top=many"):
+        assert client.get(f"/api/purchases/timeseries?{query}", headers=admin_headers).status_code == 400, query
+    # Offsets are converted to the naive UTC the snapshot is stored in
+    aware = "from=2000-01-01T05:30:00%2B05:30&to=2999-01-01T00:00:00Z"
+    response = client.get(f"/api/purchases/timeseries?bucket=hour&{aware}", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.get_json()["series"][0]["sales"] == 20.0
+
+
+def test_worker_exports_before_the_first_interval(client, tmp_path):
+    snapshot = _snapshot(tmp_path)
+    mongo.db.purchase_history.insert_one(_purchase("u1", ObjectId(), "Ladoo", 1, 10.0, datetime(2025, 3, 1)))
+    snapshot._stop.set()
+    try:
+        snapshot._run(3600)
+    finally:
+        snapshot._stop.clear()
+    assert snapshot.columns()[0]["rows"] == 1
+
+
+def test_columns_reuses_meta_until_the_next_export(client, tmp_path, monkeypatch):
+    snapshot = _snapshot(tmp_path)
+    mongo.db.purchase_history.insert_one(_purchase("u1", ObjectId(), "Ladoo", 1, 10.0, datetime(2025, 3, 1)))
+    snapshot.export()
+    first = snapshot.columns()[0]
+    reads = []
+    read_meta = snapshot._read_meta
+    monkeypatch.setattr(snapshot, "_read_meta", lambda: reads.append(1) or read_meta())
+    assert snapshot.columns()[0] is first and reads == []
+
+    mongo.db.purchase_history.insert_one(_purchase("u1", ObjectId(), "Ladoo", 1, 10.0, datetime(2025, 3, 2)))
+    snapshot.export()
+    reads.clear()
+    assert snapshot.columns()[0]["rows"] == 2 and reads == [1]
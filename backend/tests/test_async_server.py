@@ -0,0 +1,58 @@
+import json
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Runs in a child process: async_server monkey-patches whoever imports it
+SCRIPT = r"""
+import async_server
+import json
+import time
+import urllib.request
+
+import gevent
+import mongomock
+
+from app import create_app
+from extensions import mongo
+from passwords import passwords
+
+app = create_app(testing=True)
+mongo.cx = mongomock.MongoClient()
+mongo.db = mongo.cx["sweetshop_test"]
+passwords.workers = 2
+
+@app.route("/slow")
+def slow():
+    time.sleep(0.2)
+    return "ok"
+
+server = async_server.make_server(app, "127.0.0.1", 0)
+server.start()
+base = f"http://127.0.0.1:{server.server_port}"
+
+started = time.perf_counter()
+gevent.joinall([gevent.spawn(lambda: urllib.request.urlopen(base + "/slow").read()) for _ in range(20)],
+               raise_error=True)
+elapsed = time.perf_counter() - started
+
+body = json.dumps({"username": "async", "email": "async@test.com", "password": "pass123"}).encode()
+request = urllib.request.Request(base + "/api/auth/register", data=body, headers={"Content-Type": "application/json"})
+status = urllib.request.urlopen(request).status
+print(json.dumps({"elapsed": elapsed, "register": status, "threaded_bcrypt": passwords._threads is not None}))
+"""
+
+
+def test_gevent_server_overlaps_waiting_requests():
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT], cwd=BACKEND, capture_output=True, text=True, timeout=60,
+        env={**os.environ, "MONGO_URI": "mongodb://127.0.0.1:27017/sweetshop_test"},
+    )
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    # Twenty 200ms sleeps finish together rather than one after another
+    assert report["elapsed"] < 2.0
+    assert report["register"] == 201
+    assert report["threaded_bcrypt"] is True
@@ -0,0 +1,26 @@
+import copy
+
+from benchmarks import endpoints
+
+
+def test_small_run_reports_every_scenario(tmp_path):
+    out = tmp_path / "run.json"
+    endpoints.main(["run", "--sweets", "20", "--users", "5", "--purchases", "50",
+                    "--requests", "5", "--concurrency", "2", "--out", str(out)])
+    report = endpoints.json.loads(out.read_text())
+    assert set(report["results"]) == {f"{driver}:{name}" for driver in ("wsgi", "http")
+                                      for name in ("sweets", "buy", "history", "history_admin", "stats")}
+    assert all(r["errors"] == 0 and r["requests"] == 5 for r in report["results"].values())
+    assert report["results"]["wsgi:buy"]["mongo_calls_per_request"] == 3
+
+
+def test_compare_flags_regressions():
+    baseline = {"results": {"wsgi:buy": {"throughput_rps": 100.0, "p95_ms": 10.0, "p99_ms": 12.0,
+                                         "mongo_calls_per_request": 3.0, "errors": 0}}}
+    assert endpoints.compare(baseline, baseline) == []
+
+    slower = copy.deepcopy(baseline)
+    slower["results"]["wsgi:buy"].update(throughput_rps=80.0, mongo_calls_per_request=4.0)
+    regressions = endpoints.compare(baseline, slower, threshold=0.1)
+    assert len(regressions) == 2
+    assert endpoints.compare(baseline, slower, threshold=0.5) == ["wsgi:buy: mongo calls/request 3.0 -> 4.0"]
@@ -0,0 +1,111 @@
+from coherence import Coherence, MemoryGenerationStore, MongoGenerationStore
+
+
+def _worker(store, interval=0.0):
+    worker = Coherence(store)
+    worker.interval = interval
+    dropped = []
+    worker.register("sweets", lambda: dropped.append("sweets"))
+    worker.register("users", lambda: dropped.append("users"))
+    return worker, dropped
+
+
+def test_write_in_one_worker_expires_the_other():
+    store = MemoryGenerationStore()
+    a, dropped_a = _worker(store)
+    b, dropped_b = _worker(store)
+    a.check()
+    b.check()
+
+    a.invalidate("sweets")
+    assert dropped_a == ["sweets"]
+
+    b.check()
+    assert dropped_b == ["sweets"]
+    b.check()
+    assert dropped_b == ["sweets"]
+
+
+def test_checks_are_throttled():
+    store = MemoryGenerationStore()
+    a, _ = _worker(store)
+    b, dropped_b = _worker(store, interval=60.0)
+    b.check(force=True)
+
+    a.invalidate("users")
+    b.check()
+    assert dropped_b == []
+    b.check(force=True)
+    assert dropped_b == ["users"]
+
+
+def test_mongo_store_counts_per_namespace(client):
+    store = MongoGenerationStore()
+    assert store.incr("sweets") == 1
+    assert store.incr("sweets") == 2
+    assert store.incr("stats") == 1
+    assert store.read(["sweets", "stats", "users"]) == {"sweets": 2, "stats": 1}
+
+
+def test_own_write_does_not_hide_a_concurrent_remote_write():
+    store = MemoryGenerationStore()
+    a, _ = _worker(store)
+    b = Coherence(store)
+    b.interval = 0.0
+    remote_drops = []
+    b.register("sweets", lambda: remote_drops.append("sweets"), remote_only=True)
+    a.check()
+    b.check()
+
+    a.invalidate("sweets")
+    b.invalidate("sweets")
+    assert remote_drops == []
+    b.check()
+    assert remote_drops == ["sweets"]
+
+    # With no write in between, a worker's own bump is not reported back to it
+    b.invalidate("sweets")
+    b.check()
+    assert remote_drops == ["sweets"]
+
+
+def test_keyed_changes_reach_other_workers():
+    store = MemoryGenerationStore()
+    a, _ = _worker(store)
+    b = Coherence(store)
+    b.interval = 0.0
+    changes = []
+    b.register_changes("stock", changes.append)
+    a.check()
+    b.check()
+
+    a.invalidate("stock", keys={"s1"})
+    a.invalidate("stock", keys={"s2", "s3"})
+    b.check()
+    assert changes == [{"s1", "s2", "s3"}]
+
+    # A writer that does not say what changed forces a full refresh
+    a.invalidate("stock")
+    b.check()
+    assert changes[-1] is None
+
+
+def test_change_log_is_capped(monkeypatch):
+    import coherence as module
+    monkeypatch.setattr(module, "CHANGE_LOG_SIZE", 2)
+    store = MemoryGenerationStore()
+    for key in ("s1", "s2", "s3"):
+        store.incr("stock", keys={key})
+    assert store.changes("stock", 1) == {"s2", "s3"}
+    assert store.changes("stock", 0) is None
+    assert store.changes("stock", None) is None
+
+
+def test_mongo_store_logs_keys(client):
+    store = MongoGenerationStore()
+    store.incr("stock", keys={"b", "a"})
+    assert store.incr("stock", keys={"c"}) == 2
+    assert store.read(["stock"]) == {"stock": 2}
+    assert store.changes("stock", 0) == {"a", "b", "c"}
+    assert store.changes("stock", 1) == {"c"}
+    assert store.changes("stock", 2) == set()
@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from email_templates import email_templates
+
+
+def test_templates_inline_css_and_escape_user_values():
+    html = email_templates.render("welcome", username="<script>alert(1)</script>")
+    assert "<style>" in html and ".email-container" in html
+    assert '<link rel="stylesheet"' not in html
+    assert "<script>" not in html
+    assert "&lt;script&gt;" in html
+
+
+def test_purchase_confirmation_escapes_sweet_name():
+    html = email_templates.render(
+        "purchase_confirmation",
+        username="buyer",
+        sweet={"name": "Ladoo <b>", "price": 10.0, "image_url": None},
+        qty=3,
+        order_date=datetime(2025, 1, 2),
+    )
+    assert "Ladoo &lt;b&gt;" in html
+    assert "Total: ₹30.0" in html
+    assert "January 02, 2025" in html
+    assert "product-image\">" not in html
+
+
+def test_bytecode_cache_is_private_to_this_user(client):
+    import os
+    import stat
+    import tempfile
+
+    email_templates.init_app(client.application)
+    email_templates.render("welcome", username="cache")
+    directory = email_templates._templates["welcome"].environment.bytecode_cache.directory
+
+    assert directory != os.path.join(tempfile.gettempdir(), "sweetshop-email-templates")
+    info = os.stat(directory)
+    assert info.st_uid == os.getuid()
+    assert stat.S_IMODE(info.st_mode) & 0o077 == 0
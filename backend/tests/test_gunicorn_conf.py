@@ -0,0 +1,52 @@
+import os
+import runpy
+
+from app import create_app, init_worker
+from extensions import mongo
+from outbox import outbox
+
+CONF = os.path.join(os.path.dirname(__file__), "..", "gunicorn.conf.py")
+
+
+def _load_conf(monkeypatch, **env):
+    # The config module sets environment defaults; keep them out of other tests
+    monkeypatch.setattr(os, "environ", {**os.environ, **env})
+    return runpy.run_path(CONF)
+
+
+def test_gthread_defaults_scale_with_cpus(monkeypatch):
+    monkeypatch.setattr("multiprocessing.cpu_count", lambda: 2)
+    conf = _load_conf(monkeypatch, GUNICORN_WORKER_CLASS="gthread", GUNICORN_THREADS="8")
+    assert conf["preload_app"] is True
+    assert conf["wsgi_app"] == "app:create_app(preload=True)"
+    assert (conf["workers"], conf["threads"]) == (5, 8)
+    assert os.environ["MONGO_MAX_POOL_SIZE"] == "12"
+    assert os.environ["PASSWORD_HASH_WORKERS"] == "1"
+    assert os.environ["REQUEST_THREADS"] == "8"
+    assert conf["max_requests"] == 2000 and conf["max_requests_jitter"] == 200
+
+
+def test_settings_come_from_the_environment(monkeypatch):
+    conf = _load_conf(monkeypatch, GUNICORN_WORKER_CLASS="sync", WEB_CONCURRENCY="3",
+                      GUNICORN_MAX_REQUESTS="0", GUNICORN_PRELOAD="0", MONGO_MAX_POOL_SIZE="7",
+                      PASSWORD_HASH_WORKERS="2")
+    assert conf["workers"] == 3
+    assert conf["max_requests"] == 0
+    assert conf["preload_app"] is False
+    assert os.environ["MONGO_MAX_POOL_SIZE"] == "7"
+    assert os.environ["PASSWORD_HASH_WORKERS"] == "2"
+
+
+def test_preloaded_app_opens_mongo_in_the_worker(monkeypatch):
+    app = create_app(testing=True, preload=True)
+    master_client = mongo.cx
+
+    init_worker(app)
+    assert mongo.cx is master_client
+
+    # As seen from a forked worker: the master's client must not be reused
+    monkeypatch.setitem(app.extensions, "mongo_pid", -1)
+    init_worker(app)
+    assert mongo.cx is not master_client
+    assert app.extensions["mongo_pid"] == os.getpid()
+    assert outbox._threads == []
@@ -0,0 +1,41 @@
+from extensions import mongo
+from indexes import plan_stages, registry
+
+
+def test_declared_indexes_are_ensured_idempotently(client):
+    first = registry.ensure()
+    second = registry.ensure()
+    assert first == second
+
+    users = mongo.db.users.index_information()
+    assert users["username_1"]["unique"] is True
+    assert users["email_1"]["unique"] is True
+    assert mongo.db.sweets.index_information()["name_1"]["unique"] is True
+    assert "timestamp_-1__id_-1" in mongo.db.purchase_history.index_information()
+
+
+def test_duplicate_sweet_name_is_rejected(client):
+    registry.ensure()
+    token = client.post("/api/auth/register", json={
+        "username": "indexer",
+        "email": "indexer@test.com",
+        "password": "pass123"
+    }).get_json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    sweet = {"name": "Ladoo", "category": "Indian", "price": 10.0, "quantity": 5}
+
+    assert client.post("/api/sweets/", json=sweet, headers=headers).status_code == 201
+    response = client.post("/api/sweets/", json=sweet, headers=headers)
+    assert response.status_code == 400
+    assert response.get_json()["msg"] == "Sweet with this name already exists"
+
+
+def test_plan_stages_flags_collection_scans():
+    indexed = {"queryPlanner": {"winningPlan": {
+        "stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "username_1"}
+    }}}
+    scanned = {"queryPlanner": {"winningPlan": {"queryPlan": {
+        "stage": "SORT", "inputStage": {"stage": "COLLSCAN"}
+    }}}}
+    assert plan_stages(indexed) == ["FETCH", "IXSCAN"]
+    assert "COLLSCAN" in plan_stages(scanned)
@@ -1,18 +1,18 @@
 def test_purchase_and_restock(client):
     # Register & Login
-    client.post("/auth/register", json={
+    client.post("/api/auth/register", json={
         "username": "stockuser",
         "email": "stock@test.com",
         "password": "pass123"
     })
-    login = client.post("/auth/login", json={
+    login = client.post("/api/auth/login", json={
         "username": "stockuser",
         "password": "pass123"
     })
     token = login.get_json()["access_token"]
 
     # Add sweet
-    add_sweet = client.post("/sweets/", json={
+    add_sweet = client.post("/api/sweets/", json={
         "name": "Barfi",
         "category": "Indian",
         "price": 20.0,
@@ -21,12 +21,36 @@ def test_purchase_and_restock(client):
     sweet_id = add_sweet.get_json()["id"]
 
     # Purchase 2
-    response = client.post(f"/inventory/{sweet_id}/purchase", json={"quantity": 2},
+    response = client.post(f"/api/sweets/{sweet_id}/purchase", json={"quantity": 2},
                            headers={"Authorization": f"Bearer {token}"})
     assert response.status_code == 201
 
     # Restock 3
-    response = client.post(f"/inventory/{sweet_id}/restock", json={"quantity": 3},
+    response = client.post(f"/api/sweets/{sweet_id}/restock", json={"quantity": 3},
                            headers={"Authorization": f"Bearer {token}"})
     assert response.status_code == 200
     assert "Restocked" in response.get_json()["msg"]
+
+
+def test_purchase_and_restock_reject_bad_quantities(client):
+    from extensions import mongo
+    token = client.post("/api/auth/register", json={
+        "username": "tricky", "email": "tricky@test.com", "password": "pass123"
+    }).get_json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    sweet_id = mongo.db.sweets.insert_one({"name": "Barfi", "category": "Indian", "price": 20.0,
+                                           "quantity": 5}).inserted_id
+
+    for body in ({"quantity": -50}, {"quantity": 0}, {"quantity": True}, {"quantity": 1.5}, ["x"]):
+        for action in ("purchase", "restock"):
+            response = client.post(f"/api/sweets/{sweet_id}/{action}", json=body, headers=headers)
+            assert response.status_code == 400, (action, body)
+    response = client.post("/api/sweets/nope/purchase", json={"quantity": 1}, headers=headers)
+    assert response.status_code == 400
+    response = client.post("/api/purchases/buy", json={"sweet_id": str(sweet_id), "quantity": True},
+                           headers=headers)
+    assert response.status_code == 400
+
+    assert mongo.db.sweets.find_one({"_id": sweet_id})["quantity"] == 5
+    assert mongo.db.purchase_history.count_documents({}) == 0
+    assert mongo.db.sales_rollups.count_documents({}) == 0
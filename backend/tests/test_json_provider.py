@@ -0,0 +1,28 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from bson import Decimal128, ObjectId
+from flask import current_app
+
+from extensions import mongo
+
+
+def test_encodes_mongo_types(client):
+    oid = ObjectId()
+    with client.application.app_context():
+        body = json.loads(current_app.json.dumps({
+            "_id": oid,
+            "timestamp": datetime(2025, 3, 1, 9, 30, 0, 120000),
+            "price": Decimal("12.50"),
+            "total": Decimal128("25.00"),
+        }))
+    assert body == {"_id": str(oid), "timestamp": "2025-03-01T09:30:00.120000",
+                    "price": "12.50", "total": "25.00"}
+
+
+def test_catalog_ids_are_plain_strings(client):
+    sweet_id = mongo.db.sweets.insert_one({"name": "Ladoo", "category": "Indian", "price": 10.0, "quantity": 5}).inserted_id
+    assert client.get("/api/sweets/").get_json() == [
+        {"_id": str(sweet_id), "name": "Ladoo", "category": "Indian", "price": 10.0, "quantity": 5}
+    ]
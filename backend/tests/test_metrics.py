@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+from prometheus_client import REGISTRY
+
+from metrics import CommandMetrics, time_smtp
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_request_latency_and_metrics_endpoint(client):
+    before = _sample("http_request_duration_seconds_count", blueprint="sweets",
+                     endpoint="sweets.list_sweets", method="GET", status="200")
+    client.get("/api/sweets/")
+    after = _sample("http_request_duration_seconds_count", blueprint="sweets",
+                    endpoint="sweets.list_sweets", method="GET", status="200")
+    assert after == before + 1
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert b"http_request_duration_seconds_bucket" in response.data
+
+
+def test_command_listener_tags_endpoint_and_collection(client):
+    listener = CommandMetrics()
+    started = SimpleNamespace(command={"find": "sweets", "filter": {}}, command_name="find",
+                              connection_id=("db", 27017), request_id=7)
+    with client.application.test_request_context("/api/sweets/"):
+        client.application.preprocess_request()
+        listener.started(started)
+    labels = {"command": "find", "collection": "sweets", "endpoint": "sweets.list_sweets"}
+    before = _sample("mongo_command_duration_seconds_count", **labels)
+    listener.succeeded(SimpleNamespace(command_name="find", connection_id=("db", 27017),
+                                       request_id=7, duration_micros=1500))
+    assert _sample("mongo_command_duration_seconds_count", **labels) == before + 1
+
+
+def test_smtp_timer_records_failures():
+    before = _sample("smtp_duration_seconds_count", operation="send", outcome="error")
+    try:
+        with time_smtp("send"):
+            raise ConnectionError("gone")
+    except ConnectionError:
+        pass
+    assert _sample("smtp_duration_seconds_count", operation="send", outcome="error") == before + 1
@@ -0,0 +1,106 @@
+import socket
+from datetime import datetime, timedelta
+
+import pytest
+
+from extensions import mail, mongo
+from outbox import outbox
+
+aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    received = []
+
+    class RecordingHandler:
+        async def handle_DATA(self, server, session, envelope):
+            received.append(envelope)
+            return "250 OK"
+
+    controller = aiosmtpd_controller.Controller(RecordingHandler(), hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    controller.received = received
+    yield controller
+    controller.stop()
+
+
+def _point_mail_at(app, host, port):
+    app.config.update(
+        MAIL_SERVER=host,
+        MAIL_PORT=port,
+        MAIL_USE_TLS=False,
+        MAIL_USERNAME=None,
+        MAIL_PASSWORD=None,
+        MAIL_SUPPRESS_SEND=False,
+        MAIL_DEFAULT_SENDER="shop@test.com",
+    )
+    mail.init_app(app)
+
+
+def test_register_only_enqueues(client):
+    response = client.post("/api/auth/register", json={
+        "username": "mailer",
+        "email": "mailer@test.com",
+        "password": "pass123"
+    })
+    assert response.status_code == 201
+    assert outbox.queue_depth() == 1
+    job = mongo.db.email_outbox.find_one()
+    assert job["recipients"] == ["mailer@test.com"]
+    assert job["status"] == "pending"
+
+
+def test_drain_delivers_batch_over_one_connection(client, smtp_server):
+    _point_mail_at(client.application, smtp_server.hostname, smtp_server.port)
+    for i in range(3):
+        outbox.enqueue(subject=f"Hello {i}", recipients=[f"user{i}@test.com"], html="<p>hi</p>")
+
+    assert outbox.drain() == 3
+    assert outbox.queue_depth() == 0
+    assert len(smtp_server.received) == 3
+    assert mongo.db.email_outbox.count_documents({"status": "sent"}) == 3
+
+
+def test_failed_send_is_rescheduled_with_backoff(client):
+    _point_mail_at(client.application, "127.0.0.1", _free_port())
+    client.application.config["OUTBOX_MAX_ATTEMPTS"] = 2
+
+    job_id = outbox.enqueue(subject="Hi", recipients=["a@test.com"], html="<p>hi</p>")
+    assert outbox.drain() == 1
+
+    job = mongo.db.email_outbox.find_one({"_id": job_id})
+    assert job["status"] == "pending"
+    assert job["attempts"] == 1
+    assert job["next_attempt_at"] > job["created_at"]
+    assert outbox.queue_depth() == 1
+
+    # Make it due again; the second failure exhausts the attempts
+    mongo.db.email_outbox.update_one({"_id": job_id}, {"$set": {"next_attempt_at": job["created_at"]}})
+    outbox.drain()
+    assert mongo.db.email_outbox.find_one({"_id": job_id})["status"] == "failed"
+    assert outbox.queue_depth() == 0
+
+
+def test_abandoned_claim_is_reclaimed_after_timeout(client):
+    client.application.config["OUTBOX_CLAIM_TIMEOUT"] = 60
+    now = datetime.utcnow()
+    stale = outbox.enqueue(subject="Stale", recipients=["a@test.com"], html="<p>hi</p>")
+    fresh = outbox.enqueue(subject="Fresh", recipients=["b@test.com"], html="<p>hi</p>")
+    # Both were claimed by a worker that never came back; only one lease has run out
+    mongo.db.email_outbox.update_one({"_id": stale}, {"$set": {
+        "status": "sending", "attempts": 1, "claimed_at": now - timedelta(seconds=120)}})
+    mongo.db.email_outbox.update_one({"_id": fresh}, {"$set": {
+        "status": "sending", "attempts": 1, "claimed_at": now - timedelta(seconds=10)}})
+
+    with client.application.app_context():
+        batch = outbox._claim_batch()
+    assert [job["_id"] for job in batch] == [stale]
+    assert batch[0]["attempts"] == 2
+    assert batch[0]["claimed_at"] > now - timedelta(seconds=1)
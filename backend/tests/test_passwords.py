@@ -0,0 +1,48 @@
+from flask import Flask
+
+from passwords import PasswordHasher, passwords
+from extensions import mongo
+from utils import hash_password, hash_rounds
+
+
+def test_pool_hashes_in_worker_processes():
+    hasher = PasswordHasher(rounds=4, workers=1)
+    try:
+        hashed = hasher.hash("secret")
+        assert hash_rounds(hashed) == 4
+        assert hasher.verify("secret", hashed)
+        assert not hasher.verify("wrong", hashed)
+        assert hasher._pool is not None
+    finally:
+        hasher.shutdown()
+
+
+def test_pool_defaults_to_one_process_per_app():
+    hasher = PasswordHasher()
+    hasher.init_app(Flask(__name__))
+    assert hasher.workers == 1
+
+    app = Flask(__name__)
+    app.config["PASSWORD_HASH_WORKERS"] = 3
+    hasher.init_app(app)
+    assert hasher.workers == 3
+
+
+def test_login_rehashes_when_cost_changes(client):
+    mongo.db.users.insert_one({
+        "username": "old", "email": "old@test.com", "password": hash_password("pass123", 5), "is_admin": False
+    })
+    rounds = passwords.rounds
+    passwords.rounds = 4
+    try:
+        response = client.post("/api/auth/login", json={"username": "old", "password": "pass123"})
+        assert response.status_code == 200
+        stored = mongo.db.users.find_one({"username": "old"})["password"]
+        assert hash_rounds(stored) == 4
+        assert passwords.verify("pass123", stored)
+
+        # Already at the configured cost: left alone
+        client.post("/api/auth/login", json={"username": "old", "password": "pass123"})
+        assert mongo.db.users.find_one({"username": "old"})["password"] == stored
+    finally:
+        passwords.rounds = rounds
@@ -0,0 +1,82 @@
+import json
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def test_admin_header_profiles_request(client, admin_headers, tmp_path):
+    client.application.config.update(PROFILE_DIR=str(tmp_path), PROFILE_INTERVAL_MS=1, PROFILE_KEEP=2)
+    assert client.get("/api/profiles/", headers=admin_headers).get_json() == []
+
+    # The header alone is not enough
+    client.get("/api/purchases/history", headers={"X-Profile": "1"})
+    assert list(tmp_path.iterdir()) == []
+
+    for _ in range(3):
+        client.get("/api/purchases/history", headers={**admin_headers, "X-Profile": "1"})
+    profiles = client.get("/api/profiles/", headers=admin_headers).get_json()
+    assert len(profiles) == 2
+    assert "GET-api_purchases_history" in profiles[0]["name"]
+
+    response = client.get(f"/api/profiles/{profiles[0]['name']}", headers=admin_headers)
+    assert response.status_code == 200
+    assert client.get("/api/profiles/..%2Fapp.py", headers=admin_headers).status_code == 404
+
+
+def test_sample_rate_profiles_anonymous_requests(client, tmp_path):
+    client.application.config.update(PROFILE_DIR=str(tmp_path), PROFILE_SAMPLE_RATE=1.0)
+    client.get("/api/sweets/")
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_profiles_are_admin_only(client):
+    token = client.post("/api/auth/register", json={
+        "username": "nosy", "email": "nosy@test.com", "password": "pass123"
+    }).get_json()["access_token"]
+    assert client.get("/api/profiles/", headers={"Authorization": f"Bearer {token}"}).status_code == 403
+
+
+# Runs in a child process: the profiler has to see gevent's patched threading
+GEVENT_SCRIPT = r"""
+from gevent import monkey
+monkey.patch_all()
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+import mongomock
+
+from app import create_app
+from extensions import mongo
+
+app = create_app(testing=True)
+mongo.cx = mongomock.MongoClient()
+mongo.db = mongo.cx["sweetshop_test"]
+app.config.update(PROFILE_DIR=tempfile.mkdtemp(), PROFILE_SAMPLE_RATE=1.0, PROFILE_INTERVAL_MS=1)
+
+@app.route("/waits")
+def waits():
+    for _ in range(20):
+        time.sleep(0.005)
+    return "ok"
+
+app.test_client().get("/waits")
+[name] = os.listdir(app.config["PROFILE_DIR"])
+with open(os.path.join(app.config["PROFILE_DIR"], name)) as f:
+    print(json.dumps(f.read()))
+"""
+
+
+def test_profiles_requests_under_gevent():
+    result = subprocess.run(
+        [sys.executable, "-c", GEVENT_SCRIPT], cwd=BACKEND, capture_output=True, text=True, timeout=60,
+        env={**os.environ, "MONGO_URI": "mongodb://127.0.0.1:27017/sweetshop_test"},
+    )
+    assert result.returncode == 0, result.stderr
+    profile = json.loads(result.stdout.strip().splitlines()[-1])
+    assert "waits (" in profile
@@ -1,18 +1,23 @@
+import base64
+
+import pytest
+
+
 def test_purchase_flow(client):
     # Register & Login
-    client.post("/auth/register", json={
+    client.post("/api/auth/register", json={
         "username": "buyer",
         "email": "buyer@test.com",
         "password": "pass123"
     })
-    login = client.post("/auth/login", json={
+    login = client.post("/api/auth/login", json={
         "username": "buyer",
         "password": "pass123"
     })
     token = login.get_json()["access_token"]
 
     # Add sweet
-    add_sweet = client.post("/sweets/", json={
+    add_sweet = client.post("/api/sweets/", json={
         "name": "Jalebi",
         "category": "Indian",
         "price": 15.0,
@@ -35,3 +40,179 @@ def test_purchase_flow(client):
     history = response.get_json()
     assert len(history) == 1
     assert history[0]["sweet_name"] == "Jalebi"
+
+
+def _register(client, username):
+    response = client.post("/api/auth/register", json={
+        "username": username,
+        "email": f"{username}@test.com",
+        "password": "pass123"
+    })
+    return {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+
+@pytest.mark.mongo_budget(6, "/api/purchases/checkout")
+def test_checkout_basket(client):
+    from extensions import mongo
+    headers = _register(client, "basket")
+    ladoo = mongo.db.sweets.insert_one({"name": "Ladoo", "category": "Indian", "price": 10.0, "quantity": 5}).inserted_id
+    barfi = mongo.db.sweets.insert_one({"name": "Barfi", "category": "Indian", "price": 20.0, "quantity": 2}).inserted_id
+
+    response = client.post("/api/purchases/checkout", json={"items": [
+        {"sweet_id": str(ladoo), "quantity": 2},
+        {"sweet_id": str(barfi), "quantity": 1},
+        {"sweet_id": str(ladoo), "quantity": 1},
+    ]}, headers=headers)
+
+    assert response.status_code == 201
+    body = response.get_json()
+    assert len(body["purchase_ids"]) == 2
+    assert body["total"] == 50.0
+    assert mongo.db.sweets.find_one({"_id": ladoo})["quantity"] == 2
+    assert mongo.db.sweets.find_one({"_id": barfi})["quantity"] == 1
+    assert mongo.db.email_outbox.count_documents({"subject": {"$regex": "Order Confirmation"}}) == 1
+
+
+def test_checkout_is_all_or_nothing(client):
+    from extensions import mongo
+    headers = _register(client, "greedy")
+    ladoo = mongo.db.sweets.insert_one({"name": "Ladoo", "category": "Indian", "price": 10.0, "quantity": 5}).inserted_id
+    barfi = mongo.db.sweets.insert_one({"name": "Barfi", "category": "Indian", "price": 20.0, "quantity": 2}).inserted_id
+
+    response = client.post("/api/purchases/checkout", json={"items": [
+        {"sweet_id": str(ladoo), "quantity": 2},
+        {"sweet_id": str(barfi), "quantity": 3},
+    ]}, headers=headers)
+
+    assert response.status_code == 400
+    assert response.get_json()["sweet_id"] == str(barfi)
+    assert mongo.db.sweets.find_one({"_id": ladoo})["quantity"] == 5
+    assert mongo.db.purchase_history.count_documents({}) == 0
+
+
+def test_checkout_rejects_malformed_items(client):
+    headers = _register(client, "sloppy")
+    for items in (["x"], [{"sweet_id": "nope"}], [{"sweet_id": "64b7f0f0f0f0f0f0f0f0f0f0", "quantity": "two"}]):
+        response = client.post("/api/purchases/checkout", json={"items": items}, headers=headers)
+        assert response.status_code == 400, items
+
+    response = client.post("/api/purchases/buy", json={"sweet_id": "nope"}, headers=headers)
+    assert response.status_code == 400
+
+
+def _seed_purchases(count):
+    from datetime import datetime
+    from bson import ObjectId
+    from extensions import mongo
+    buyers = [mongo.db.users.insert_one({"username": f"buyer{i}", "email": f"buyer{i}@test.com"}).inserted_id
+              for i in range(3)]
+    buyers.append(ObjectId())  # a deleted user
+    mongo.db.purchase_history.insert_many([{
+        "user_id": buyers[i % len(buyers)],
+        "sweet_id": ObjectId(),
+        "sweet_name": "Ladoo",
+        "quantity": 1,
+        "price": 10.0,
+        "total": 10.0,
+        "timestamp": datetime.utcnow(),
+    } for i in range(count)])
+    return buyers
+
+
+@pytest.mark.mongo_budget(2, "/api/purchases/history")
+def test_admin_history_resolves_users_in_constant_queries(client, admin_headers, counting_db):
+    from extensions import mongo
+
+    command_counts = []
+    for count in (4, 40):
+        mongo.db.purchase_history.delete_many({})
+        buyers = _seed_purchases(count)
+        counting_db.reset()
+        response = client.get("/api/purchases/history", headers=admin_headers)
+        assert response.status_code == 200
+        command_counts.append(len(counting_db.commands))
+
+    assert command_counts[0] == command_counts[1]
+    rows = {row["user_id"]: row for row in response.get_json()}
+    assert rows[str(buyers[0])]["user_name"] == "buyer0"
+    assert rows[str(buyers[0])]["user_email"] == "buyer0@test.com"
+    assert rows[str(buyers[-1])]["user_name"] == "Deleted User"
+    assert rows[str(buyers[-1])]["user_email"] == f"User ID: {buyers[-1]}"
+
+
+@pytest.mark.mongo_budget(2, "/api/purchases/history")
+def test_history_keyset_pagination_and_filters(client, admin_headers):
+    from extensions import mongo
+    _seed_purchases(7)
+    every_id = {str(p["_id"]) for p in mongo.db.purchase_history.find()}
+
+    seen, pages, cursor = [], 0, None
+    while True:
+        url = "/api/purchases/history?limit=3" + (f"&cursor={cursor}" if cursor else "")
+        body = client.get(url, headers=admin_headers).get_json()
+        seen.extend(row["_id"] for row in body["items"])
+        pages += 1
+        cursor = body["next"]
+        if not cursor:
+            break
+
+    assert pages == 3
+    assert len(seen) == 7 and set(seen) == every_id
+
+    buyer = mongo.db.users.find_one({"username": "buyer1"})["_id"]
+    body = client.get(f"/api/purchases/history?limit=50&user_id={buyer}", headers=admin_headers).get_json()
+    assert {row["user_name"] for row in body["items"]} == {"buyer1"}
+
+    for raw in (b"not-a-cursor", b"[1]", b'{"t": 1, "id": 2}', b'{"t": "2025-01-01"}', b"null"):
+        token = raw.decode() if raw == b"not-a-cursor" else base64.urlsafe_b64encode(raw).decode()
+        response = client.get(f"/api/purchases/history?cursor={token}", headers=admin_headers)
+        assert response.status_code == 400, raw
+
+
+def test_history_fields_and_summary_view(client, admin_headers, counting_db):
+    _seed_purchases(5)
+
+    counting_db.reset()
+    body = client.get("/api/purchases/history?limit=10&fields=sweet_name,total", headers=admin_headers).get_json()
+    assert {tuple(row) for row in body["items"]} == {("sweet_name", "total")}
+    # No user names requested, so no users lookup
+    assert not [c for c in counting_db.commands if c[0] == "users"]
+
+    rows = client.get("/api/purchases/history?view=summary", headers=admin_headers).get_json()
+    assert set(rows[0]) == {"_id", "sweet_name", "quantity", "total", "timestamp", "user_name", "user_email"}
+
+    response = client.get("/api/purchases/history?fields=password", headers=admin_headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.mongo_budget(3, "/api/purchases/buy")
+def test_buy_stays_within_budget(client):
+    from extensions import mongo
+    headers = _register(client, "buyer")
+    ladoo = mongo.db.sweets.insert_one({"name": "Ladoo", "category": "Indian", "price": 10.0, "quantity": 5}).inserted_id
+
+    response = client.post("/api/purchases/buy", json={"sweet_id": str(ladoo), "quantity": 2}, headers=headers)
+    assert response.status_code == 201
+    assert mongo.db.sweets.find_one({"_id": ladoo})["quantity"] == 3
+
+
+def test_budget_failure_lists_commands(client, mongo_budget):
+    from extensions import mongo
+    with pytest.raises(pytest.fail.Exception) as excinfo:
+        with mongo_budget(1, "two lookups"):
+            mongo.db.users.find_one({"username": "a"})
+            mongo.db.sweets.find_one({"name": "b"})
+    assert str(excinfo.value).splitlines() == [
+        "Mongo budget exceeded for two lookups: 2 commands, budget 1",
+        "  1. users.find_one({'username': 'a'})",
+        "  2. sweets.find_one({'name': 'b'})",
+    ]
+
+
+def test_history_stream_sends_one_chunk_per_batch():
+    import json
+    from resources.purchases import _stream_history
+    rows = [{"sweet_name": f"Sweet {i}", "quantity": i} for i in range(7)]
+    chunks = list(_stream_history(iter(rows), False, 3, json.dumps, fields=["sweet_name", "quantity"]))
+    assert len(chunks) == 5  # "[", three batches, "]"
+    assert json.loads("".join(chunks)) == rows
@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+import rollups
+from extensions import mongo
+
+
+def _purchase(user, sweet, qty, price, timestamp):
+    return {"user_id": user, "sweet_id": sweet, "sweet_name": "Ladoo", "quantity": qty,
+            "price": price, "total": price * qty, "timestamp": timestamp}
+
+
+def test_record_updates_day_month_and_all_time(client):
+    sweet = ObjectId()
+    rollups.record([
+        _purchase("u1", sweet, 2, 10.0, datetime(2025, 3, 1, 9)),
+        _purchase("u2", sweet, 1, 10.0, datetime(2025, 3, 1, 18)),
+    ])
+    rollups.record([_purchase("u1", sweet, 3, 10.0, datetime(2025, 4, 2))])
+
+    day = mongo.db.sales_rollups.find_one({"_id": "day:2025-03-01"})
+    assert rollups.summary(day) == {"sales": 30.0, "orders": 2, "items": 3}
+    march = mongo.db.sales_rollups.find_one({"_id": "month:2025-03"})
+    assert march["sweets"][str(sweet)] == {"sales": 30.0, "items": 3, "name": "Ladoo"}
+    everything = mongo.db.sales_rollups.find_one({"_id": "all"})
+    assert rollups.summary(everything) == {"sales": 60.0, "orders": 3, "items": 6}
+    assert rollups.hll_estimate(everything["customers"]) == 2
+
+
+def test_rebuild_matches_incremental_rollups(client):
+    sweet = ObjectId()
+    purchases = [_purchase(f"user{i % 7}", sweet, 1 + i % 3, 5.0, datetime(2025, 1 + i % 2, 1 + i % 28))
+                 for i in range(50)]
+    mongo.db.purchase_history.insert_many([dict(p) for p in purchases])
+    rollups.record(purchases)
+    incremental = {d["_id"]: d for d in mongo.db.sales_rollups.find()}
+
+    assert rollups.rebuild(batch_size=8) == 50
+    rebuilt = {d["_id"]: d for d in mongo.db.sales_rollups.find()}
+    assert rebuilt == incremental
+
+
+def test_customer_sketch_is_close():
+    registers = {}
+    for i in range(20000):
+        index, rank = rollups.hll_register(ObjectId())
+        registers[str(index)] = max(registers.get(str(index), 0), rank)
+    assert abs(rollups.hll_estimate(registers) - 20000) < 20000 * 0.08
+
+
+@pytest.mark.mongo_budget(1, "/api/purchases/stats")
+def test_stats_endpoint_reads_rollups(client, admin_headers, counting_db):
+    rollups.record([_purchase("u1", ObjectId(), 2, 10.0, datetime.utcnow())])
+
+    counting_db.reset()
+    response = client.get("/api/purchases/stats", headers=admin_headers)
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body["current_month"] == {"sales": 20.0, "orders": 1, "items": 2}
+    assert body["all_time"]["orders"] == 1
+    assert body["total_customers"] == 1
+    # Role comes from the token claims: no user lookup at all
+    assert counting_db.commands == [("sales_rollups", "find")]
+
+
+def test_rebuild_swaps_in_a_complete_collection(client):
+    sweet = ObjectId()
+    mongo.db.purchase_history.insert_many([_purchase("u1", sweet, 1, 5.0, datetime(2025, 1, 1)) for _ in range(3)])
+    mongo.db.sales_rollups.insert_one({"_id": "all", "sales": 999.0, "orders": 99, "items": 99})
+
+    assert rollups.rebuild() == 3
+    assert rollups.summary(mongo.db.sales_rollups.find_one({"_id": "all"})) == {"sales": 15.0, "orders": 3, "items": 3}
+    assert [n for n in mongo.db.list_collection_names() if n.startswith("sales_rollups_rebuild")] == []
+
+
+def test_rollups_are_seeded_only_when_missing(client):
+    mongo.db.purchase_history.insert_one(_purchase("u1", ObjectId(), 2, 5.0, datetime(2025, 1, 1)))
+    assert rollups.seed_if_missing() == 1
+    assert rollups.seed_if_missing() is None
+    assert mongo.db.sales_rollups.find_one({"_id": "all"})["orders"] == 1
+
+
+def test_rollups_are_seeded_by_one_worker_at_a_time(client):
+    mongo.db.purchase_history.insert_one(_purchase("u1", ObjectId(), 2, 5.0, datetime(2025, 1, 1)))
+    mongo.db.rollup_locks.insert_one({"_id": "seed", "taken_at": datetime.utcnow()})
+    assert rollups.seed_if_missing() is None
+    assert mongo.db.sales_rollups.find_one({"_id": "all"}) is None
+
+    # A lock left behind by a worker that died mid-rebuild expires
+    stale = datetime.utcnow() - timedelta(seconds=rollups.SEED_LOCK_SECONDS + 1)
+    mongo.db.rollup_locks.update_one({"_id": "seed"}, {"$set": {"taken_at": stale}})
+    assert rollups.seed_if_missing() == 1
+    assert mongo.db.rollup_locks.count_documents({}) == 0
+
+
+def test_purchase_survives_rollup_failure(client, monkeypatch):
+    import stock
+
+    sweet_id = mongo.db.sweets.insert_one({"name": "Ladoo", "price": 10.0, "quantity": 5}).inserted_id
+
+    def broken_record(purchases, collection=None):
+        raise RuntimeError("sales_rollups unavailable")
+
+    monkeypatch.setattr(rollups, "record", broken_record)
+    sweet, purchase = stock.purchase("user-1", str(sweet_id), 2)
+    assert sweet["quantity"] == 3
+    assert mongo.db.purchase_history.count_documents({}) == 1
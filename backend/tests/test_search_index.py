@@ -0,0 +1,105 @@
+from bson import ObjectId
+
+from extensions import mongo
+from search_index import SweetSearchIndex
+
+
+def _index(*sweets):
+    for name, category, price in sweets:
+        mongo.db.sweets.insert_one({"name": name, "category": category, "price": price, "quantity": 5})
+    index = SweetSearchIndex()
+    index.rebuild()
+    return index
+
+
+def _names(results):
+    return [s["name"] for s in results]
+
+
+def test_ranks_exact_then_prefix_then_substring(client):
+    index = _index(
+        ("Motichoor Ladoo", "Indian", 12.0),
+        ("Ladoo", "Indian", 10.0),
+        ("Besan Ladoo", "Indian", 11.0),
+        ("Ladoo Cake", "Fusion", 30.0),
+        ("Chocolate Bar", "Western", 5.0),
+    )
+    assert _names(index.search(name="ladoo")) == ["Ladoo", "Ladoo Cake", "Besan Ladoo", "Motichoor Ladoo"]
+    assert _names(index.search(name="adoo")) == ["Besan Ladoo", "Ladoo", "Ladoo Cake", "Motichoor Ladoo"]
+
+
+def test_typos_accents_and_special_characters(client):
+    index = _index(("Rasgulla", "Bengali", 8.0), ("Crème Brûlée", "French", 40.0))
+    assert _names(index.search(name="rasgula")) == ["Rasgulla"]
+    assert _names(index.search(name="creme brulee")) == ["Crème Brûlée"]
+    assert index.search(name="(.*") == []
+
+
+def test_filters_are_applied_in_memory(client):
+    index = _index(("Ladoo", "Indian", 10.0), ("Kaju Ladoo", "Indian", 25.0), ("Ladoo Cake", "Fusion", 30.0))
+    assert _names(index.search(name="ladoo", category="Indian", min_price=20)) == ["Kaju Ladoo"]
+    assert _names(index.search(max_price=15)) == ["Ladoo"]
+
+
+def test_incremental_updates(client):
+    index = _index(("Ladoo", "Indian", 10.0))
+    new_id = ObjectId()
+    index.upsert({"_id": new_id, "name": "Peda", "category": "Indian", "price": 8.0, "quantity": 3})
+    assert _names(index.search(name="peda")) == ["Peda"]
+
+    index.patch(new_id, {"name": "Kesar Peda"})
+    index.adjust_quantity(new_id, -2)
+    [peda] = index.search(name="kesar")
+    assert peda["name"] == "Kesar Peda" and peda["quantity"] == 1
+    assert _names(index.search(name="peda")) == ["Kesar Peda"]
+
+    index.remove(new_id)
+    assert index.search(name="peda") == []
+
+
+def test_search_endpoint_uses_index(client):
+    token = client.post("/api/auth/register", json={
+        "username": "searcher",
+        "email": "searcher@test.com",
+        "password": "pass123"
+    }).get_json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    client.post("/api/sweets/", json={"name": "Jalebi", "category": "Indian", "price": 15.0, "quantity": 10},
+                headers=headers)
+
+    response = client.get("/api/sweets/search?name=jaleb&max_price=20", headers=headers)
+    assert _names(response.get_json()) == ["Jalebi"]
+
+
+def test_remote_stock_change_rereads_only_that_sweet(client, counting_db):
+    index = _index(("Ladoo", "Indian", 10.0), ("Barfi", "Indian", 20.0))
+    ladoo = mongo.db.sweets.find_one({"name": "Ladoo"})["_id"]
+    # Another worker sold two
+    mongo.db.sweets.update_one({"_id": ladoo}, {"$inc": {"quantity": -2}})
+    index.stock_changed({str(ladoo)})
+
+    counting_db.reset()
+    [found] = index.search(name="ladoo")
+    assert found["quantity"] == 3
+    assert counting_db.details == [f"sweets.find({{'_id': {{'$in': [ObjectId('{ladoo}')]}}}})"]
+
+    counting_db.reset()
+    index.search(name="ladoo")
+    assert counting_db.commands == []
+
+
+def test_rebuild_keeps_writes_made_while_scanning(client):
+    index = _index(("Ladoo", "Indian", 10.0))
+    scanned = list(mongo.db.sweets.find())
+
+    def slow_scan():
+        yield from scanned
+        # Lands after the scan read its documents
+        peda = {"name": "Peda", "category": "Indian", "price": 8.0, "quantity": 3}
+        peda["_id"] = mongo.db.sweets.insert_one(dict(peda)).inserted_id
+        index.upsert(peda)
+        assert _names(index.search(name="peda")) == ["Peda"]
+
+    index.build(slow_scan())
+    assert _names(index.search(name="peda")) == ["Peda"]
+    assert _names(index.search(name="ladoo")) == ["Ladoo"]
@@ -0,0 +1,14 @@
+import statistics
+
+from benchmarks import bench_startup
+
+
+def test_import_stays_within_startup_budget():
+    profiles = [bench_startup.import_profile() for _ in range(3)]
+    median = statistics.median(bench_startup.import_time_ms(p) for p in profiles)
+    assert median < bench_startup.IMPORT_BUDGET_MS, (
+        f"import app took {median:.0f} ms, budget {bench_startup.IMPORT_BUDGET_MS:.0f} ms")
+
+
+def test_rarely_used_modules_are_not_imported_at_startup():
+    assert bench_startup.eager_lazy_modules(bench_startup.import_profile()) == []
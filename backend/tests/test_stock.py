@@ -0,0 +1,140 @@
+import threading
+
+import pytest
+from bson import ObjectId
+
+import stock
+from extensions import mongo
+
+
+def test_concurrent_buyers_never_oversell(counting_db):
+    sweet_id = counting_db.sweets.insert_one(
+        {"name": "Kaju Katli", "category": "Indian", "price": 25.0, "quantity": 50}
+    ).inserted_id
+    outcomes = []
+
+    def buyer(n):
+        for _ in range(10):
+            try:
+                stock.purchase(f"user-{n}", str(sweet_id), 1)
+                outcomes.append("ok")
+            except stock.InsufficientStock:
+                outcomes.append("sold out")
+
+    threads = [threading.Thread(target=buyer, args=(n,)) for n in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert outcomes.count("ok") == 50
+    assert counting_db.sweets.find_one({"_id": sweet_id})["quantity"] == 0
+    assert counting_db.purchase_history.count_documents({"sweet_id": sweet_id}) == 50
+
+
+def test_purchase_costs_three_commands(counting_db):
+    sweet_id = counting_db.sweets.insert_one(
+        {"name": "Rasgulla", "category": "Indian", "price": 12.0, "quantity": 3}
+    ).inserted_id
+    counting_db.reset()
+
+    sweet, purchase = stock.purchase("user-1", str(sweet_id), 2)
+
+    assert sweet["quantity"] == 1
+    assert purchase["total"] == 24.0
+    assert counting_db.commands == [
+        ("sweets", "find_one_and_update"),
+        ("purchase_history", "insert_one"),
+        ("sales_rollups", "bulk_write"),
+    ]
+
+
+def test_purchase_errors(counting_db):
+    sweet_id = counting_db.sweets.insert_one(
+        {"name": "Peda", "category": "Indian", "price": 8.0, "quantity": 1}
+    ).inserted_id
+
+    with pytest.raises(stock.InsufficientStock):
+        stock.purchase("user-1", str(sweet_id), 2)
+    with pytest.raises(stock.SweetNotFound):
+        stock.purchase("user-1", "64b7f0f0f0f0f0f0f0f0f0f0", 1)
+    assert counting_db.sweets.find_one({"_id": sweet_id})["quantity"] == 1
+
+
+def test_stock_primitives_reject_non_positive_quantities(client):
+    sweet_id = mongo.db.sweets.insert_one({"name": "Ladoo", "price": 10.0, "quantity": 5}).inserted_id
+    for qty in (-50, 0, True, 1.5, "2"):
+        with pytest.raises(stock.InvalidQuantity):
+            stock.purchase("user-1", str(sweet_id), qty)
+        with pytest.raises(stock.InvalidQuantity):
+            stock.decrement_stock_many({sweet_id: qty})
+    assert mongo.db.sweets.find_one({"_id": sweet_id})["quantity"] == 5
+
+
+def test_decrement_many_rolls_back_on_contention(client):
+    ladoo = mongo.db.sweets.insert_one({"name": "Ladoo", "price": 10.0, "quantity": 5}).inserted_id
+    barfi = mongo.db.sweets.insert_one({"name": "Barfi", "price": 20.0, "quantity": 1}).inserted_id
+    jalebi = mongo.db.sweets.insert_one({"name": "Jalebi", "price": 5.0, "quantity": 9}).inserted_id
+
+    with pytest.raises(stock.InsufficientStock) as excinfo:
+        stock.decrement_stock_many({ladoo: 2, barfi: 3, jalebi: 1})
+
+    assert str(excinfo.value) == str(barfi)
+    assert [s["quantity"] for s in mongo.db.sweets.find()] == [5, 1, 9]
+
+
+def test_decrement_many_rollback_expires_the_catalog(client):
+    from coherence import coherence
+
+    ladoo = mongo.db.sweets.insert_one({"name": "Ladoo", "price": 10.0, "quantity": 5}).inserted_id
+    barfi = mongo.db.sweets.insert_one({"name": "Barfi", "price": 20.0, "quantity": 1}).inserted_id
+    before = coherence.store.read(["stock"]).get("stock", 0)
+
+    # Ladoo was briefly at 3 and may have been cached that way by another worker
+    with pytest.raises(stock.InsufficientStock):
+        stock.decrement_stock_many({ladoo: 2, barfi: 3})
+
+    assert coherence.store.read(["stock"])["stock"] == before + 1
+    assert coherence.store.changes("stock", before) == {str(ladoo)}
+
+
+def test_decrement_many_does_not_recreate_deleted_sweets(client):
+    ladoo = mongo.db.sweets.insert_one({"name": "Ladoo", "price": 10.0, "quantity": 5}).inserted_id
+    deleted = ObjectId()
+
+    with pytest.raises(stock.SweetNotFound):
+        stock.decrement_stock_many({ladoo: 2, deleted: 1})
+
+    assert mongo.db.sweets.find_one({"_id": ladoo})["quantity"] == 5
+    assert mongo.db.sweets.find_one({"_id": deleted}) is None
+
+
+def test_decrement_many_reports_several_deleted_sweets_as_missing(client):
+    ladoo = mongo.db.sweets.insert_one({"name": "Ladoo", "price": 10.0, "quantity": 5}).inserted_id
+    mongo.db.sweets.create_index("name", unique=True)
+    # A nameless placeholder, as left by an upsert from a crashed rollback
+    mongo.db.sweets.insert_one({"quantity": -1})
+    first, second = ObjectId(), ObjectId()
+
+    # Upserting placeholders for these collided on the name index and came back as a 400
+    with pytest.raises(stock.SweetNotFound) as excinfo:
+        stock.decrement_stock_many({first: 1, ladoo: 2, second: 1})
+
+    assert str(excinfo.value) == str(first)
+    assert mongo.db.sweets.count_documents({}) == 2
+    assert mongo.db.sweets.find_one({"_id": ladoo})["quantity"] == 5
+
+
+def test_purchase_is_recorded_when_catalog_refresh_fails(client, monkeypatch):
+    from coherence import coherence
+
+    sweet_id = mongo.db.sweets.insert_one({"name": "Ladoo", "price": 10.0, "quantity": 5}).inserted_id
+
+    def broken_incr(namespace):
+        raise RuntimeError("cache_generations unavailable")
+
+    monkeypatch.setattr(coherence.store, "incr", broken_incr)
+    sweet, purchase = stock.purchase("user-1", str(sweet_id), 2)
+
+    assert sweet["quantity"] == 3
+    assert mongo.db.purchase_history.count_documents({"_id": purchase["_id"]}) == 1
@@ -1,18 +1,18 @@
 def test_add_and_list_sweets(client):
     # Register & Login
-    client.post("/auth/register", json={
+    client.post("/api/auth/register", json={
         "username": "testuser",
         "email": "test@test.com",
         "password": "pass123"
     })
-    login = client.post("/auth/login", json={
+    login = client.post("/api/auth/login", json={
         "username": "testuser",
         "password": "pass123"
     })
     token = login.get_json()["access_token"]
 
     # Add sweet
-    response = client.post("/sweets/", json={
+    response = client.post("/api/sweets/", json={
         "name": "Ladoo",
         "category": "Indian",
         "price": 10.0,
@@ -23,16 +23,60 @@ def test_add_and_list_sweets(client):
     sweet_id = response.get_json()["id"]
 
     # List sweets
-    response = client.get("/sweets/")
+    response = client.get("/api/sweets/")
     data = response.get_json()
     assert any(s["name"] == "Ladoo" for s in data)
 
     # Update sweet
-    response = client.put(f"/sweets/{sweet_id}", json={"price": 12.0},
+    response = client.put(f"/api/sweets/{sweet_id}", json={"price": 12.0},
                           headers={"Authorization": f"Bearer {token}"})
     assert response.status_code == 200
 
     # Delete sweet
-    response = client.delete(f"/sweets/{sweet_id}",
+    response = client.delete(f"/api/sweets/{sweet_id}",
                              headers={"Authorization": f"Bearer {token}"})
-    assert response.status_code == 204
+    assert response.status_code == 200
+    assert not any(s["name"] == "Ladoo" for s in client.get("/api/sweets/").get_json())
+
+
+def test_catalog_is_cached_with_etag(client, counting_db):
+    token = client.post("/api/auth/register", json={
+        "username": "cacher",
+        "email": "cacher@test.com",
+        "password": "pass123"
+    }).get_json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    sweet_id = client.post("/api/sweets/", json={
+        "name": "Ladoo", "category": "Indian", "price": 10.0, "quantity": 5
+    }, headers=headers).get_json()["id"]
+
+    first = client.get("/api/sweets/")
+    etag = first.headers["ETag"]
+    assert "stale-while-revalidate" in first.headers["Cache-Control"]
+    assert first.get_json()[0]["name"] == "Ladoo"
+
+    counting_db.reset()
+    second = client.get("/api/sweets/")
+    assert second.headers["ETag"] == etag
+    not_modified = client.get("/api/sweets/", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert counting_db.commands == []
+
+    # A purchase bumps the catalog version and changes the ETag
+    client.post(f"/api/sweets/{sweet_id}/purchase", json={"quantity": 2}, headers=headers)
+    third = client.get("/api/sweets/", headers={"If-None-Match": etag})
+    assert third.status_code == 200
+    assert third.headers["ETag"] != etag
+    assert third.get_json()[0]["quantity"] == 3
+
+
+def test_catalog_field_projection(client):
+    from extensions import mongo
+    mongo.db.sweets.insert_one({"name": "Ladoo", "category": "Indian", "price": 10.0, "quantity": 5,
+                                "image_url": "https://example.com/ladoo.png"})
+
+    assert client.get("/api/sweets/?fields=name,price").get_json() == [{"name": "Ladoo", "price": 10.0}]
+    summary = client.get("/api/sweets/?view=summary").get_json()
+    assert "image_url" not in summary[0] and summary[0]["name"] == "Ladoo"
+    assert "image_url" in client.get("/api/sweets/").get_json()[0]
+    assert client.get("/api/sweets/?fields=secret").status_code == 400
@@ -0,0 +1,23 @@
+import os
+import subprocess
+import sys
+
+from user_agent_cache import UserAgentCache
+
+CHROME = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+          "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+
+
+def test_parse_is_memoized():
+    cache = UserAgentCache(maxsize=2)
+    assert cache.parse(CHROME) == ("Chrome", "Windows", "Other")
+    assert cache.parse(CHROME) == ("Chrome", "Windows", "Other")
+    assert cache.parse(None) == ("Other", "Other", "Other")
+    assert cache.stats() == {"hits": 1, "misses": 2, "size": 2, "maxsize": 2}
+
+
+def test_app_import_does_not_load_user_agents():
+    backend = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    code = "import sys, app; print('user_agents' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=backend, capture_output=True, text=True)
+    assert result.stdout.strip() == "False", result.stderr
@@ -0,0 +1,30 @@
+from extensions import mongo
+from users import UserCache
+
+
+def test_user_cache_ttl_lru_and_invalidate(client, counting_db):
+    ids = [mongo.db.users.insert_one({"username": f"u{i}", "password": "hash"}).inserted_id for i in range(3)]
+    cache = UserCache(maxsize=2, ttl=60)
+
+    counting_db.reset()
+    assert cache.get(str(ids[0]))["username"] == "u0"
+    assert "password" not in cache.get(str(ids[0]))
+    assert len(counting_db.commands) == 1
+
+    cache.get(ids[1])
+    cache.get(ids[2])  # evicts u0, the least recently used
+    counting_db.reset()
+    cache.get(ids[2])
+    cache.get(ids[0])
+    assert len(counting_db.commands) == 1
+
+    mongo.db.users.update_one({"_id": ids[0]}, {"$set": {"username": "renamed"}})
+    cache.invalidate(ids[0])
+    assert cache.get(ids[0])["username"] == "renamed"
+
+    cache.ttl = 0
+    cache.expire()
+    cache.get(ids[1])
+    counting_db.reset()
+    cache.get(ids[1])
+    assert len(counting_db.commands) == 1
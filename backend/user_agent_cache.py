@@ -0,0 +1,40 @@
+from functools import lru_cache
+
+# Longer strings are almost always junk; cap what we hash and keep
+MAX_UA_LENGTH = 512
+
+
+def _parse_families(ua_string):
+    # Imported on first use: loading the ua-parser regexes is slow
+    import user_agents
+
+    user_agent = user_agents.parse(ua_string)
+    return user_agent.browser.family, user_agent.os.family, user_agent.device.family
+
+
+class UserAgentCache:
+    """Memoizes User-Agent parsing for login device info.
+
+    Real traffic carries a few hundred distinct User-Agent strings, so an
+    LRU of UA_CACHE_SIZE parsed results skips the ua-parser regex cascade
+    on almost every login.
+    """
+
+    def __init__(self, maxsize=1024):
+        self._parse = lru_cache(maxsize=maxsize)(_parse_families)
+
+    def init_app(self, app):
+        app.config.setdefault("UA_CACHE_SIZE", 1024)
+        app.extensions["user_agent_cache"] = self
+        self._parse = lru_cache(maxsize=app.config["UA_CACHE_SIZE"])(_parse_families)
+
+    def parse(self, ua_string):
+        """Return `(browser, os, device)` families for a User-Agent header."""
+        return self._parse((ua_string or "")[:MAX_UA_LENGTH])
+
+    def stats(self):
+        info = self._parse.cache_info()
+        return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
+
+
+user_agent_cache = UserAgentCache()
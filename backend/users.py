@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import OrderedDict
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask_jwt_extended import get_jwt, get_jwt_identity
+
+from extensions import mongo
+from coherence import coherence
+
+
+def user_claims(user):
+    """Extra JWT claims so handlers can authorize without loading the user."""
+    return {
+        "username": user.get("username"),
+        "role": user.get("role"),
+        "is_admin": user.get("is_admin", False) is True,
+    }
+
+
+class UserCache:
+    """Bounded TTL LRU of user documents (without the password hash).
+
+    Entries live for USER_CACHE_TTL seconds and the least recently used are
+    evicted past USER_CACHE_SIZE. `invalidate()` drops a user here and, via
+    the "users" coherence namespace, in every other worker.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def init_app(self, app):
+        app.config.setdefault("USER_CACHE_SIZE", 1024)
+        app.config.setdefault("USER_CACHE_TTL", 60.0)
+        app.extensions["user_cache"] = self
+        self.maxsize = app.config["USER_CACHE_SIZE"]
+        self.ttl = app.config["USER_CACHE_TTL"]
+        self.expire()
+
+    def expire(self):
+        with self._lock:
+            self._entries.clear()
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+        coherence.invalidate("users")
+
+    def get(self, user_id):
+        key = str(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        try:
+            query_id = ObjectId(key)
+        except (InvalidId, TypeError):
+            query_id = key
+        user = mongo.db.users.find_one({"_id": query_id}, {"password": 0})
+        if user is None:
+            return None
+
+        with self._lock:
+            self._entries[key] = (now + self.ttl, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return user
+
+
+def current_user():
+    """The signed-in user from the token's claims, else the cached user document.
+
+    Claims are fixed when the token is issued, so role changes apply from the
+    next login. Tokens issued before claims existed fall back to the cache.
+    """
+    claims = get_jwt()
+    if "role" in claims:
+        return {
+            "_id": get_jwt_identity(),
+            "username": claims.get("username"),
+            "role": claims["role"],
+            "is_admin": claims.get("is_admin", False) is True,
+        }
+    return user_cache.get(get_jwt_identity())
+
+
+user_cache = UserCache()
+coherence.register("users", user_cache.expire)
@@ -1,7 +1,22 @@
+import sys
+
 import bcrypt
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+DEFAULT_ROUNDS = 12
+
+
+def hash_password(password: str, rounds: int = DEFAULT_ROUNDS) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
 
 def check_password(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+
+def hash_rounds(hashed: str) -> int:
+    """Work factor stored in a `$2b$<rounds>$...` bcrypt hash."""
+    return int(hashed.split("$")[2])
+
+
+def cooperative() -> bool:
+    """True when gevent has patched threading, i.e. under async_server.py."""
+    monkey = sys.modules.get("gevent.monkey")
+    return monkey is not None and monkey.is_module_patched("threading")
@@ -3,68 +3,63 @@ import { History, Search, User, Package, Calendar, DollarSign, ShoppingCart, Tre
 import API from "../api";
 import { AuthContext } from "../context/AuthContext";
 
+const PAGE_SIZE = 50;
+
 export default function PurchaseHistory() {
   const [history, setHistory] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
   const [filter, setFilter] = useState("");
   const [salesStats, setSalesStats] = useState({
     currentMonth: 0,
     previousMonth: 0,
+    growthRate: 0,
     totalUsers: 0
   });
   const { user } = useContext(AuthContext);
 
-  const fetchHistory = async () => {
+  const fetchHistory = async (cursor = null) => {
     try {
-      setLoading(true);
-      const res = await API.get("/purchases/history");
-      setHistory(res.data);
-      
-      // Calculate sales statistics
-      if (user?.role === "admin") {
-        calculateSalesStats(res.data);
+      if (cursor) {
+        setLoadingMore(true);
+      } else {
+        setLoading(true);
       }
+      const res = await API.get("/purchases/history", {
+        params: { limit: PAGE_SIZE, ...(cursor ? { cursor } : {}) }
+      });
+      const loaded = cursor ? [...history, ...res.data.items] : res.data.items;
+      setHistory(loaded);
+      setNextCursor(res.data.next);
     } catch (err) {
       console.error("Failed to load purchase history", err);
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
-  const calculateSalesStats = (purchases) => {
-    const now = new Date();
-    const currentMonth = now.getMonth();
-    const currentYear = now.getFullYear();
-    const previousMonth = currentMonth === 0 ? 11 : currentMonth - 1;
-    const previousYear = currentMonth === 0 ? currentYear - 1 : currentYear;
-
-    let currentMonthSales = 0;
-    let previousMonthSales = 0;
-    const uniqueUsers = new Set();
-
-    purchases.forEach(purchase => {
-      const purchaseDate = new Date(purchase.timestamp);
-      const purchaseMonth = purchaseDate.getMonth();
-      const purchaseYear = purchaseDate.getFullYear();
-
-      uniqueUsers.add(purchase.user_email || purchase.user_id);
-
-      if (purchaseMonth === currentMonth && purchaseYear === currentYear) {
-        currentMonthSales += purchase.total;
-      } else if (purchaseMonth === previousMonth && purchaseYear === previousYear) {
-        previousMonthSales += purchase.total;
-      }
-    });
-
-    setSalesStats({
-      currentMonth: currentMonthSales,
-      previousMonth: previousMonthSales,
-      totalUsers: uniqueUsers.size
-    });
+  // Sales cards cover every purchase, not just the pages loaded so far
+  const fetchSalesStats = async () => {
+    try {
+      const res = await API.get("/purchases/stats");
+      setSalesStats({
+        currentMonth: res.data.current_month.sales,
+        previousMonth: res.data.previous_month.sales,
+        growthRate: res.data.growth_rate,
+        totalUsers: res.data.total_customers
+      });
+    } catch (err) {
+      console.error("Failed to load sales stats", err);
+    }
   };
 
   useEffect(() => {
     fetchHistory();
+    if (user?.role === "admin") {
+      fetchSalesStats();
+    }
   }, []);
 
   const filteredHistory = history.filter((p) =>
@@ -343,10 +338,7 @@ export default function PurchaseHistory() {
     }
   };
 
-  const getSalesGrowth = () => {
-    if (salesStats.previousMonth === 0) return 0;
-    return ((salesStats.currentMonth - salesStats.previousMonth) / salesStats.previousMonth * 100);
-  };
+  const getSalesGrowth = () => salesStats.growthRate;
 
   const formatCurrency = (amount) => {
     return new Intl.NumberFormat('en-IN', {
@@ -701,6 +693,19 @@ export default function PurchaseHistory() {
                       ))}
                     </tbody>
                   </table>
+                  {nextCursor && (
+                    <div style={{ textAlign: 'center', padding: '16px' }}>
+                      <button
+                        onClick={() => fetchHistory(nextCursor)}
+                        disabled={loadingMore}
+                        style={styles.clearButton}
+                        onMouseEnter={(e) => e.target.style.background = 'rgba(255, 255, 255, 0.3)'}
+                        onMouseLeave={(e) => e.target.style.background = 'rgba(255, 255, 255, 0.2)'}
+                      >
+                        {loadingMore ? "Loading..." : "Load more"}
+                      </button>
+                    </div>
+                  )}
                 </div>
               ) : (
                 /* Empty state */